@@ -0,0 +1,83 @@
+"""N single lookups vs. one bulk lookup.
+
+Times ``estado_solicitud_por_id`` and ``obtener_roles_usuario`` called once
+per key against a single call with ``request_ids`` / ``dnis``. Uses the
+dataset of ``bench_current_state`` (seeded on first run) plus users' roles,
+so point ``DB_DATABASE`` at a scratch schema:
+
+    DB_DATABASE=bench_mcp python -m benchmarks.bench_bulk_lookup --yes
+"""
+import argparse
+import random
+import time
+
+from benchmarks.bench_current_state import SCHEMA, seed
+from src import projections
+from src.db import db_connection
+from src.tools import EstadoSolicitudPorIdTool, ObtenerRolesUsuarioTool
+
+ROLES_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS roles (id BIGINT UNSIGNED NOT NULL PRIMARY KEY, name VARCHAR(255) NOT NULL)",
+    """CREATE TABLE IF NOT EXISTS model_has_roles (
+        role_id BIGINT UNSIGNED NOT NULL, model_type VARCHAR(255) NOT NULL, model_id BIGINT UNSIGNED NOT NULL,
+        PRIMARY KEY (role_id, model_id, model_type), KEY idx_mhr_model (model_id, model_type))""",
+]
+
+
+def seed_roles(cursor) -> None:
+    cursor.execute("SELECT COUNT(*) FROM model_has_roles")
+    if cursor.fetchone()[0]:
+        return
+    cursor.executemany("INSERT INTO roles (id, name) VALUES (%s, %s)", [(i, f"Rol {i}") for i in range(1, 9)])
+    cursor.execute(
+        """INSERT INTO model_has_roles (role_id, model_type, model_id)
+        SELECT 1 + MOD(u.id + d.d, 8), 'App\\\\Models\\\\User', u.id
+        FROM users u JOIN digits d ON d.d < 2"""
+    )
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--yes", action="store_true", help="confirm DB_DATABASE is a scratch schema")
+    parser.add_argument("--keys", type=int, default=50, help="keys per lookup")
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=500_000)
+    parser.add_argument("--users", type=int, default=50_000)
+    args = parser.parse_args()
+    if not args.yes:
+        parser.error("this benchmark creates and fills tables; pass --yes with DB_DATABASE set to a scratch schema")
+
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        for statement in SCHEMA + ROLES_SCHEMA:
+            cursor.execute(statement)
+        seed(cursor, args.requests, 6, args.users)
+        seed_roles(cursor)
+        cursor.close()
+    projections.refresh_current_state()
+
+    estado, roles = EstadoSolicitudPorIdTool(), ObtenerRolesUsuarioTool()
+    cases = {"single": {"estado_solicitud_por_id": 0.0, "obtener_roles_usuario": 0.0},
+             "bulk": {"estado_solicitud_por_id": 0.0, "obtener_roles_usuario": 0.0}}
+    for _ in range(args.rounds):
+        ids = random.sample(range(1, args.requests + 1), args.keys)
+        dnis = [str(n).zfill(8) for n in random.sample(range(1, args.users + 1), args.keys)]
+        cases["single"]["estado_solicitud_por_id"] += timed(lambda: [estado._run(request_id=i) for i in ids])
+        cases["bulk"]["estado_solicitud_por_id"] += timed(lambda: estado._run(request_ids=ids))
+        cases["single"]["obtener_roles_usuario"] += timed(lambda: [roles._run(dni_usuario=d) for d in dnis])
+        cases["bulk"]["obtener_roles_usuario"] += timed(lambda: roles._run(dnis=dnis))
+
+    for tool in ("estado_solicitud_por_id", "obtener_roles_usuario"):
+        single = cases["single"][tool] / args.rounds * 1000
+        bulk = cases["bulk"][tool] / args.rounds * 1000
+        print(f"{tool:<26} {args.keys} single calls={single:8.1f} ms  1 bulk call={bulk:8.1f} ms  x{single / bulk:5.1f}")
+
+
+if __name__ == "__main__":
+    main()
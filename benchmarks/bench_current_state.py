@@ -0,0 +1,175 @@
+"""Latest state per request: derived ``MAX(date)`` tables vs. ``request_current_state``.
+
+Seeds a synthetic dataset (millions of state records with the defaults) and
+times the point lookups of ``estado_solicitud_por_id`` and
+``listar_solicitudes_por_dni`` with both SQL shapes. The script creates and
+fills tables, so point ``DB_DATABASE`` at a scratch schema:
+
+    DB_DATABASE=bench_mcp python -m benchmarks.bench_current_state --yes
+"""
+import argparse
+import random
+import statistics
+import time
+
+from src import projections
+from src.db import db_connection
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS digits (d TINYINT UNSIGNED NOT NULL PRIMARY KEY)",
+    """CREATE TABLE IF NOT EXISTS users (
+        id BIGINT UNSIGNED NOT NULL PRIMARY KEY, name VARCHAR(255) NOT NULL, dni VARCHAR(20) NOT NULL,
+        KEY idx_users_dni (dni))""",
+    "CREATE TABLE IF NOT EXISTS procedures (id BIGINT UNSIGNED NOT NULL PRIMARY KEY, name VARCHAR(255) NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS request_states (id BIGINT UNSIGNED NOT NULL PRIMARY KEY, description VARCHAR(255) NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS actions (id BIGINT UNSIGNED NOT NULL PRIMARY KEY, description VARCHAR(255) NOT NULL)",
+    """CREATE TABLE IF NOT EXISTS requests (
+        id BIGINT UNSIGNED NOT NULL PRIMARY KEY, user_id BIGINT UNSIGNED NOT NULL, procedure_id BIGINT UNSIGNED NOT NULL,
+        start_date DATETIME NOT NULL, finish_date DATETIME NULL, created_at DATETIME NOT NULL, deleted_at DATETIME NULL,
+        KEY idx_requests_user (user_id), KEY idx_requests_start (start_date), KEY idx_requests_created (created_at))""",
+    """CREATE TABLE IF NOT EXISTS request_state_records (
+        id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY, request_id BIGINT UNSIGNED NOT NULL,
+        request_status_id BIGINT UNSIGNED NOT NULL, user_id BIGINT UNSIGNED NOT NULL,
+        date DATETIME NOT NULL, created_at DATETIME NOT NULL,
+        KEY idx_rsr_request (request_id), KEY idx_rsr_created (created_at))""",
+    """CREATE TABLE IF NOT EXISTS request_actions (
+        id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY, request_id BIGINT UNSIGNED NOT NULL,
+        action_id BIGINT UNSIGNED NOT NULL, created_at DATETIME NOT NULL,
+        KEY idx_ra_request (request_id))""",
+]
+
+# 0 .. 9_999_999
+SEQ = """(
+    SELECT a.d + 10*b.d + 100*c.d + 1000*e.d + 10000*f.d + 100000*g.d + 1000000*h.d AS n
+    FROM digits a, digits b, digits c, digits e, digits f, digits g, digits h
+)"""
+
+STATES = ["Borrador", "Publicado", "En proceso", "Finalizado", "Rechazado", "Revocado"]
+
+LEGACY_BY_ID = """
+    SELECT r.id AS id_solicitud, u.name AS usuario, u.dni AS dni_usuario, p.name AS tramite,
+           r.start_date AS fecha_inicio, r.finish_date AS fecha_fin, rs.description AS estado_actual,
+           a.description AS ultima_accion, ra.created_at AS fecha_accion
+    FROM requests r
+    JOIN users u ON r.user_id = u.id
+    JOIN procedures p ON r.procedure_id = p.id
+    JOIN (
+        SELECT rsr1.* FROM request_state_records rsr1
+        JOIN (
+            SELECT request_id, MAX(date) AS max_date
+            FROM request_state_records GROUP BY request_id
+        ) latest ON rsr1.request_id = latest.request_id AND rsr1.date = latest.max_date
+    ) rsr ON rsr.request_id = r.id
+    JOIN request_states rs ON rs.id = rsr.request_status_id
+    LEFT JOIN (
+        SELECT ra1.* FROM request_actions ra1
+        JOIN (
+            SELECT request_id, MAX(created_at) AS max_date
+            FROM request_actions GROUP BY request_id
+        ) latest_ra ON ra1.request_id = latest_ra.request_id AND ra1.created_at = latest_ra.max_date
+    ) ra ON ra.request_id = r.id
+    LEFT JOIN actions a ON a.id = ra.action_id
+    WHERE {where} AND r.deleted_at IS NULL
+"""
+
+PROJECTION_BY_ID = """
+    SELECT r.id AS id_solicitud, u.name AS usuario, u.dni AS dni_usuario, p.name AS tramite,
+           r.start_date AS fecha_inicio, r.finish_date AS fecha_fin, rs.description AS estado_actual,
+           a.description AS ultima_accion, rcs.action_date AS fecha_accion
+    FROM requests r
+    JOIN users u ON r.user_id = u.id
+    JOIN procedures p ON r.procedure_id = p.id
+    JOIN request_current_state rcs ON rcs.request_id = r.id
+    JOIN request_states rs ON rs.id = rcs.request_status_id
+    LEFT JOIN actions a ON a.id = rcs.action_id
+    WHERE {where} AND r.deleted_at IS NULL
+"""
+
+
+def seed(cursor, requests: int, states: int, users: int) -> None:
+    cursor.execute("SELECT COUNT(*) FROM requests")
+    if cursor.fetchone()[0]:
+        print("requests already seeded, reusing existing data")
+        return
+    cursor.execute("INSERT IGNORE INTO digits (d) VALUES (0),(1),(2),(3),(4),(5),(6),(7),(8),(9)")
+    cursor.executemany("INSERT INTO procedures (id, name) VALUES (%s, %s)", [(i, f"Trámite {i}") for i in range(1, 21)])
+    cursor.executemany("INSERT INTO request_states (id, description) VALUES (%s, %s)", list(enumerate(STATES, start=1)))
+    cursor.executemany("INSERT INTO actions (id, description) VALUES (%s, %s)", [(i, f"Acción {i}") for i in range(1, 11)])
+    print(f"seeding {users} users, {requests} requests, {requests * states} state records ...")
+    cursor.execute(
+        f"INSERT INTO users (id, name, dni) SELECT n + 1, CONCAT('Usuario ', n + 1), LPAD(n + 1, 8, '0') FROM {SEQ} s WHERE n < %(users)s",
+        {"users": users},
+    )
+    cursor.execute(
+        f"""INSERT INTO requests (id, user_id, procedure_id, start_date, created_at)
+        SELECT n + 1, MOD(n, %(users)s) + 1, MOD(n, 20) + 1,
+               NOW() - INTERVAL MOD(n, 730) DAY - INTERVAL MOD(n, 86400) SECOND,
+               NOW() - INTERVAL MOD(n, 730) DAY - INTERVAL MOD(n, 86400) SECOND
+        FROM {SEQ} s WHERE n < %(requests)s""",
+        {"users": users, "requests": requests},
+    )
+    cursor.execute(
+        """INSERT INTO request_state_records (request_id, request_status_id, user_id, date, created_at)
+        SELECT r.id, 1 + MOD(r.id + d.d, 6), MOD(r.id * 7 + d.d, %(users)s) + 1,
+               r.start_date + INTERVAL d.d HOUR, r.start_date + INTERVAL d.d HOUR
+        FROM requests r JOIN digits d ON d.d < %(states)s""",
+        {"users": users, "states": states},
+    )
+    cursor.execute(
+        """INSERT INTO request_actions (request_id, action_id, created_at)
+        SELECT r.id, 1 + MOD(r.id + d.d, 10), r.start_date + INTERVAL d.d HOUR
+        FROM requests r JOIN digits d ON d.d < 3"""
+    )
+
+
+def timed(cursor, query: str, keys: list) -> list:
+    latencies = []
+    for key in keys:
+        start = time.perf_counter()
+        cursor.execute(query, {"key": key})
+        cursor.fetchall()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def report(label: str, latencies: list) -> None:
+    latencies = sorted(latencies)
+    print(f"{label:<32} avg={statistics.mean(latencies) * 1000:9.1f} ms  p50={statistics.median(latencies) * 1000:9.1f} ms  max={latencies[-1] * 1000:9.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--yes", action="store_true", help="confirm DB_DATABASE is a scratch schema")
+    parser.add_argument("--requests", type=int, default=500_000)
+    parser.add_argument("--states", type=int, default=6, help="state records per request (max 10)")
+    parser.add_argument("--users", type=int, default=50_000)
+    parser.add_argument("--lookups", type=int, default=20)
+    args = parser.parse_args()
+    if not args.yes:
+        parser.error("this benchmark creates and fills tables; pass --yes with DB_DATABASE set to a scratch schema")
+
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        for statement in SCHEMA:
+            cursor.execute(statement)
+        seed(cursor, args.requests, min(args.states, 10), args.users)
+        cursor.close()
+
+    start = time.perf_counter()
+    folded = projections.refresh_current_state()
+    print(f"projection refresh: {folded} in {time.perf_counter() - start:.1f} s")
+
+    ids = [random.randint(1, args.requests) for _ in range(args.lookups)]
+    dnis = [str(random.randint(1, args.users)).zfill(8) for _ in range(args.lookups)]
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        for label, query in (("derived MAX(date) tables", LEGACY_BY_ID), ("request_current_state", PROJECTION_BY_ID)):
+            by_id = query.format(where="r.id = %(key)s")
+            by_dni = query.format(where="u.dni = %(key)s")
+            report(f"{label} / by id", timed(cursor, by_id, ids))
+            report(f"{label} / by dni", timed(cursor, by_dni, dnis))
+        cursor.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Point-lookup latency while a heavy report runs, inline vs. on the executor.
+
+Tool bodies are simulated with ``time.sleep`` (a blocking DB wait), so the
+benchmark needs no database:
+
+    python -m benchmarks.bench_executor
+"""
+import asyncio
+import statistics
+import time
+
+from src.executor import ToolExecutor
+
+HEAVY_SECONDS = 2.0
+POINT_SECONDS = 0.005
+POINT_CALLS = 100
+POINT_INTERVAL = 0.01
+
+
+def heavy_report():
+    time.sleep(HEAVY_SECONDS)
+
+
+def point_lookup():
+    time.sleep(POINT_SECONDS)
+
+
+async def _inline(fn):
+    fn()
+
+
+async def _measure(call) -> list:
+    """Latency of each point lookup, measured from its scheduled arrival time."""
+    latencies = []
+
+    async def one(arrival: float):
+        await asyncio.sleep(max(arrival - time.perf_counter(), 0))
+        await call(point_lookup)
+        latencies.append(time.perf_counter() - arrival)
+
+    start = time.perf_counter()
+    points = [asyncio.ensure_future(one(start + i * POINT_INTERVAL)) for i in range(POINT_CALLS)]
+    heavy = asyncio.ensure_future(call(heavy_report))
+    await asyncio.gather(heavy, *points)
+    return latencies
+
+
+def _report(label: str, latencies: list) -> None:
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies) * 1000
+    p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+    print(f"{label:<10} p50={p50:8.1f} ms  p95={p95:8.1f} ms  max={latencies[-1] * 1000:8.1f} ms")
+
+
+async def main():
+    _report("inline", await _measure(_inline))
+    executor = ToolExecutor(max_workers=4, max_queue=32)
+    try:
+        _report("executor", await _measure(executor.run))
+    finally:
+        executor.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
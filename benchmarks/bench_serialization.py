@@ -0,0 +1,119 @@
+"""Serialization time and payload size per tool and output mode.
+
+Builds synthetic rows with the shape each tool returns and times producing
+the HTTP body of ``/tools/execute`` in every mode:
+
+* ``text``: the tool's text rendering wrapped in ``ToolExecutionResponse``
+  (what every call returned before the structured modes existed);
+* ``rows (json)`` / ``rows (orjson)``: typed rows with the standard library
+  encoder and with orjson;
+* ``columns``: the column-major layout with the fast encoder.
+
+No database is needed:
+
+    python -m benchmarks.bench_serialization
+"""
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from src import serialization
+from src.models import ToolExecutionResponse
+from src.serialization import _default, dumps, structured
+from src.tools import (
+    ConsultarMensajesSolicitudTool,
+    ConteoEstadosTramiteEspecificoTool,
+    EstadoSolicitudPorIdTool,
+    ListarSolicitudesPorDniTool,
+    ToolData,
+)
+
+REPEAT = 200
+BASE = datetime(2024, 3, 1, 9, 30)
+
+
+def solicitud(i: int) -> dict:
+    return {
+        "id_solicitud": 100000 + i,
+        "usuario": "María Fernanda González",
+        "dni_usuario": "30111222",
+        "tramite": random.choice(["Licencia anual ordinaria", "Certificado de domicilio", "Habilitación comercial"]),
+        "fecha_inicio": BASE + timedelta(days=i),
+        "fecha_fin": None if i % 3 else BASE + timedelta(days=i + 5),
+        "estado_actual": random.choice(["Publicado", "En proceso", "Finalizado"]),
+        "ultima_accion": "Derivar a mesa de entradas",
+        "fecha_accion": BASE + timedelta(days=i, hours=2),
+        "fecha_creacion": BASE + timedelta(days=i),
+    }
+
+
+def mensaje(i: int) -> dict:
+    return {
+        "mensaje_id": 500000 + i,
+        "titulo": "Consulta" if i % 4 == 0 else None,
+        "contenido": "Buenos días, adjunto la documentación solicitada para continuar con el trámite. " * 3,
+        "emisor_id": 10 + i % 2,
+        "nombre_emisor": "Agente Pérez" if i % 2 else "María Fernanda González",
+        "receptor_id": 11 - i % 2,
+        "nombre_receptor": "María Fernanda González" if i % 2 else "Agente Pérez",
+        "leido": i % 5 != 0,
+        "enviado": True,
+        "conversation_id": 777,
+        "fecha_creacion": BASE + timedelta(minutes=17 * i),
+        "rol_actual": "agente",
+    }
+
+
+def conteo(i: int) -> dict:
+    row = {"tramite": f"Trámite {i}"}
+    for column in ("borrador", "publicado", "en_proceso", "finalizado", "rechazado", "revocado"):
+        row[column] = Decimal(random.randint(0, 5000))
+    row["total"] = sum(v for k, v in row.items() if k != "tramite")
+    return row
+
+
+CASES = [
+    ("estado_solicitud_por_id", EstadoSolicitudPorIdTool(), [solicitud(0)], {"request_id": 100000}, None),
+    ("conteo_estados_tramite_especifico", ConteoEstadosTramiteEspecificoTool(), [conteo(i) for i in range(20)],
+     {"nombre_tramite": "x", "fecha_inicio": "2024-01-01", "fecha_fin": "2024-12-31"}, None),
+    ("listar_solicitudes_por_dni", ListarSolicitudesPorDniTool(), [solicitud(i) for i in range(50)],
+     {"dni_usuario": "30111222"}, {"next_cursor": None}),
+    ("consultar_mensajes_solicitud", ConsultarMensajesSolicitudTool(), [mensaje(i) for i in range(500)],
+     {"request_id": 100000}, {"next_cursor": None}),
+]
+
+
+def timed(fn) -> tuple:
+    body = fn()
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        fn()
+    return (time.perf_counter() - start) / REPEAT * 1e6, len(body)
+
+
+def main():
+    print(f"orjson available: {serialization.orjson is not None}\n")
+    print(f"{'tool':<36} {'mode':<14} {'time (us)':>10} {'bytes':>9}")
+    for name, tool, rows, args, meta in CASES:
+        data = ToolData(rows, meta)
+        modes = {
+            "text": lambda: ToolExecutionResponse(result=tool.render(data, **args)).model_dump_json().encode(),
+            "rows (json)": lambda: json.dumps(
+                {"result": "", "error": None, "data": structured(rows, meta, "rows")},
+                default=_default, ensure_ascii=False, separators=(",", ":"),
+            ).encode(),
+            "rows (orjson)": lambda: dumps({"result": "", "error": None, "data": structured(rows, meta, "rows")}),
+            "columns": lambda: dumps({"result": "", "error": None, "data": structured(rows, meta, "columns")}),
+        }
+        if serialization.orjson is None:
+            del modes["rows (orjson)"]
+        for mode, fn in modes.items():
+            micros, size = timed(fn)
+            print(f"{name:<36} {mode:<14} {micros:>10.1f} {size:>9}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Import time and resident memory of a fresh server worker.
+
+Each measurement runs in a new interpreter, as a uvicorn worker would:
+
+* ``server``: ``import src.main``, the server as it starts now;
+* ``server + crewai``: the same plus ``crewai.tools``, which every worker
+  imported before the tools stopped subclassing ``crewai.tools.BaseTool``.
+
+Only the modules are imported; no database connection is opened:
+
+    python -m benchmarks.bench_startup [--runs 5]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+CHILD = """
+import json, resource, sys, time
+start = time.perf_counter()
+{imports}
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": elapsed,
+    "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "modules": len(sys.modules),
+    "crewai": "crewai" in sys.modules,
+}}))
+"""
+
+MODES = {
+    "server": "import src.main",
+    "server + crewai": "import src.main\nimport crewai.tools",
+}
+
+
+def measure(imports: str) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD.format(imports=imports)],
+        check=True, capture_output=True, text=True,
+    )
+    return json.loads(out.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'mode':<18} {'import (ms)':>12} {'max RSS (MB)':>13} {'modules':>8} {'crewai':>7}")
+    for mode, imports in MODES.items():
+        try:
+            samples = [measure(imports) for _ in range(args.runs)]
+        except subprocess.CalledProcessError as e:
+            print(f"{mode:<18} failed: {e.stderr.strip().splitlines()[-1]}")
+            continue
+        seconds = statistics.median(s["seconds"] for s in samples)
+        rss = statistics.median(s["max_rss_kb"] for s in samples) / 1024
+        print(f"{mode:<18} {seconds * 1000:>12.1f} {rss:>13.1f} {samples[-1]['modules']:>8} {str(samples[-1]['crewai']):>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+"""Optional columnar snapshot answering the range aggregate tools.
+
+With ``ANALYTICS_BACKEND=duckdb`` a background task copies the columns the
+aggregate tools need from ``requests``, ``request_state_records`` and
+``users`` into a DuckDB file on local disk, and the state-count and agent
+activity tools run their aggregations there instead of on MySQL. Procedure
+and state names are not copied: as everywhere else, ids are resolved
+against the in-process dimension caches (:mod:`src.dimensions`).
+
+Each sync only reads what changed: state records and users above the
+previous high-water mark (re-reading the last ``PROJECTION_RESCAN_IDS`` ids,
+for rows that committed late), plus the requests created since yesterday
+(new ones and recent soft deletes). Older deletes are picked up by the full
+rebuild every ``ANALYTICS_REBUILD_INTERVAL`` seconds. The export reads go
+through :func:`src.db.db_connection` with the replica lag tolerance, so
+they land on a read replica when one is configured.
+
+Results carry the time of the snapshot they were computed from. When the
+snapshot is older than ``ANALYTICS_MAX_STALENESS`` (the sync keeps failing)
+the tools fall back to MySQL. DuckDB is imported on first use and is only
+needed when the backend is enabled (``pip install duckdb``).
+"""
+import logging
+import os
+import threading
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from . import config, metrics, replicas
+from .background import PeriodicTask, register
+from .db import db_clock, db_connection, run_query
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS requests (
+        id BIGINT, user_id BIGINT, procedure_id BIGINT,
+        start_date TIMESTAMP, created_at TIMESTAMP, deleted_at TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS request_state_records (
+        id BIGINT, request_id BIGINT, user_id BIGINT, request_status_id BIGINT,
+        date TIMESTAMP, created_at TIMESTAMP
+    )
+    """,
+    "CREATE TABLE IF NOT EXISTS users (id BIGINT, dni VARCHAR)",
+    "CREATE TABLE IF NOT EXISTS current_state (request_id BIGINT, request_status_id BIGINT)",
+    "CREATE TABLE IF NOT EXISTS snapshot_watermarks (name VARCHAR PRIMARY KEY, last_id BIGINT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS snapshot_info (id INTEGER PRIMARY KEY, snapshot_at TIMESTAMP, rebuilt_at TIMESTAMP)",
+]
+
+# Tablas copiadas por id creciente: nombre -> columnas (el id primero).
+APPENDED = {
+    "request_state_records": ("id", "request_id", "user_id", "request_status_id", "date", "created_at"),
+    "users": ("id", "dni"),
+}
+REQUEST_COLUMNS = ("id", "user_id", "procedure_id", "start_date", "created_at", "deleted_at")
+
+# Estado actual de las solicitudes con registros nuevos: el más reciente por fecha, como la proyección.
+REFRESH_CURRENT_STATE = [
+    """
+    DELETE FROM current_state
+    WHERE request_id IN (SELECT request_id FROM request_state_records WHERE id > $lo)
+    """,
+    """
+    INSERT INTO current_state
+    SELECT request_id, first(request_status_id ORDER BY date DESC NULLS LAST, id DESC)
+    FROM request_state_records
+    WHERE request_id IN (SELECT request_id FROM request_state_records WHERE id > $lo)
+    GROUP BY request_id
+    """,
+]
+
+# {basis} solo toma valores de rollups.BASES.
+STATE_COUNTS = """
+    SELECT r.procedure_id, cs.request_status_id, COUNT(*) AS total
+    FROM requests r
+    JOIN current_state cs ON cs.request_id = r.id
+    WHERE r.{basis} >= $lo AND r.{basis} < $hi
+      AND r.deleted_at IS NULL
+      AND cs.request_status_id IS NOT NULL
+      {procedure_filter}
+    GROUP BY r.procedure_id, cs.request_status_id
+"""
+
+AGENT_STATE_CHANGES = """
+    SELECT r.procedure_id, s.request_status_id, COUNT(*) AS total_cambios
+    FROM request_state_records s
+    JOIN users u ON s.user_id = u.id
+    JOIN requests r ON s.request_id = r.id
+    WHERE u.dni = $dni_agente
+      AND s.created_at >= $lo AND s.created_at < $hi
+      AND s.request_status_id NOT IN (0, 1, 2)
+      {procedure_filter}
+    GROUP BY r.procedure_id, s.request_status_id
+"""
+
+
+@lru_cache(maxsize=None)
+def _duckdb():
+    import duckdb
+
+    return duckdb
+
+
+def enabled() -> bool:
+    return config.ANALYTICS_BACKEND == "duckdb"
+
+
+def _procedure_filter(procedure_ids: Optional[Sequence[int]], params: Dict[str, Any]) -> str:
+    if procedure_ids is None:
+        return ""
+    params["procedure_ids"] = list(procedure_ids)
+    return "AND list_contains($procedure_ids, r.procedure_id)"
+
+
+class Snapshot:
+    """DuckDB file with the copied tables; one writer (the sync task), many readers."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db = None
+        self._open_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self.snapshot_at: Optional[datetime] = None
+        self.rebuilt_at: Optional[datetime] = None
+        self._reads = 0
+
+    def ready(self) -> bool:
+        """Whether queries can be answered here: enabled, loaded and fresh enough."""
+        snapshot_at = self.snapshot_at
+        return (
+            self._db is not None
+            and snapshot_at is not None
+            and (datetime.now() - snapshot_at).total_seconds() <= config.ANALYTICS_MAX_STALENESS
+        )
+
+    def open(self) -> None:
+        with self._open_lock:
+            if self._db is not None:
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = _duckdb().connect(self.path)
+            for statement in SCHEMA:
+                db.execute(statement)
+            row = db.execute("SELECT snapshot_at, rebuilt_at FROM snapshot_info WHERE id = 1").fetchone()
+            if row:
+                self.snapshot_at, self.rebuilt_at = row
+            self._db = db
+
+    def close(self) -> None:
+        with self._open_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    # --- Sync ---
+
+    def sync(self, full: bool = False) -> Dict[str, Any]:
+        """Copy what changed in MySQL since the last sync; everything with ``full``."""
+        self.open()
+        with self._sync_lock:
+            started = datetime.now()
+            full = full or self.rebuilt_at is None or (
+                (started - self.rebuilt_at).total_seconds() >= config.ANALYTICS_REBUILD_INTERVAL
+            )
+            db = self._db.cursor()
+            # Las lecturas de exportación toleran el mismo retraso que los reportes.
+            route = replicas.enter(config.REPLICA_MAX_LAG or None)
+            try:
+                db.execute("BEGIN TRANSACTION")
+                if full:
+                    for table in ("requests", "request_state_records", "users", "current_state", "snapshot_watermarks"):
+                        db.execute(f"DELETE FROM {table}")
+                copied = {table: self._append(db, table, columns) for table, columns in APPENDED.items()}
+                copied["requests"] = self._sync_requests(db, full)
+                db.execute(
+                    "INSERT OR REPLACE INTO snapshot_info VALUES (1, ?, ?)",
+                    [started, started if full else self.rebuilt_at],
+                )
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+            finally:
+                replicas.leave(route)
+                db.close()
+            self.snapshot_at = started
+            if full:
+                self.rebuilt_at = started
+        return {"full": full, "rows": copied, "snapshot_at": started.isoformat()}
+
+    def _append(self, db, table: str, columns: Tuple[str, ...]) -> int:
+        row = db.execute("SELECT last_id FROM snapshot_watermarks WHERE name = ?", [table]).fetchone()
+        start = row[0] if row else 0
+        # Como la proyección, se relee la ventana final: ids que confirmaron después de uno mayor.
+        lo = rescan_from = max(start - config.PROJECTION_RESCAN_IDS, 0)
+        db.execute(f"DELETE FROM {table} WHERE id > ?", [rescan_from])
+        select = f"SELECT {', '.join(columns)} FROM {table} WHERE id > %(lo)s AND id <= %(hi)s"
+        insert = f"INSERT INTO {table} VALUES ({', '.join('?' for _ in columns)})"
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}")
+                top = int(cursor.fetchone()[0])
+                while lo < top:
+                    hi = min(lo + config.PROJECTION_BATCH_SIZE, top)
+                    rows = run_query(cursor, select, {"lo": lo, "hi": hi})
+                    if rows:
+                        db.executemany(insert, rows)
+                    lo = hi
+            finally:
+                cursor.close()
+        db.execute("INSERT OR REPLACE INTO snapshot_watermarks VALUES (?, ?)", [table, max(lo, start)])
+        if table == "request_state_records" and lo > rescan_from:
+            for statement in REFRESH_CURRENT_STATE:
+                db.execute(statement, {"lo": rescan_from})
+        return max(lo - start, 0)
+
+    def _sync_requests(self, db, full: bool) -> int:
+        """Copy new requests and refresh the ones created since yesterday (new soft deletes)."""
+        select = f"SELECT {', '.join(REQUEST_COLUMNS)} FROM requests"
+        if full:
+            queries = [(select, {})]
+        else:
+            since = datetime.combine(db_clock.today() - timedelta(days=1), datetime.min.time())
+            last_id = db.execute("SELECT COALESCE(MAX(id), 0) FROM requests").fetchone()[0]
+            db.execute("DELETE FROM requests WHERE id > ? OR created_at >= ?", [last_id, since])
+            # Dos consultas por índice en lugar de un OR que recorrería la tabla entera.
+            queries = [
+                (select + " WHERE id > %(last_id)s", {"last_id": last_id}),
+                (select + " WHERE created_at >= %(since)s AND id <= %(last_id)s", {"last_id": last_id, "since": since}),
+            ]
+        insert = f"INSERT INTO requests VALUES ({', '.join('?' for _ in REQUEST_COLUMNS)})"
+        copied = 0
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                for query, params in queries:
+                    rows = run_query(cursor, query, params)
+                    if rows:
+                        db.executemany(insert, rows)
+                    copied += len(rows)
+            finally:
+                cursor.close()
+        return copied
+
+    # --- Queries ---
+
+    def _query(self, query: str, params: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], datetime]:
+        cursor = self._db.cursor()
+        try:
+            # Marca de tiempo y datos de la misma transacción: la sync no se cuela entre ambos.
+            cursor.execute("BEGIN TRANSACTION")
+            snapshot_at = cursor.execute("SELECT snapshot_at FROM snapshot_info WHERE id = 1").fetchone()[0]
+            with metrics.timed("execute"):
+                cursor.execute(query, params)
+                columns = [column[0] for column in cursor.description]
+                rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            cursor.execute("COMMIT")
+        finally:
+            cursor.close()
+        self._reads += 1
+        return rows, snapshot_at
+
+    def state_counts(self, basis: str, lo: datetime, hi: datetime, procedure_ids: Optional[Sequence[int]]) -> Tuple[List[Dict[str, Any]], datetime]:
+        """Raw ``(procedure_id, request_status_id, total)`` rows for ``[lo, hi)``."""
+        params: Dict[str, Any] = {"lo": lo, "hi": hi}
+        query = STATE_COUNTS.format(basis=basis, procedure_filter=_procedure_filter(procedure_ids, params))
+        return self._query(query, params)
+
+    def agent_state_changes(self, dni_agente: str, lo: datetime, hi: datetime, procedure_ids: Optional[Sequence[int]]) -> Tuple[List[Dict[str, Any]], datetime]:
+        """Raw ``(procedure_id, request_status_id, total_cambios)`` rows for ``[lo, hi)``."""
+        params: Dict[str, Any] = {"dni_agente": dni_agente, "lo": lo, "hi": hi}
+        query = AGENT_STATE_CHANGES.format(procedure_filter=_procedure_filter(procedure_ids, params))
+        return self._query(query, params)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": config.ANALYTICS_BACKEND or None,
+            "path": self.path,
+            "ready": self.ready(),
+            "snapshot_at": self.snapshot_at.isoformat() if self.snapshot_at else None,
+            "rebuilt_at": self.rebuilt_at.isoformat() if self.rebuilt_at else None,
+            "reads": self._reads,
+        }
+
+
+snapshot = Snapshot(config.ANALYTICS_PATH)
+
+
+def snapshot_meta(snapshot_at: datetime) -> Dict[str, Any]:
+    """Metadata labelling a result computed from the snapshot."""
+    return {"snapshot_at": snapshot_at.isoformat(timespec="seconds")}
+
+
+def sync() -> Dict[str, Any]:
+    if not enabled():
+        return {"enabled": False}
+    return snapshot.sync()
+
+
+def rebuild() -> Dict[str, Any]:
+    """Copy every table again from scratch."""
+    return snapshot.sync(full=True)
+
+
+sync_task = register(PeriodicTask("analytics_snapshot", config.ANALYTICS_REFRESH_INTERVAL, sync))
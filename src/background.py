@@ -0,0 +1,113 @@
+"""Periodic background jobs (projection refreshes, cache reloads, ...)."""
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicTask:
+    """Runs ``fn`` on a daemon thread every ``interval`` seconds.
+
+    A failing run is logged and retried on the next tick; it never stops
+    the loop.
+    """
+
+    def __init__(self, name: str, interval: float, fn: Callable[[], Any], initial_delay: float = 0.0):
+        self.name = name
+        self.interval = interval
+        self.fn = fn
+        self.initial_delay = initial_delay
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._wake = threading.Event()
+        self._runs = 0
+        self._failures = 0
+        self._last_run_at: Optional[datetime] = None
+        self._last_duration = 0.0
+        self._last_result: Any = None
+        self._last_error: Optional[str] = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._loop, name=f"task-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def trigger(self) -> None:
+        """Run as soon as possible instead of waiting for the next tick."""
+        self._wake.set()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "interval": self.interval,
+            "running": self._thread is not None,
+            "runs": self._runs,
+            "failures": self._failures,
+            "last_run_at": self._last_run_at.isoformat() if self._last_run_at else None,
+            "last_duration_ms": self._last_duration * 1000,
+            "last_result": self._last_result,
+            "last_error": self._last_error,
+        }
+
+    def _loop(self) -> None:
+        if self.initial_delay and self._wait(self.initial_delay):
+            return
+        while not self._stopped.is_set():
+            self.run_once()
+            if self._wait(self.interval):
+                return
+
+    def run_once(self) -> Any:
+        start = time.monotonic()
+        try:
+            self._last_result = self.fn()
+            self._last_error = None
+            return self._last_result
+        except Exception as e:
+            self._failures += 1
+            self._last_error = str(e)
+            logger.exception("Background task %s failed", self.name)
+        finally:
+            self._runs += 1
+            self._last_run_at = datetime.now()
+            self._last_duration = time.monotonic() - start
+
+    def _wait(self, seconds: float) -> bool:
+        """Sleep up to ``seconds``; returns True when the task was stopped."""
+        self._wake.wait(seconds)
+        self._wake.clear()
+        return self._stopped.is_set()
+
+
+tasks: List[PeriodicTask] = []
+
+
+def register(task: PeriodicTask) -> PeriodicTask:
+    tasks.append(task)
+    return task
+
+
+def start_all() -> None:
+    for task in tasks:
+        task.start()
+
+
+def stop_all() -> None:
+    for task in tasks:
+        task.stop()
+
+
+def statuses() -> List[Dict[str, Any]]:
+    return [task.status() for task in tasks]
@@ -0,0 +1,48 @@
+"""Set-based lookups for tools that accept a list of keys.
+
+Instead of one query per key, the keys are sent in chunked ``IN`` lists
+over a single pooled connection and the rows are grouped back per key.
+"""
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from . import config
+from .db import db_connection, in_clause, run_query
+
+# Valor que ocupa, en la respuesta de un lote, una clave sin filas.
+MISSING = "NO_ENCONTRADO"
+
+
+def unique_keys(keys: Iterable[Any], normalize: Callable[[Any], Any] = lambda key: key) -> List[Any]:
+    """Normalized keys without duplicates, in their original order."""
+    return list(dict.fromkeys(normalize(key) for key in keys))
+
+
+def fetch_grouped(
+    query: str,
+    keys: List[Any],
+    key_column: str,
+    params: Optional[Dict[str, Any]] = None,
+    chunk_size: Optional[int] = None,
+) -> Dict[Any, List[Dict[str, Any]]]:
+    """Run ``query`` for every key and group the rows by ``key_column``.
+
+    ``query`` filters with a ``{keys}`` placeholder, e.g. ``WHERE r.id {keys}``,
+    which is replaced by an ``IN (...)`` list of at most ``chunk_size`` keys.
+    Every key is present in the result, in input order; keys without rows
+    map to an empty list.
+    """
+    chunk_size = max(chunk_size or config.BULK_CHUNK_SIZE, 1)
+    grouped: Dict[Any, List[Dict[str, Any]]] = {key: [] for key in keys}
+    with db_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            for start in range(0, len(keys), chunk_size):
+                clause, chunk_params = in_clause("key", keys[start:start + chunk_size])
+                chunk_params.update(params or {})
+                for row in run_query(cursor, query.format(keys=clause), chunk_params):
+                    rows = grouped.get(row[key_column])
+                    if rows is not None:
+                        rows.append(row)
+        finally:
+            cursor.close()
+    return grouped
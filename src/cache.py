@@ -0,0 +1,138 @@
+"""Bounded TTL/LRU cache for tool results, with per-tool freshness policies."""
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from . import config
+from .dates import parse_datetime_arg
+from .db import db_clock
+
+
+class ResultCache:
+    """LRU cache bounded by entry count and by approximate memory size."""
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # key -> (value, expires_at, size)
+        self._entries: "OrderedDict[str, Tuple[Any, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._bypasses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return default
+            value, expires_at, size = entry
+            if expires_at <= time.monotonic():
+                self._remove(key, size)
+                self._expirations += 1
+                self._misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        if ttl <= 0:
+            return
+        size = _approx_size(key, value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[key] = (value, time.monotonic() + ttl, size)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, _, old_size) = self._entries.popitem(last=False)
+                self._bytes -= old_size
+                self._evictions += 1
+
+    def record_bypass(self) -> None:
+        with self._lock:
+            self._bypasses += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": self._hits / lookups if lookups else 0.0,
+                "bypasses": self._bypasses,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+            }
+
+    def _remove(self, key: str, size: int) -> None:
+        del self._entries[key]
+        self._bytes -= size
+
+
+def _approx_size(key: str, value: Any) -> int:
+    value_size = sys.getsizeof(value) if isinstance(value, (str, bytes)) else sys.getsizeof(str(value))
+    return sys.getsizeof(key) + value_size
+
+
+# --- Freshness policies ---
+
+def _range_ttl(args: Dict[str, Any]) -> float:
+    """Long TTL once ``fecha_fin`` is before today, short while the range is open."""
+    fecha_fin = parse_datetime_arg(args.get("fecha_fin"))
+    today = db_clock.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    if fecha_fin is not None and fecha_fin < today:
+        return config.CACHE_TTL_CLOSED_RANGE
+    return config.CACHE_TTL_OPEN_RANGE
+
+
+def _fixed_ttl(seconds: float) -> Callable[[Dict[str, Any]], float]:
+    return lambda args: seconds
+
+
+TTL_POLICIES: Dict[str, Callable[[Dict[str, Any]], float]] = {
+    "conteo_estados_tramite_especifico": _range_ttl,
+    "solicitudes_por_estado": _range_ttl,
+    "consultar_atenciones_agente": _range_ttl,
+    "consultar_atenciones_agente_por_tramite": _range_ttl,
+    # Ya se sirve desde memoria (src/hot_reports.py); el TTL corto solo cubre el cálculo en vivo.
+    "solicitudes_tramite_hoy": _fixed_ttl(1.0),
+    "estado_solicitud_por_id": _fixed_ttl(5.0),
+    "estado_ultima_solicitud_usuario": _fixed_ttl(5.0),
+    "listar_solicitudes_por_dni": _fixed_ttl(5.0),
+    "consultar_mensajes_solicitud": _fixed_ttl(1.0),
+    "obtener_roles_usuario": _fixed_ttl(60.0),
+    "listar_usuarios_por_rol": _fixed_ttl(60.0),
+    "list_available_reports": _fixed_ttl(3600.0),
+}
+DEFAULT_TTL = 5.0
+
+
+def ttl_for(tool_name: str, args: Dict[str, Any]) -> float:
+    """Seconds a result of ``tool_name`` called with ``args`` may be served from cache."""
+    if tool_name in config.CACHE_TTL_OVERRIDES:
+        return config.CACHE_TTL_OVERRIDES[tool_name]
+    policy: Optional[Callable[[Dict[str, Any]], float]] = TTL_POLICIES.get(tool_name)
+    return policy(args) if policy else DEFAULT_TTL
+
+
+result_cache = ResultCache(max_entries=config.CACHE_MAX_ENTRIES, max_bytes=config.CACHE_MAX_BYTES)
@@ -0,0 +1,186 @@
+"""Runtime settings, read once from the environment (and ``.env``)."""
+import os
+from typing import Dict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else default
+
+
+def env_map(name: str) -> Dict[str, str]:
+    """Parse ``key=value,key=value`` settings into a dict."""
+    result = {}
+    for item in (os.getenv(name) or "").split(","):
+        if "=" in item:
+            key, value = item.split("=", 1)
+            result[key.strip()] = value.strip()
+    return result
+
+
+def env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# --- Database ---
+DB_HOST = os.getenv("DB_HOST")
+DB_PORT = os.getenv("DB_PORT")
+DB_USER = os.getenv("DB_USER")
+DB_PASSWORD = os.getenv("DB_PASSWORD")
+DB_DATABASE = os.getenv("DB_DATABASE")
+
+# --- Admin endpoints ---
+# Token exigido en /admin/* (Authorization: Bearer <token>); vacío = sin autenticación.
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# --- Connection pool ---
+DB_POOL_MIN_SIZE = env_int("DB_POOL_MIN_SIZE", 2)
+DB_POOL_MAX_SIZE = env_int("DB_POOL_MAX_SIZE", 10)
+# Segundos que vive una conexión antes de reciclarla.
+DB_POOL_MAX_LIFETIME = env_float("DB_POOL_MAX_LIFETIME", 1800.0)
+# Una conexión ociosa más de este tiempo se valida con ping al sacarla (0 = siempre).
+DB_POOL_VALIDATE_AFTER = env_float("DB_POOL_VALIDATE_AFTER", 30.0)
+DB_POOL_CHECKOUT_TIMEOUT = env_float("DB_POOL_CHECKOUT_TIMEOUT", 10.0)
+
+# --- Read replicas ---
+# Réplicas de lectura separadas por comas: "[usuario[:clave]@]host[:puerto][/base]"; lo omitido se toma de DB_*.
+DB_REPLICAS = [dsn.strip() for dsn in (os.getenv("DB_REPLICAS") or "").split(",") if dsn.strip()]
+# Segundos de retraso que toleran por defecto las herramientas que leen de réplicas.
+REPLICA_MAX_LAG = env_float("REPLICA_MAX_LAG", 30.0)
+# Tolerancia por herramienta, p. ej. "consultar_mensajes_solicitud=2,estado_solicitud_por_id=5" (0 = solo primario).
+REPLICA_MAX_LAG_OVERRIDES = {name: float(lag) for name, lag in env_map("REPLICA_MAX_LAG_OVERRIDES").items()}
+# Cada cuánto se escribe el latido en el primario y se mide el retraso de las réplicas.
+REPLICA_HEARTBEAT_INTERVAL = env_float("REPLICA_HEARTBEAT_INTERVAL", 1.0)
+# Cada cuánto se mide la diferencia entre el reloj del servidor MySQL y el local (define "hoy").
+DB_CLOCK_INTERVAL = env_float("DB_CLOCK_INTERVAL", 300.0)
+
+# --- Tool execution ---
+# Hilos que ejecutan herramientas; conviene no superar DB_POOL_MAX_SIZE.
+TOOL_WORKERS = env_int("TOOL_WORKERS", 8)
+# Llamadas que pueden esperar un hilo libre antes de responder 503.
+TOOL_QUEUE_LIMIT = env_int("TOOL_QUEUE_LIMIT", 32)
+# Concurrencia por clase de costo (lookup, list, report, heavy), p. ej. "report=3,heavy=1".
+# Por defecto: todos, 3/4, 1/2 y 1/4 de TOOL_WORKERS.
+TOOL_CLASS_LIMITS = env_map("TOOL_CLASS_LIMITS")
+# Rangos de fechas de al menos estos días se consideran consultas pesadas.
+COST_HEAVY_RANGE_DAYS = env_int("COST_HEAVY_RANGE_DAYS", 92)
+# Una búsqueda por lista con más claves que esto deja de ser una consulta puntual.
+COST_BULK_KEYS = env_int("COST_BULK_KEYS", 50)
+# Segundos que puede tardar una ejecución (cola + consultas) antes de cancelarse; 0 = sin límite.
+TOOL_TIMEOUT = env_float("TOOL_TIMEOUT", 30)
+# Límite por herramienta, p. ej. "solicitudes_por_estado=60,listar_usuarios_por_rol=10".
+TOOL_TIMEOUT_OVERRIDES = {name: float(timeout) for name, timeout in env_map("TOOL_TIMEOUT_OVERRIDES").items()}
+
+# --- Batch execution ---
+# Llamadas de un mismo lote que se ejecutan a la vez, y tamaño máximo del lote.
+BATCH_MAX_PARALLELISM = env_int("BATCH_MAX_PARALLELISM", 4)
+BATCH_MAX_CALLS = env_int("BATCH_MAX_CALLS", 50)
+
+# --- Bulk lookups ---
+# Claves por lista IN en las herramientas que aceptan varias, y máximo por llamada.
+BULK_CHUNK_SIZE = env_int("BULK_CHUNK_SIZE", 500)
+BULK_MAX_KEYS = env_int("BULK_MAX_KEYS", 1000)
+
+# --- Pagination ---
+# Filas por página de las herramientas de listado cuando no se indica limit, y máximo aceptado.
+PAGE_DEFAULT_LIMIT = env_int("PAGE_DEFAULT_LIMIT", 50)
+PAGE_MAX_LIMIT = env_int("PAGE_MAX_LIMIT", 500)
+
+# --- Streaming ---
+# Filas leídas por fetchmany y enviadas en cada fragmento de /tools/stream.
+STREAM_FETCH_SIZE = env_int("STREAM_FETCH_SIZE", 500)
+# Segundos que puede durar un stream completo antes de cancelarse; 0 = sin límite.
+STREAM_TIMEOUT = env_float("STREAM_TIMEOUT", 300)
+
+# --- Rendering ---
+# Tamaño máximo de la respuesta en texto; 0 desactiva el límite. Si se fija en
+# tokens se aproxima a 4 bytes por token y rige el menor de los dos.
+RENDER_MAX_BYTES = env_int("RENDER_MAX_BYTES", 32768)
+RENDER_MAX_TOKENS = env_int("RENDER_MAX_TOKENS", 0)
+
+# --- Slow queries ---
+# Duración (ms) a partir de la cual una consulta de herramienta se registra con su plan; 0 lo desactiva.
+SLOW_QUERY_THRESHOLD_MS = env_float("SLOW_QUERY_THRESHOLD_MS", 1000)
+# Consultas lentas que se conservan en memoria (las más viejas se descartan).
+SLOW_QUERY_CAPACITY = env_int("SLOW_QUERY_CAPACITY", 100)
+# EXPLAIN ANALYZE vuelve a ejecutar la consulta: más preciso, pero duplica su costo.
+SLOW_QUERY_EXPLAIN_ANALYZE = env_bool("SLOW_QUERY_EXPLAIN_ANALYZE", False)
+# Segundos entre pasadas del worker que obtiene los planes pendientes.
+SLOW_QUERY_EXPLAIN_INTERVAL = env_float("SLOW_QUERY_EXPLAIN_INTERVAL", 5)
+
+# --- Logging ---
+# Nivel de los loggers del servidor (DEBUG, INFO, WARNING, ERROR).
+LOG_LEVEL = os.getenv("LOG_LEVEL") or "INFO"
+# Fracción (0-1) de llamadas a herramientas que se registran; los errores siempre se registran.
+LOG_SAMPLE_RATE = env_float("LOG_SAMPLE_RATE", 1.0)
+# Fracción por herramienta, p. ej. "solicitudes_tramite_hoy=0.1,consultar_mensajes_solicitud=0.5".
+LOG_SAMPLE_RATES = {name: float(rate) for name, rate in env_map("LOG_SAMPLE_RATES").items()}
+# Registros en espera de escritura; con la cola llena se descartan en lugar de bloquear.
+LOG_QUEUE_SIZE = env_int("LOG_QUEUE_SIZE", 10000)
+
+# --- Result cache ---
+CACHE_MAX_ENTRIES = env_int("CACHE_MAX_ENTRIES", 2048)
+CACHE_MAX_BYTES = env_int("CACHE_MAX_BYTES", 64 * 1024 * 1024)
+# TTL (segundos) para reportes cuyo rango de fechas ya terminó y para los que siguen abiertos.
+CACHE_TTL_CLOSED_RANGE = env_float("CACHE_TTL_CLOSED_RANGE", 3600.0)
+CACHE_TTL_OPEN_RANGE = env_float("CACHE_TTL_OPEN_RANGE", 30.0)
+# TTL fijo por herramienta, p. ej. "solicitudes_tramite_hoy=5,consultar_mensajes_solicitud=0".
+CACHE_TTL_OVERRIDES = {name: float(ttl) for name, ttl in env_map("CACHE_TTL_OVERRIDES").items()}
+
+# --- Projections ---
+# Cada cuánto se incorporan los nuevos registros de estado/acciones a request_current_state.
+PROJECTION_REFRESH_INTERVAL = env_float("PROJECTION_REFRESH_INTERVAL", 2.0)
+# Rango de ids de historial procesado por transacción.
+PROJECTION_BATCH_SIZE = env_int("PROJECTION_BATCH_SIZE", 50000)
+# Ids por debajo de la marca que se vuelven a leer en cada pasada: filas que confirmaron tarde.
+PROJECTION_RESCAN_IDS = env_int("PROJECTION_RESCAN_IDS", 10000)
+# Cada cuánto relee cada proceso si la proyección está lista (la marca vive en la BD).
+PROJECTION_READY_CHECK_INTERVAL = env_float("PROJECTION_READY_CHECK_INTERVAL", 1.0)
+# Cada cuánto se reconcilian los días afectados en las rollups diarias.
+ROLLUP_REFRESH_INTERVAL = env_float("ROLLUP_REFRESH_INTERVAL", 5.0)
+
+# --- Range fan-out ---
+# Trozos mensuales de un rango consultados a la vez (cada uno con su conexión del pool).
+RANGE_CHUNK_WORKERS = env_int("RANGE_CHUNK_WORKERS", 4)
+# Trozos ya cerrados (anteriores a hoy) guardados y su TTL en segundos.
+RANGE_CHUNK_CACHE_ENTRIES = env_int("RANGE_CHUNK_CACHE_ENTRIES", 4096)
+RANGE_CHUNK_CACHE_TTL = env_float("RANGE_CHUNK_CACHE_TTL", 86400.0)
+
+# --- Analytics snapshot ---
+# "duckdb" copia las tablas de los reportes agregados a un archivo local y los responde desde ahí (requiere duckdb).
+ANALYTICS_BACKEND = (os.getenv("ANALYTICS_BACKEND") or "").strip().lower()
+ANALYTICS_PATH = os.getenv("ANALYTICS_PATH") or "data/analytics.duckdb"
+# Cada cuánto se copian los cambios; cada cuánto se copia todo de nuevo (borrados antiguos).
+ANALYTICS_REFRESH_INTERVAL = env_float("ANALYTICS_REFRESH_INTERVAL", 60.0)
+ANALYTICS_REBUILD_INTERVAL = env_float("ANALYTICS_REBUILD_INTERVAL", 86400.0)
+# Un snapshot más viejo que esto no se usa: los reportes vuelven a MySQL.
+ANALYTICS_MAX_STALENESS = env_float("ANALYTICS_MAX_STALENESS", 900.0)
+
+# --- Hot reports ---
+# Cada cuánto se comprueba si cambió un reporte servido desde memoria (solicitudes_tramite_hoy).
+HOT_REPORT_INTERVAL = env_float("HOT_REPORT_INTERVAL", 15.0)
+# Un reporte calculado hace más de este tiempo se calcula en vivo; se recalcula antes de llegar a él.
+HOT_REPORT_MAX_AGE = env_float("HOT_REPORT_MAX_AGE", 120.0)
+
+# --- Dimension caches ---
+# Cada cuánto se comprueba (CHECKSUM TABLE) si cambiaron trámites, estados, roles o acciones.
+DIMENSION_REFRESH_INTERVAL = env_float("DIMENSION_REFRESH_INTERVAL", 60.0)
+# Mínimo de segundos entre las recargas forzadas por un id desconocido.
+DIMENSION_MISS_REFRESH_INTERVAL = env_float("DIMENSION_MISS_REFRESH_INTERVAL", 5.0)
+
+# --- Name resolution ---
+# Puntaje mínimo (0-1) para aceptar un nombre de trámite/rol aproximado.
+NAME_MATCH_MIN_SCORE = env_float("NAME_MATCH_MIN_SCORE", 0.5)
+# Cantidad de sugerencias devueltas cuando el nombre es ambiguo o desconocido.
+NAME_MATCH_SUGGESTIONS = env_int("NAME_MATCH_SUGGESTIONS", 5)
@@ -0,0 +1,17 @@
+"""Helpers for the date arguments the tools receive as strings."""
+from datetime import datetime
+from typing import Optional
+
+
+def parse_datetime_arg(value) -> Optional[datetime]:
+    """Parse ``YYYY-MM-DD[ HH:MM:SS]`` the way MySQL would compare it.
+
+    Returns ``None`` when the value is not a recognizable date, so callers
+    can fall back to passing the raw string to the database.
+    """
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        return None
@@ -0,0 +1,448 @@
+"""Shared MySQL connection pools used by every tool: the primary and its read replicas."""
+import functools
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack, contextmanager
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import mysql.connector
+
+from . import config, deadlines, metrics, replicas, slow_queries
+from .background import PeriodicTask, register
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection could be checked out before the timeout."""
+
+
+def _connect(host=None, port=None, user=None, password=None, database=None):
+    return mysql.connector.connect(
+        host=host or config.DB_HOST,
+        port=port or config.DB_PORT,
+        user=user or config.DB_USER,
+        password=password if password is not None else config.DB_PASSWORD,
+        database=database or config.DB_DATABASE,
+        # Las conexiones se reutilizan: sin autocommit cada una quedaría
+        # leyendo la misma instantánea REPEATABLE READ de su primera consulta.
+        autocommit=True,
+    )
+
+
+class _PooledConnection:
+    __slots__ = ("conn", "created_at", "last_used")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class ConnectionPool:
+    """Bounded pool of MySQL connections.
+
+    Connections are validated on checkout when they have been idle for a
+    while, recycled once they exceed ``max_lifetime`` and always returned
+    through :meth:`connection`.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        min_size: int,
+        max_size: int,
+        max_lifetime: float,
+        validate_after: float,
+        checkout_timeout: float,
+    ):
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max(max_size, 1)
+        self.max_lifetime = max_lifetime
+        self.validate_after = validate_after
+        self.checkout_timeout = checkout_timeout
+
+        self._cond = threading.Condition()
+        self._idle: deque = deque()
+        self._size = 0
+        self._in_use = 0
+        self._waiting = 0
+
+        self._checkouts = 0
+        self._timeouts = 0
+        self._created = 0
+        self._recycled = 0
+        self._discarded = 0
+        self._checkout_time_total = 0.0
+        self._checkout_time_max = 0.0
+
+    # --- Public API ---
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        """Check a connection out of the pool and always give it back."""
+        entry = self._checkout()
+        discard = False
+        # La ejecución en curso puede cancelar (KILL QUERY) lo que corra en esta conexión.
+        scope = deadlines.current_scope()
+        try:
+            if scope is not None:
+                scope.attach(entry.conn, self)
+            yield entry.conn
+        except BaseException:
+            # Una conexión que falló a mitad de consulta puede quedar con
+            # resultados sin leer; si no se puede limpiar, se descarta.
+            try:
+                entry.conn.rollback()
+            except Exception:
+                discard = True
+            raise
+        finally:
+            if scope is not None:
+                scope.detach(entry.conn)
+            self._checkin(entry, discard)
+
+    def warm(self) -> None:
+        """Open connections until the pool holds ``min_size`` of them."""
+        while True:
+            with self._cond:
+                if self._size >= self.min_size or self._size >= self.max_size:
+                    return
+                self._size += 1
+            try:
+                entry = self._open()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                raise
+            with self._cond:
+                self._idle.append(entry)
+                self._cond.notify()
+
+    def close(self) -> None:
+        """Close every idle connection."""
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+            self._size -= len(idle)
+        for entry in idle:
+            self._close(entry)
+
+    def load(self) -> int:
+        """Connections in use plus checkouts waiting for one."""
+        with self._cond:
+            return self._in_use + self._waiting
+
+    def kill_queries(self, thread_ids: List[int]) -> None:
+        """``KILL QUERY`` the statements running on the given connections of this pool.
+
+        Uses a connection of its own: the pool may be exhausted by the very
+        queries being killed.
+        """
+        try:
+            conn = self._connect()
+        except Exception:
+            logger.warning("Could not connect to kill queries %s", thread_ids, exc_info=True)
+            return
+        try:
+            cursor = conn.cursor()
+            for thread_id in thread_ids:
+                try:
+                    cursor.execute(f"KILL QUERY {int(thread_id)}")
+                except mysql.connector.Error:
+                    # La consulta ya había terminado o la conexión se cerró.
+                    logger.debug("KILL QUERY %s failed", thread_id, exc_info=True)
+            cursor.close()
+        finally:
+            conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            checkouts = self._checkouts
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "waiting": self._waiting,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "checkouts": checkouts,
+                "timeouts": self._timeouts,
+                "created": self._created,
+                "recycled": self._recycled,
+                "discarded": self._discarded,
+                "checkout_latency_avg_ms": (self._checkout_time_total / checkouts * 1000) if checkouts else 0.0,
+                "checkout_latency_max_ms": self._checkout_time_max * 1000,
+            }
+
+    # --- Internals ---
+
+    def _checkout(self) -> _PooledConnection:
+        start = time.monotonic()
+        deadline = start + self.checkout_timeout
+        entry: Optional[_PooledConnection] = None
+        with self._cond:
+            self._waiting += 1
+            try:
+                while True:
+                    if self._idle:
+                        # LIFO: la conexión más reciente es la que menos probablemente expiró.
+                        entry = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeoutError(
+                            f"No database connection available after {self.checkout_timeout}s "
+                            f"(pool max_size={self.max_size})"
+                        )
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+            self._in_use += 1
+
+        try:
+            if entry is not None and not self._usable(entry):
+                self._close(entry)
+                entry = None
+            if entry is None:
+                entry = self._open()
+        except BaseException:
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        elapsed = time.monotonic() - start
+        metrics.observe_phase("checkout", elapsed)
+        with self._cond:
+            self._checkouts += 1
+            self._checkout_time_total += elapsed
+            if elapsed > self._checkout_time_max:
+                self._checkout_time_max = elapsed
+        return entry
+
+    def _checkin(self, entry: _PooledConnection, discard: bool) -> None:
+        now = time.monotonic()
+        entry.last_used = now
+        expired = now - entry.created_at >= self.max_lifetime
+        if discard or expired:
+            self._close(entry)
+        with self._cond:
+            self._in_use -= 1
+            if discard or expired:
+                self._size -= 1
+                if expired:
+                    self._recycled += 1
+                else:
+                    self._discarded += 1
+            else:
+                self._idle.append(entry)
+            self._cond.notify()
+
+    def _usable(self, entry: _PooledConnection) -> bool:
+        now = time.monotonic()
+        if now - entry.created_at >= self.max_lifetime:
+            with self._cond:
+                self._recycled += 1
+            return False
+        if now - entry.last_used >= self.validate_after:
+            try:
+                entry.conn.ping(reconnect=False)
+            except Exception:
+                with self._cond:
+                    self._discarded += 1
+                return False
+        return True
+
+    def _open(self) -> _PooledConnection:
+        entry = _PooledConnection(self._connect())
+        with self._cond:
+            self._created += 1
+        return entry
+
+    @staticmethod
+    def _close(entry: _PooledConnection) -> None:
+        try:
+            entry.conn.close()
+        except Exception:
+            logger.debug("Error closing pooled connection", exc_info=True)
+
+
+def _pool(connect: Callable[[], Any]) -> ConnectionPool:
+    return ConnectionPool(
+        connect=connect,
+        min_size=config.DB_POOL_MIN_SIZE,
+        max_size=config.DB_POOL_MAX_SIZE,
+        max_lifetime=config.DB_POOL_MAX_LIFETIME,
+        validate_after=config.DB_POOL_VALIDATE_AFTER,
+        checkout_timeout=config.DB_POOL_CHECKOUT_TIMEOUT,
+    )
+
+
+def _replica(dsn: str) -> replicas.Replica:
+    settings = replicas.parse_dsn(dsn)
+    return replicas.Replica(f"{settings['host']}:{settings['port']}", _pool(functools.partial(_connect, **settings)))
+
+
+pool = _pool(_connect)
+router = replicas.ReplicaRouter(pool, [_replica(dsn) for dsn in config.DB_REPLICAS])
+
+
+@contextmanager
+def db_connection() -> Iterator[Any]:
+    """Pooled connection from a replica when the current tool execution
+    tolerates the lag of one (see :mod:`src.replicas`), else from the primary."""
+    with ExitStack() as stack:
+        conn = None
+        replica = router.choose()
+        if replica is not None:
+            try:
+                conn = stack.enter_context(replica.pool.connection())
+            except (PoolTimeoutError, mysql.connector.Error) as e:
+                # Réplica caída o saturada: se lee del primario hasta la próxima medición.
+                router.mark_down(replica, e)
+        if conn is None:
+            conn = stack.enter_context(pool.connection())
+        yield conn
+
+
+def kill_queries(targets: List[Tuple[ConnectionPool, int]]) -> None:
+    """``KILL QUERY`` the statements running on the given (pool, MySQL thread id) pairs."""
+    by_pool: Dict[int, Tuple[ConnectionPool, List[int]]] = {}
+    for target_pool, thread_id in targets:
+        by_pool.setdefault(id(target_pool), (target_pool, []))[1].append(thread_id)
+    for target_pool, thread_ids in by_pool.values():
+        target_pool.kill_queries(thread_ids)
+
+
+heartbeat_task = register(PeriodicTask("replica_heartbeat", config.REPLICA_HEARTBEAT_INTERVAL, router.monitor))
+
+
+class DatabaseClock:
+    """Local time of the primary MySQL server.
+
+    "Today" in the data is the server's ``CURDATE()``, but this process may
+    run in another time zone (containers usually run in UTC). The offset
+    between both clocks is measured periodically, so :meth:`now` never
+    touches the database. Until the first measurement it is the local time.
+    """
+
+    def __init__(self):
+        self._offset = timedelta(0)
+
+    def measure(self) -> Dict[str, Any]:
+        with pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                sent = datetime.now()
+                cursor.execute("SELECT NOW(6)")
+                (server_now,) = cursor.fetchone()
+                received = datetime.now()
+            finally:
+                cursor.close()
+        # La hora del servidor se toma a mitad del viaje de ida y vuelta.
+        self._offset = server_now - (sent + (received - sent) / 2)
+        return {"offset_s": round(self._offset.total_seconds(), 3)}
+
+    def now(self) -> datetime:
+        return datetime.now() + self._offset
+
+    def today(self) -> date:
+        return self.now().date()
+
+
+db_clock = DatabaseClock()
+clock_task = register(PeriodicTask("db_clock", config.DB_CLOCK_INTERVAL, db_clock.measure))
+
+
+@contextmanager
+def _scoped(query: str) -> Iterator[str]:
+    """Bound ``query`` by the current deadline and type its timeout errors."""
+    scope = deadlines.current_scope()
+    if scope is None:
+        yield query
+        return
+    try:
+        yield scope.bound(query)
+    except mysql.connector.Error as e:
+        error = scope.error_for(e.errno)
+        if error is not None:
+            raise error from e
+        raise
+
+
+def run_query(cursor, query: str, params: Optional[dict] = None) -> List[Any]:
+    """Execute ``query`` on ``cursor`` and fetch every row, timing both phases."""
+    with _scoped(query) as bounded:
+        start = time.perf_counter()
+        cursor.execute(bounded, params)
+        executed = time.perf_counter()
+        rows = cursor.fetchall()
+    _observe(query, params, executed - start, time.perf_counter() - executed, len(rows))
+    return rows
+
+
+def _observe(query: str, params: Optional[dict], execute_s: float, fetch_s: float, rows: int) -> None:
+    metrics.observe_phase("execute", execute_s)
+    metrics.observe_phase("fetch", fetch_s)
+    slow_queries.observe(query, params, execute_s, fetch_s, rows)
+
+
+def fetch_all(query: str, params: Optional[dict] = None) -> List[Dict[str, Any]]:
+    """Run ``query`` on a pooled connection and return every row as a dict."""
+    with db_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            return run_query(cursor, query, params)
+        finally:
+            cursor.close()
+
+
+def iter_rows(query: str, params: Optional[dict] = None, fetch_size: Optional[int] = None) -> Iterator[List[Dict[str, Any]]]:
+    """Yield the rows of ``query`` as dicts, ``fetch_size`` at a time.
+
+    The cursor is unbuffered, so the result is never held in full: the
+    connection stays checked out until the generator is exhausted or
+    closed. Closing it early discards the connection, since the unread
+    rows would otherwise have to be drained.
+    """
+    fetch_size = max(fetch_size or config.STREAM_FETCH_SIZE, 1)
+    with db_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            with _scoped(query) as bounded:
+                start = time.perf_counter()
+                cursor.execute(bounded, params)
+            execute_s = time.perf_counter() - start
+            # Solo cuenta el tiempo dentro de fetchmany, no el que el consumidor tarda en pedir el lote.
+            fetch_s = 0.0
+            total = 0
+            while True:
+                start = time.perf_counter()
+                rows = cursor.fetchmany(fetch_size)
+                fetch_s += time.perf_counter() - start
+                if not rows:
+                    _observe(query, params, execute_s, fetch_s, total)
+                    return
+                total += len(rows)
+                yield rows
+        finally:
+            try:
+                cursor.close()
+            except Exception:
+                # Quedan filas sin leer: el rollback del pool falla y la conexión se descarta.
+                logger.debug("Closing a partially read cursor", exc_info=True)
+
+
+def in_clause(name: str, values: Iterable[Any]) -> Tuple[str, Dict[str, Any]]:
+    """Build ``IN (%(name_0)s, ...)`` and its params for a non-empty list of values."""
+    params = {f"{name}_{i}": value for i, value in enumerate(values)}
+    return "IN (" + ", ".join(f"%({key})s" for key in params) + ")", params
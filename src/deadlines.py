@@ -0,0 +1,131 @@
+"""Execution deadlines and cancellation of tool queries.
+
+Each tool execution runs inside a :class:`QueryScope` carried by a context
+variable (the executor copies it into the worker thread). The scope:
+
+* bounds every ``SELECT`` with a ``MAX_EXECUTION_TIME`` optimizer hint set
+  to the time left, so MySQL stops the statement on its own;
+* remembers the connections checked out by the execution and the pool
+  (primary or replica) each came from, so :meth:`QueryScope.cancel` can
+  ``KILL QUERY`` them on the right server when the deadline passes or
+  every client waiting for the result has disconnected.
+"""
+import re
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from . import config
+
+# Errores de MySQL: 3024 = MAX_EXECUTION_TIME excedido, 1317 = consulta interrumpida (KILL QUERY).
+ER_QUERY_TIMEOUT = 3024
+ER_QUERY_INTERRUPTED = 1317
+
+_FIRST_SELECT = re.compile(r"\bSELECT\b", re.IGNORECASE)
+
+
+class ToolTimeoutError(Exception):
+    """A tool execution exceeded its deadline.
+
+    Reported apart from other failures (``error_type: "timeout"``, HTTP 504):
+    retrying the same call is likely to time out again.
+    """
+
+    def __init__(self, tool_name: str, timeout: float):
+        self.tool_name = tool_name
+        self.timeout = timeout
+        super().__init__(
+            f"Tiempo límite excedido: '{tool_name}' no terminó en {timeout:g} s. "
+            "Reintentar con los mismos argumentos probablemente vuelva a fallar; "
+            "acote el rango de fechas o los filtros."
+        )
+
+
+class QueryCancelledError(Exception):
+    """The execution was cancelled because no client waits for it anymore."""
+
+
+def timeout_for(tool_name: str) -> float:
+    """Deadline in seconds of ``tool_name``; ``0`` means unlimited."""
+    return config.TOOL_TIMEOUT_OVERRIDES.get(tool_name, config.TOOL_TIMEOUT)
+
+
+class QueryScope:
+    """Deadline and open connections of one tool execution."""
+
+    def __init__(self, tool_name: str, timeout: float, kill: Callable[[List[Tuple[Any, int]]], None]):
+        self.tool_name = tool_name
+        self.timeout = timeout
+        self.deadline = time.monotonic() + timeout if timeout > 0 else None
+        self._kill = kill
+        self._lock = threading.Lock()
+        # id(conexión) -> (pool de origen, id de hilo en MySQL)
+        self._connections: Dict[int, Tuple[Any, int]] = {}
+        self.cancelled = False
+        self.timed_out = False
+
+    def remaining(self) -> Optional[float]:
+        return None if self.deadline is None else self.deadline - time.monotonic()
+
+    def check(self) -> None:
+        """Raise if the execution should not issue more queries."""
+        if self.cancelled:
+            if self.timed_out:
+                raise ToolTimeoutError(self.tool_name, self.timeout)
+            raise QueryCancelledError(f"'{self.tool_name}' was cancelled")
+        remaining = self.remaining()
+        if remaining is not None and remaining <= 0:
+            self.timed_out = True
+            raise ToolTimeoutError(self.tool_name, self.timeout)
+
+    def bound(self, query: str) -> str:
+        """``query`` with a ``MAX_EXECUTION_TIME`` hint for the time left."""
+        self.check()
+        remaining = self.remaining()
+        if remaining is None:
+            return query
+        hint = f"SELECT /*+ MAX_EXECUTION_TIME({max(int(remaining * 1000), 1)}) */"
+        return _FIRST_SELECT.sub(hint, query, count=1)
+
+    def attach(self, conn, pool: Any) -> None:
+        self.check()
+        with self._lock:
+            self._connections[id(conn)] = (pool, conn.connection_id)
+
+    def detach(self, conn) -> None:
+        with self._lock:
+            self._connections.pop(id(conn), None)
+
+    def cancel(self, timed_out: bool = False) -> None:
+        """Stop the execution: no new queries, running ones are killed."""
+        with self._lock:
+            self.cancelled = True
+            self.timed_out = self.timed_out or timed_out
+            targets = [(pool, thread_id) for pool, thread_id in self._connections.values() if thread_id]
+        if targets:
+            # KILL abre su propia conexión: no se hace en el event loop.
+            threading.Thread(target=self._kill, args=(targets,), name="kill-query", daemon=True).start()
+
+    def error_for(self, errno: Optional[int]) -> Optional[Exception]:
+        """Typed error for a MySQL error raised inside the scope, if it is a timeout."""
+        if errno == ER_QUERY_TIMEOUT or (errno == ER_QUERY_INTERRUPTED and self.timed_out):
+            self.timed_out = True
+            return ToolTimeoutError(self.tool_name, self.timeout)
+        return None
+
+
+_scope: ContextVar[Optional[QueryScope]] = ContextVar("query_scope", default=None)
+
+
+def current_scope() -> Optional[QueryScope]:
+    return _scope.get()
+
+
+def enter(scope: QueryScope):
+    """Make ``scope`` current; returns the token for :func:`leave`."""
+    return _scope.set(scope)
+
+
+def leave(token) -> None:
+    _scope.reset(token)
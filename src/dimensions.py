@@ -0,0 +1,173 @@
+"""In-process caches of the small lookup tables the tools translate ids with.
+
+``procedures``, ``request_states``, ``roles`` and ``actions`` are loaded into
+id -> name maps at startup and reloaded in the background when ``CHECKSUM
+TABLE`` reports a change. Queries can then filter by id and return ids,
+and the names are filled in here without joining those tables.
+
+An unknown id usually means a row added since the last load: the caches
+are then checked again right away, at most once every
+``DIMENSION_MISS_REFRESH_INTERVAL`` seconds, before the id is given up on.
+"""
+import logging
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from . import config
+from .background import PeriodicTask, register
+from .db import db_connection
+from .name_index import NameIndex, NameMatch, collation_key
+
+logger = logging.getLogger(__name__)
+
+
+class Dimension:
+    """id -> name map of one lookup table."""
+
+    def __init__(self, cache: "DimensionCache", table: str, label_column: str):
+        self._cache = cache
+        self.table = table
+        self.label_column = label_column
+        self._names: Dict[int, str] = {}
+        self._ids: Dict[str, Tuple[int, ...]] = {}
+        self._index = NameIndex(())
+
+    def load(self, rows: Iterable[Tuple[int, str]]) -> None:
+        names: Dict[int, str] = {}
+        ids: Dict[str, Tuple[int, ...]] = {}
+        for id_, name in rows:
+            if name is None:
+                continue
+            names[id_] = name
+            key = collation_key(name)
+            ids[key] = ids.get(key, ()) + (id_,)
+        # Se reemplazan los dicts completos: los lectores nunca ven una carga a medias.
+        self._names, self._ids, self._index = names, ids, NameIndex(names.values())
+
+    def name(self, id_: Optional[int]) -> Optional[str]:
+        """Name of ``id_``, or ``None`` when the id is unknown."""
+        if id_ is None:
+            return None
+        self._cache.ensure_loaded()
+        name = self._names.get(id_)
+        if name is None:
+            self._cache.refresh_on_miss()
+            name = self._names.get(id_)
+        return name
+
+    def ids(self, name: str) -> Tuple[int, ...]:
+        """Ids whose name equals ``name`` under a case-insensitive collation."""
+        self._cache.ensure_loaded()
+        return self._ids.get(collation_key(name), ())
+
+    def resolve(self, name: str) -> NameMatch:
+        """Canonical name closest to ``name``, see :class:`NameIndex`."""
+        self._cache.ensure_loaded()
+        return self._index.resolve(name)
+
+    def names(self) -> List[str]:
+        self._cache.ensure_loaded()
+        return list(self._names.values())
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+
+class DimensionCache:
+    """Loads every dimension and keeps it in sync with the database."""
+
+    def __init__(self):
+        self.procedures = Dimension(self, "procedures", "name")
+        self.request_states = Dimension(self, "request_states", "description")
+        self.roles = Dimension(self, "roles", "name")
+        self.actions = Dimension(self, "actions", "description")
+        self.version = 0
+        self._checksums: Dict[str, Any] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._miss_lock = threading.Lock()
+        self._miss_refreshed_at = float("-inf")
+        self._miss_refreshes = 0
+
+    @property
+    def dimensions(self) -> List[Dimension]:
+        return [self.procedures, self.request_states, self.roles, self.actions]
+
+    def ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.refresh()
+
+    def refresh(self) -> Dict[str, Any]:
+        """Reload the tables whose checksum changed since the last load."""
+        with self._lock, db_connection() as conn:
+            cursor = conn.cursor(buffered=True)
+            try:
+                tables = ", ".join(d.table for d in self.dimensions)
+                cursor.execute(f"CHECKSUM TABLE {tables}")
+                # CHECKSUM TABLE devuelve "schema.tabla"; se indexa por el nombre corto.
+                checksums = {row[0].rsplit(".", 1)[-1]: row[1] for row in cursor.fetchall()}
+                reloaded = []
+                for dimension in self.dimensions:
+                    checksum = checksums.get(dimension.table)
+                    if self._loaded and checksum is not None and checksum == self._checksums.get(dimension.table):
+                        continue
+                    cursor.execute(f"SELECT id, {dimension.label_column} FROM {dimension.table}")
+                    dimension.load(cursor.fetchall())
+                    self._checksums[dimension.table] = checksum
+                    reloaded.append(dimension.table)
+            finally:
+                cursor.close()
+            if reloaded:
+                self.version += 1
+                logger.info("Dimension caches reloaded: %s (version %s)", ", ".join(reloaded), self.version)
+            self._loaded = True
+            return {"version": self.version, "reloaded": reloaded}
+
+    def refresh_on_miss(self) -> None:
+        """Check the tables again after an unknown id, unless that was already
+        done in the last ``DIMENSION_MISS_REFRESH_INTERVAL`` seconds."""
+        with self._miss_lock:
+            # Quien esperaba la recarga de otro hilo ya ve su resultado: no se repite.
+            if time.monotonic() - self._miss_refreshed_at < config.DIMENSION_MISS_REFRESH_INTERVAL:
+                return
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Could not reload the dimension caches after an unknown id")
+            self._miss_refreshed_at = time.monotonic()
+            self._miss_refreshes += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "loaded": self._loaded,
+            "miss_refreshes": self._miss_refreshes,
+            "sizes": {d.table: len(d) for d in self.dimensions},
+        }
+
+
+def decorate(rows: List[Dict[str, Any]], optional: Tuple[str, ...] = (), **columns: Dimension) -> List[Dict[str, Any]]:
+    """Replace id columns with names: ``decorate(rows, tramite=dimensions.procedures)``.
+
+    The key keeps its position, so the rows look as if the name had been
+    selected by the query. As with an inner ``JOIN``, rows whose id has no
+    name are dropped, except in the ``optional`` columns (a ``LEFT JOIN``),
+    which are left as ``None``.
+    """
+    decorated = []
+    for row in rows:
+        for column, dimension in columns.items():
+            row[column] = dimension.name(row[column])
+            if row[column] is None and column not in optional:
+                break
+        else:
+            decorated.append(row)
+    return decorated
+
+
+dimensions = DimensionCache()
+
+dimension_task = register(
+    PeriodicTask("dimensions", config.DIMENSION_REFRESH_INTERVAL, dimensions.refresh)
+)
@@ -0,0 +1,93 @@
+"""Dispatch pipeline between the HTTP endpoints and the tools registry."""
+import asyncio
+from typing import Any, Dict
+
+from pydantic import ValidationError
+
+from . import metrics, replicas
+from .cache import result_cache, ttl_for
+from .db import kill_queries
+from .deadlines import QueryScope, ToolTimeoutError, enter, leave, timeout_for
+from .scheduler import scheduler
+from .singleflight import call_key, singleflight
+from .tools import InputErrorText, ToolInputError
+
+_MISS = object()
+
+
+def normalize_args(tool, args: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate ``args`` against the tool schema; the tool runs with the result.
+
+    ``{"request_id": "5"}`` and ``{"request_id": 5}`` normalize to the same
+    dict, so equivalent calls also share their cache entry and execution.
+    Raises :class:`~src.tools.ToolInputError` when ``args`` do not validate.
+    """
+    try:
+        return tool.args_schema(**args).model_dump()
+    except ValidationError as e:
+        problems = "; ".join(
+            f"{'.'.join(str(part) for part in error['loc']) or 'args'}: {error['msg']}"
+            for error in e.errors(include_url=False)
+        )
+        raise ToolInputError(f"Error: argumentos inválidos para '{tool.name}': {problems}") from None
+
+
+def _cacheable(result: Any) -> bool:
+    # Las herramientas informan los fallos de BD como texto "Error ..." y los
+    # de entrada (p. ej. un trámite que aún no existe) como InputErrorText; no se cachean.
+    return not (isinstance(result, InputErrorText) or (isinstance(result, str) and result.startswith("Error")))
+
+
+async def dispatch(tool_name: str, tool, args: Dict[str, Any], bypass_cache: bool = False, structured: bool = False) -> Any:
+    """Run ``tool`` with ``args``: result cache, then call coalescing, then the
+    scheduler (by the call's cost class), then the executor.
+
+    With ``structured`` the tool's ``fetch`` step runs instead of ``run`` and
+    the typed :class:`~src.tools.ToolData` is returned (and cached apart
+    from the text). Arguments that do not validate are reported like any
+    other input error: raised in structured mode, as text otherwise.
+    """
+    try:
+        normalized = normalize_args(tool, args)
+    except ToolInputError as e:
+        if structured:
+            raise
+        metrics.count_error("input")
+        return str(e)
+    key = call_key(tool_name, normalized)
+    if structured:
+        key += "#data"
+    if bypass_cache:
+        result_cache.record_bypass()
+    else:
+        cached = result_cache.get(key, _MISS)
+        if cached is not _MISS:
+            return cached
+
+    async def run():
+        return await scheduler.run(tool.cost(normalized), tool.fetch if structured else tool.run, **normalized)
+
+    async def execute():
+        # El scope viaja al worker con el contexto; acota y, si hace falta, cancela sus consultas.
+        scope = QueryScope(tool_name, timeout_for(tool_name), kill_queries)
+        token = enter(scope)
+        route = replicas.enter(tool.replica_lag_tolerance())
+        try:
+            # El límite incluye la espera en el scheduler.
+            result = await asyncio.wait_for(run(), scope.timeout) if scope.timeout > 0 else await run()
+        except asyncio.TimeoutError:
+            scope.cancel(timed_out=True)
+            raise ToolTimeoutError(tool_name, scope.timeout) from None
+        except asyncio.CancelledError:
+            scope.cancel()
+            raise
+        finally:
+            replicas.leave(route)
+            leave(token)
+        if structured:
+            metrics.observe_rows(len(result.rows))
+        if _cacheable(result):
+            result_cache.set(key, result, ttl_for(tool_name, normalized))
+        return result
+
+    return await singleflight.do(key, execute)
@@ -0,0 +1,88 @@
+"""Runs blocking tool bodies on a bounded worker pool, off the event loop."""
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from . import config
+
+
+class ExecutorSaturatedError(Exception):
+    """Raised when the worker pool and its queue are both full."""
+
+
+class ToolExecutor:
+    """Bounded thread pool with a queue-depth limit.
+
+    At most ``max_workers`` tool bodies run at once and at most ``max_queue``
+    more wait for a worker; anything beyond that is rejected immediately
+    instead of piling up behind a slow query.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self.max_workers = max(max_workers, 1)
+        self.max_queue = max(max_queue, 0)
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tool-worker")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._completed = 0
+        self._rejected = 0
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def submit(self, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        """Queue ``fn`` on a worker and return its future, which completes when
+        the worker is done even if whoever awaits it gives up earlier."""
+        return self._submit(functools.partial(fn, *args, **kwargs), bounded=True)
+
+    def cleanup(self, fn: Callable[..., Any], *args) -> Future:
+        """Like :meth:`submit`, but never rejected: for short work that must
+        run, such as closing a cursor, even when the queue is full."""
+        return self._submit(functools.partial(fn, *args), bounded=False)
+
+    def _submit(self, call: Callable[[], Any], bounded: bool) -> Future:
+        with self._lock:
+            if bounded and self._pending >= self.max_workers + self.max_queue:
+                self._rejected += 1
+                raise ExecutorSaturatedError(
+                    f"Server busy: {self._pending} tool calls in progress "
+                    f"(workers={self.max_workers}, queue={self.max_queue})"
+                )
+            self._pending += 1
+        # El contexto se copia para que los contextvars del request lleguen al worker.
+        ctx = contextvars.copy_context()
+        try:
+            future = self._pool.submit(ctx.run, call)
+        except BaseException:
+            self._release(None)
+            raise
+        # El contador se libera cuando el worker termina, no cuando el cliente
+        # deja de esperar: un hilo ocupado sigue contando aunque se cancele el await.
+        future.add_done_callback(self._release)
+        return future
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = self._pending
+            return {
+                "workers": self.max_workers,
+                "queue_limit": self.max_queue,
+                "running": min(pending, self.max_workers),
+                "queued": max(pending - self.max_workers, 0),
+                "completed": self._completed,
+                "rejected": self._rejected,
+            }
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _release(self, _future) -> None:
+        with self._lock:
+            self._pending -= 1
+            self._completed += 1
+
+
+executor = ToolExecutor(max_workers=config.TOOL_WORKERS, max_queue=config.TOOL_QUEUE_LIMIT)
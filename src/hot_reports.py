@@ -0,0 +1,147 @@
+"""Reports recomputed in the background and served from memory.
+
+A hot report is a tool result that operators ask for constantly and that
+takes no arguments. Each registered report has a periodic task that first
+reads a cheap watermark (what the report depends on: the day, high-water
+marks, counts) and recomputes the report only when the watermark moved.
+Calls are then answered from memory without touching the database.
+
+Tasks of different reports are staggered over the refresh interval so
+their queries do not hit the database at the same moment. A value computed
+on a previous day is never served: after midnight calls fall back to a live
+computation until the first refresh of the new day, which is triggered
+right away.
+"""
+import logging
+import threading
+import time
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Optional
+
+from . import config, metrics
+from .background import PeriodicTask, register as register_task
+from .db import db_clock
+
+logger = logging.getLogger(__name__)
+
+
+class HotReport:
+    """One report: how to compute it, its watermark and the last value."""
+
+    def __init__(self, name: str, compute: Callable[[], Any], watermark: Callable[[date], Any], interval: float):
+        self.name = name
+        self.compute = compute
+        self.watermark = watermark
+        self._lock = threading.Lock()
+        self._value: Any = None
+        self._day: Optional[date] = None
+        self._watermark: Any = None
+        self._computed_at: Optional[datetime] = None
+        self._computed_monotonic = 0.0
+        # Última vez que se confirmó vigente (recalculado o sin cambios): su antigüedad real.
+        self._checked_at: Optional[datetime] = None
+        self._checked_monotonic = 0.0
+        self._refreshes = 0
+        self._skips = 0
+        self._hits = 0
+        self._misses = 0
+        self.task = PeriodicTask(f"hot_report:{name}", interval, self.refresh)
+
+    def refresh(self) -> Dict[str, Any]:
+        """Recompute the report if its watermark moved since the last refresh."""
+        today = db_clock.today()
+        watermark = self.watermark(today)
+        with self._lock:
+            # Aunque la marca no se mueva, se recalcula antes de que el valor llegue a HOT_REPORT_MAX_AGE.
+            expiring = time.monotonic() - self._computed_monotonic + self.task.interval > config.HOT_REPORT_MAX_AGE
+            unchanged = self._day == today and self._watermark == watermark and not expiring
+            if unchanged:
+                self._mark_checked()
+                self._skips += 1
+        if unchanged:
+            return {"refreshed": False}
+        with metrics.timed("hot_report"):
+            value = self.compute()
+        with self._lock:
+            self._value = value
+            self._day = today
+            self._watermark = watermark
+            self._computed_at = db_clock.now()
+            self._computed_monotonic = time.monotonic()
+            self._mark_checked()
+            self._refreshes += 1
+        return {"refreshed": True}
+
+    def get(self) -> Optional[Dict[str, Any]]:
+        """The last value and when it was last known current; ``None`` when it cannot be served."""
+        with self._lock:
+            usable = (
+                self._day == db_clock.today()
+                and time.monotonic() - self._computed_monotonic <= config.HOT_REPORT_MAX_AGE
+            )
+            if usable:
+                self._hits += 1
+                return {"value": self._value, "as_of": self._checked_at}
+            self._misses += 1
+            rolled_over = self._day is not None and self._day != db_clock.today()
+        if rolled_over:
+            # Pasó la medianoche: se recalcula ya en lugar de esperar el próximo turno.
+            self.task.trigger()
+        return None
+
+    def age(self) -> Optional[float]:
+        """Seconds since the value was last known current."""
+        with self._lock:
+            return time.monotonic() - self._checked_monotonic if self._checked_at else None
+
+    def stats(self) -> Dict[str, Any]:
+        age = self.age()
+        with self._lock:
+            return {
+                "name": self.name,
+                "interval": self.task.interval,
+                "offset": self.task.initial_delay,
+                "day": self._day.isoformat() if self._day else None,
+                "computed_at": self._computed_at.isoformat() if self._computed_at else None,
+                "checked_at": self._checked_at.isoformat() if self._checked_at else None,
+                "age_s": round(age, 3) if age is not None else None,
+                "refreshes": self._refreshes,
+                "skipped": self._skips,
+                "hits": self._hits,
+                "misses": self._misses,
+            }
+
+    def _mark_checked(self) -> None:
+        self._checked_at = db_clock.now()
+        self._checked_monotonic = time.monotonic()
+
+
+_reports: Dict[str, HotReport] = {}
+
+
+def register(name: str, compute: Callable[[], Any], watermark: Callable[[date], Any], interval: Optional[float] = None) -> HotReport:
+    """Refresh ``compute`` in the background whenever ``watermark(today)`` changes.
+
+    Must be called before the background tasks start; the start offsets of
+    all registered reports are spread evenly over their interval.
+    """
+    report = HotReport(name, compute, watermark, interval or config.HOT_REPORT_INTERVAL)
+    _reports[name] = report
+    register_task(report.task)
+    for index, each in enumerate(_reports.values()):
+        each.task.initial_delay = each.task.interval * index / len(_reports)
+    return report
+
+
+def get(name: str) -> Optional[Dict[str, Any]]:
+    """Value of the hot report ``name`` with its ``as_of`` time, if it can be served."""
+    report = _reports.get(name)
+    return report.get() if report is not None else None
+
+
+def stats() -> Dict[str, Any]:
+    return {"max_age_s": config.HOT_REPORT_MAX_AGE, "reports": [report.stats() for report in _reports.values()]}
+
+
+def ages() -> Dict[str, float]:
+    return {name: age for name, report in _reports.items() if (age := report.age()) is not None}
@@ -0,0 +1,143 @@
+"""Structured, non-blocking logging for the server's own loggers.
+
+Records of the ``src.*`` loggers are put on a bounded queue by the calling
+thread and written as one JSON object per line by a :class:`QueueListener`
+thread, so stdout I/O never sits on the request path. When the queue is
+full, records are dropped and counted instead of blocking.
+
+Arguments attached to a record (``extra={"fields": {...}}``) are redacted
+by the writer thread: values under keys containing ``dni`` are replaced by
+a short keyed hash, so personal data never reaches the logs but equal
+values can still be correlated within one process.
+"""
+import copy
+import hashlib
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+from . import config
+
+# Claves cuyo valor es un dato personal (dni, dnis, dni_usuario, dni_agente, ...).
+SENSITIVE_KEYS = ("dni",)
+# Clave del hash por proceso: un DNI tiene pocos dígitos y un hash sin clave se revierte por fuerza bruta.
+_HASH_KEY = os.urandom(16)
+
+logger = logging.getLogger(__package__)
+_listener: Optional[QueueListener] = None
+_handler: Optional["_DroppingQueueHandler"] = None
+
+
+def keyed_hash(text: str, digest_size: int = 6) -> str:
+    """Hash of ``text`` under the per-process key: comparable within this process, not reversible by brute force."""
+    return hashlib.blake2b(text.encode(), key=_HASH_KEY, digest_size=digest_size).hexdigest()
+
+
+def _mask(value: Any) -> Any:
+    if isinstance(value, (list, tuple, set)):
+        return [_mask(item) for item in value]
+    if value is None:
+        return None
+    return "h:" + keyed_hash(str(value))
+
+
+def redact(value: Any) -> Any:
+    """Copy of ``value`` with sensitive keys masked, at any nesting level."""
+    if isinstance(value, dict):
+        return {
+            key: _mask(item) if any(word in str(key).lower() for word in SENSITIVE_KEYS) else redact(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    return value
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message and fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(redact(fields))
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _DroppingQueueHandler(QueueHandler):
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Solo se resuelve el mensaje y el traceback; el JSON y la redacción
+        # los hace el hilo del listener.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info and record.exc_info[0] is not None:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+
+def setup() -> None:
+    """Route the ``src.*`` loggers through the queue; idempotent."""
+    global _listener, _handler
+    if _listener is not None:
+        return
+    log_queue: queue.Queue = queue.Queue(maxsize=max(config.LOG_QUEUE_SIZE, 1))
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter())
+    _handler = _DroppingQueueHandler(log_queue)
+    logger.addHandler(_handler)
+    logger.setLevel(config.LOG_LEVEL.upper())
+    # uvicorn configura sus propios loggers; los del servidor no se duplican en el root.
+    logger.propagate = False
+    _listener = QueueListener(log_queue, output, respect_handler_level=False)
+    _listener.start()
+
+
+def shutdown() -> None:
+    """Flush the queue and stop the writer thread."""
+    global _listener, _handler
+    if _listener is not None:
+        _listener.stop()
+        logger.removeHandler(_handler)
+        _listener = _handler = None
+
+
+def sampled(tool_name: str) -> bool:
+    """Whether a routine record of ``tool_name`` is kept, per ``LOG_SAMPLE_RATES``."""
+    rate = config.LOG_SAMPLE_RATES.get(tool_name, config.LOG_SAMPLE_RATE)
+    return rate >= 1 or random.random() < rate
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        "level": logging.getLevelName(logger.level),
+        "queued": _handler.queue.qsize() if _handler else 0,
+        "dropped": _handler.dropped if _handler else 0,
+    }
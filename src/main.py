@@ -1,7 +1,35 @@
-from fastapi import FastAPI, HTTPException
-from typing import List
-import traceback
-from .models import ToolExecutionRequest, ToolExecutionResponse
+import asyncio
+import hmac
+import logging
+from contextlib import asynccontextmanager
+from fastapi import APIRouter, Depends, FastAPI, Header, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+from starlette.background import BackgroundTask
+from pydantic import ValidationError
+from typing import List, Optional
+from . import analytics, background, config, hot_reports, logs, metrics
+from .cache import result_cache
+from .db import db_clock, pool, router
+from .deadlines import ToolTimeoutError
+from .dimensions import dimensions
+from .dispatch import dispatch
+from .executor import executor, ExecutorSaturatedError
+from .scheduler import scheduler
+from .models import (
+    BatchExecutionRequest,
+    BatchExecutionResponse,
+    ToolExecutionRequest,
+    ToolExecutionResponse,
+    ToolStreamRequest,
+)
+from .pagination import InvalidCursorError
+from .projections import rebuild_current_state
+from .range_planner import chunk_cache
+from .rollups import rebuild_agent_rollup, rebuild_state_rollup
+from .serialization import dumps, structured
+from .singleflight import singleflight
+from .slow_queries import slow_query_log
+from .streaming import MEDIA_TYPES, is_streamable, open_stream
 from .tools import (
     EstadoSolicitudPorIdTool,
     EstadoUltimaSolicitudUsuarioTool,
@@ -15,15 +43,67 @@ from .tools import (
     ListarSolicitudesPorDniTool,
     ConsultarMensajesSolicitudTool,
     SolicitudesTramiteHoyTool,
+    ReportTool,
+    ToolInputError,
 )
 
+logger = logging.getLogger(__name__)
+
+# Cada cuánto se comprueba si el cliente de una llamada en curso se desconectó.
+DISCONNECT_POLL_INTERVAL = 0.5
+
 # --- App Initialization ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    logs.setup()
+    try:
+        pool.warm()
+    except Exception as e:
+        # El servidor arranca igual; las conexiones se abrirán bajo demanda.
+        logger.warning("Could not warm the database pool: %s", e)
+    for replica in router.replicas:
+        try:
+            replica.pool.warm()
+        except Exception as e:
+            logger.warning("Could not warm the pool of replica %s: %s", replica.name, e)
+    try:
+        dimensions.refresh()
+    except Exception as e:
+        # Se cargarán en la primera consulta que las necesite.
+        logger.warning("Could not load dimension caches: %s", e)
+    try:
+        # "Hoy" es la fecha del servidor MySQL, no la del contenedor.
+        db_clock.measure()
+    except Exception as e:
+        logger.warning("Could not read the database clock: %s", e)
+    background.start_all()
+    yield
+    background.stop_all()
+    analytics.snapshot.close()
+    executor.shutdown()
+    pool.close()
+    for replica in router.replicas:
+        replica.pool.close()
+    logs.shutdown()
+
 app = FastAPI(
     title="MCP Server",
     description="A server exposing tools compatible with the Model Context Protocol.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
+def require_admin_token(authorization: Optional[str] = Header(None)) -> None:
+    """Reject ``/admin`` calls without ``Authorization: Bearer <ADMIN_TOKEN>`` when a token is configured."""
+    if not config.ADMIN_TOKEN:
+        return
+    expected = f"Bearer {config.ADMIN_TOKEN}".encode()
+    if authorization is None or not hmac.compare_digest(authorization.encode(), expected):
+        raise HTTPException(status_code=401, detail="Admin token required.", headers={"WWW-Authenticate": "Bearer"})
+
+# Estadísticas y operaciones de mantenimiento; se registran en la app al final del módulo.
+admin = APIRouter(prefix="/admin", dependencies=[Depends(require_admin_token)])
+
 # --- Tool Registry ---
 # CORRECCIÓN: Crear primero el registry sin list_available_reports
 tools_registry = {
@@ -43,6 +123,10 @@ tools_registry = {
 # CORRECCIÓN: Luego añadir list_available_reports con el registry completo
 tools_registry["list_available_reports"] = ListAvailableReportsTool(tools_registry=tools_registry)
 
+# Reportes sin argumentos que se piden todo el tiempo: se recalculan en segundo plano.
+for _name in ("solicitudes_tramite_hoy",):
+    hot_reports.register(_name, tools_registry[_name].compute, tools_registry[_name].watermark)
+
 # --- API Endpoints ---
 
 @app.get("/", summary="Server Status")
@@ -64,8 +148,185 @@ def list_tools() -> List[dict]:
         )
     return tool_schemas
 
+@admin.get("/pool", summary="Connection Pool Stats")
+def pool_stats() -> dict:
+    """Returns usage counters of the shared database connection pool."""
+    return pool.stats()
+
+@admin.get("/replicas", summary="Read Replica Routing")
+def replica_stats() -> dict:
+    """Returns the measured lag, reads and pool usage of each read replica, and how often reads fell back to the primary."""
+    return router.stats()
+
+@admin.get("/executor", summary="Tool Executor Stats")
+def executor_stats() -> dict:
+    """Returns worker and queue usage of the tool executor."""
+    return executor.stats()
+
+@admin.get("/scheduler", summary="Scheduler Stats")
+def scheduler_stats() -> dict:
+    """Returns running, queued, admitted and shed calls per cost class."""
+    return scheduler.stats()
+
+@admin.get("/singleflight", summary="Call Coalescing Stats")
+def singleflight_stats() -> dict:
+    """Returns how many tool calls were served by an identical in-flight call."""
+    return singleflight.stats()
+
+@admin.get("/cache", summary="Result Cache Stats")
+def cache_stats() -> dict:
+    """Returns hit ratio, size and evictions of the tool result cache and of the range chunk cache."""
+    return {**result_cache.stats(), "range_chunks": chunk_cache.stats()}
+
+@admin.delete("/cache", summary="Clear Result Cache")
+def clear_cache() -> dict:
+    """Drops every cached tool result and range chunk."""
+    result_cache.clear()
+    chunk_cache.clear()
+    return {"status": "cleared"}
+
+@admin.get("/dimensions", summary="Dimension Cache Stats")
+def dimension_stats() -> dict:
+    """Returns the version and size of the in-process lookup table caches."""
+    return dimensions.stats()
+
+# Estado de los recursos compartidos, leído solo al consultar /metrics.
+metrics.gauge(
+    "mcp_db_pool_connections", "Pooled database connections by state.", ("state",),
+    lambda: {(state,): pool.stats()[state] for state in ("idle", "in_use", "waiting")},
+)
+metrics.gauge(
+    "mcp_replica_lag_seconds", "Measured replication lag of each read replica (absent while unknown).", ("replica",),
+    lambda: {(replica.name,): lag for replica in router.replicas if (lag := replica.current_lag()) is not None},
+)
+metrics.gauge(
+    "mcp_hot_report_age_seconds", "Seconds since each in-memory hot report was last known current.", ("report",),
+    lambda: {(name,): age for name, age in hot_reports.ages().items()},
+)
+metrics.gauge(
+    "mcp_executor_calls", "Tool calls on the executor by state.", ("state",),
+    lambda: {(state,): executor.stats()[state] for state in ("running", "queued")},
+)
+metrics.gauge(
+    "mcp_scheduler_calls", "Tool calls admitted by the scheduler, by cost class and state.", ("cost_class", "state"),
+    lambda: {
+        (cost, state): counts[state]
+        for cost, counts in scheduler.stats()["classes"].items()
+        for state in ("running", "queued")
+    },
+)
+metrics.gauge(
+    "mcp_cache_entries", "Results held by the result cache.", (),
+    lambda: {(): result_cache.stats()["entries"]},
+)
+
+@app.get("/metrics", summary="Prometheus Metrics")
+def prometheus_metrics() -> Response:
+    """Returns per-tool latency, phase, row, size and error metrics in the Prometheus text format."""
+    return Response(content=metrics.expose(), media_type=metrics.CONTENT_TYPE)
+
+@admin.get("/slow_queries", summary="Slow Tool Queries")
+def slow_queries() -> dict:
+    """Returns the slowest recent tool queries, newest first, with their EXPLAIN plans."""
+    return {**slow_query_log.stats(), "queries": slow_query_log.entries()}
+
+@admin.delete("/slow_queries", summary="Clear Slow Query Log")
+def clear_slow_queries() -> dict:
+    """Drops every recorded slow query."""
+    slow_query_log.clear()
+    return {"status": "cleared"}
+
+@admin.get("/logs", summary="Logging Stats")
+def log_stats() -> dict:
+    """Returns the log level and how many records are queued or were dropped."""
+    return logs.stats()
+
+@admin.get("/tasks", summary="Background Task Status")
+def task_statuses() -> List[dict]:
+    """Returns the last run, duration and error of each background task."""
+    return background.statuses()
+
+@admin.post("/projections/rebuild", summary="Rebuild Projections and Rollups")
+def rebuild_projection() -> dict:
+    """Rebuilds request_current_state from the full history and the rollups derived from it (slow)."""
+    return {
+        "request_current_state": rebuild_current_state(),
+        "request_state_daily_rollup": rebuild_state_rollup(),
+        "agent_state_change_daily_rollup": rebuild_agent_rollup(),
+    }
+
+@admin.get("/hot_reports", summary="Hot Report Stats")
+def hot_report_stats() -> dict:
+    """Returns the age, refreshes and skipped refreshes of each report served from memory."""
+    return hot_reports.stats()
+
+@admin.get("/analytics", summary="Analytics Snapshot Stats")
+def analytics_stats() -> dict:
+    """Returns whether the analytics snapshot answers the aggregate tools, its timestamp and how many reads it served."""
+    return analytics.snapshot.stats()
+
+@admin.post("/analytics/rebuild", summary="Rebuild Analytics Snapshot")
+def rebuild_analytics() -> dict:
+    """Copies every table into the analytics snapshot again (slow)."""
+    if not analytics.enabled():
+        return {"enabled": False}
+    return analytics.rebuild()
+
+async def _execute(call: ToolExecutionRequest, tool) -> ToolExecutionResponse:
+    """Run one call in the requested output mode.
+
+    Structured modes return the rows of :meth:`ReportTool.fetch` in ``data``
+    and report failures in ``error``; tools without a fetch step (and the
+    ``text`` mode) return the rendered text in ``result``.
+    """
+    try:
+        if call.output != "text" and isinstance(tool, ReportTool):
+            try:
+                data = await dispatch(call.tool_name, tool, call.args, bypass_cache=call.bypass_cache, structured=True)
+                return ToolExecutionResponse(result="", data=structured(data.rows, data.meta, call.output))
+            except (ExecutorSaturatedError, ToolTimeoutError):
+                raise
+            except (ToolInputError, InvalidCursorError) as e:
+                metrics.count_error("input")
+                return ToolExecutionResponse(result="", error=str(e))
+            except Exception as e:
+                metrics.count_error("query")
+                return ToolExecutionResponse(result="", error=f"{tool.error_message}: {e}")
+        result = await dispatch(call.tool_name, tool, call.args, bypass_cache=call.bypass_cache)
+        return ToolExecutionResponse(result=str(result))
+    except ToolTimeoutError as e:
+        metrics.count_error("timeout")
+        return ToolExecutionResponse(result="", error=str(e), error_type="timeout")
+
+async def _until_disconnect(http_request: Request, awaitable):
+    """Await ``awaitable``; ``None`` if the client disconnected first.
+
+    The pending work is then cancelled. The cancellation reaches the
+    dispatch pipeline, which kills the running query unless another caller
+    still waits for the same result.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await http_request.is_disconnected():
+                return None
+    finally:
+        # El handler también puede ser cancelado por el servidor.
+        if not task.done():
+            task.cancel()
+
+def _json_response(body, status_code: int = 200) -> Response:
+    # Las filas tipadas (datetime, Decimal) se serializan con el codificador rápido.
+    with metrics.timed("serialize"):
+        content = dumps(body)
+    metrics.observe_bytes(len(content))
+    return Response(content=content, status_code=status_code, media_type="application/json")
+
 @app.post("/tools/execute", summary="Execute a Tool")
-async def execute_tool(request: ToolExecutionRequest) -> ToolExecutionResponse:
+async def execute_tool(request: ToolExecutionRequest, http_request: Request) -> ToolExecutionResponse:
     """Executes a specified tool with the given arguments."""
     tool = tools_registry.get(request.tool_name)
 
@@ -75,18 +336,87 @@ async def execute_tool(request: ToolExecutionRequest) -> ToolExecutionResponse:
             detail=f"Tool '{request.tool_name}' not found. Available tools: {list(tools_registry.keys())}",
         )
 
+    with metrics.track(request.tool_name):
+        try:
+            if logs.sampled(request.tool_name) and logger.isEnabledFor(logging.INFO):
+                logger.info("Tool call", extra={"fields": {"tool": request.tool_name, "args": request.args}})
+            response = await _until_disconnect(http_request, _execute(request, tool))
+            if response is None:
+                # 499: el cliente cerró la conexión; nadie leerá la respuesta.
+                metrics.count_error("disconnected")
+                return Response(status_code=499)
+            # También el texto se serializa aquí, para medir el tiempo y el tamaño de la respuesta.
+            return _json_response(response.model_dump(), 504 if response.error_type == "timeout" else 200)
+        except ExecutorSaturatedError as e:
+            metrics.count_error("saturated")
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+        except Exception as e:
+            metrics.count_error("internal")
+            logger.exception("Tool call failed", extra={"fields": {"tool": request.tool_name, "args": request.args}})
+            raise HTTPException(
+                status_code=500, detail=f"An error occurred while executing the tool: {e}"
+            )
+
+@app.post("/tools/stream", summary="Stream a List Tool")
+async def stream_tool(request: ToolStreamRequest) -> StreamingResponse:
+    """Streams the rows of a list tool as NDJSON or server-sent events, without building the full result."""
+    tool = tools_registry.get(request.tool_name)
+    if not tool:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Tool '{request.tool_name}' not found. Available tools: {list(tools_registry.keys())}",
+        )
+    if not is_streamable(tool):
+        streamable = [name for name, candidate in tools_registry.items() if is_streamable(candidate)]
+        raise HTTPException(
+            status_code=400,
+            detail=f"Tool '{request.tool_name}' does not support streaming. Streamable tools: {streamable}",
+        )
     try:
-        print(f"Using Tool: {request.tool_name}")  # Imprimimos para confirmar
-        print(f"Arguments: {request.args}")  # AGREGADO: Debug de argumentos
-        result = tool.run(**request.args)
-        return ToolExecutionResponse(result=str(result))
-    except Exception as e:
-        print("--- AN ERROR OCCURRED ---")
-        print(f"Tool: {request.tool_name}")
-        print(f"Args: {request.args}")
-        print(f"Error: {str(e)}")
-        traceback.print_exc()
-        print("-------------------------")
+        args = tool.args_schema(**request.args).model_dump()
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+    with metrics.track(request.tool_name):
+        try:
+            stream = await open_stream(tool, args, request.format)
+        except ExecutorSaturatedError as e:
+            metrics.count_error("saturated")
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    # close() también corre si el cliente se va antes de que empiece el cuerpo.
+    return StreamingResponse(stream.body, media_type=MEDIA_TYPES[request.format], background=BackgroundTask(stream.close))
+
+async def _execute_batch_item(call: ToolExecutionRequest, semaphore: asyncio.Semaphore) -> ToolExecutionResponse:
+    tool = tools_registry.get(call.tool_name)
+    if not tool:
+        return ToolExecutionResponse(result="", error=f"Tool '{call.tool_name}' not found.")
+    async with semaphore:
+        # gather ejecuta cada llamada en su propia tarea: la atribución no se mezcla.
+        with metrics.track(call.tool_name):
+            try:
+                return await _execute(call, tool)
+            except Exception as e:
+                metrics.count_error("saturated" if isinstance(e, ExecutorSaturatedError) else "internal")
+                # Un fallo no interrumpe el resto del lote: se informa en su posición.
+                logger.exception("Batch call failed", extra={"fields": {"tool": call.tool_name, "args": call.args}})
+                return ToolExecutionResponse(result="", error=f"An error occurred while executing the tool: {e}")
+
+@app.post("/tools/execute_batch", summary="Execute Several Tools")
+async def execute_batch(request: BatchExecutionRequest, http_request: Request) -> BatchExecutionResponse:
+    """Executes a list of tool calls concurrently and returns their results in order."""
+    if len(request.calls) > config.BATCH_MAX_CALLS:
         raise HTTPException(
-            status_code=500, detail=f"An error occurred while executing the tool: {e}"
-        )
\ No newline at end of file
+            status_code=413,
+            detail=f"Batch too large: {len(request.calls)} calls (max {config.BATCH_MAX_CALLS}).",
+        )
+    # Las llamadas pasan por el mismo pipeline que /tools/execute: caché, coalescencia,
+    # executor y pool compartidos; el semáforo limita cuántas ocupa un solo lote.
+    semaphore = asyncio.Semaphore(max(config.BATCH_MAX_PARALLELISM, 1))
+    results = await _until_disconnect(
+        http_request, asyncio.gather(*(_execute_batch_item(call, semaphore) for call in request.calls))
+    )
+    if results is None:
+        return Response(status_code=499)
+    # Sin _json_response: el cuerpo del lote no pertenece a una sola herramienta.
+    return Response(content=dumps({"results": [result.model_dump() for result in results]}), media_type="application/json")
+
+app.include_router(admin)
@@ -0,0 +1,224 @@
+"""In-process metrics exposed on ``/metrics`` in the Prometheus text format.
+
+Tool calls are attributed through a context variable set by :func:`track`;
+the executor copies the context into its workers, so the database layer
+can record pool checkout, SQL execution and row fetch times against the
+tool that issued them without passing the name around. Recording an
+observation is a bisect and a short locked update, cheap enough for every
+call; the output is built only when ``/metrics`` is scraped.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Consultas fuera de una llamada a herramienta (tareas de fondo, arranque).
+NO_TOOL = "background"
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+ROW_BUCKETS = (0, 1, 10, 50, 100, 500, 1000, 5000, 10000, 50000)
+BYTE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+Labels = Tuple[str, ...]
+
+_tool: ContextVar[str] = ContextVar("metrics_tool", default=NO_TOOL)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Labels, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def expose(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines.extend(f"{self.name}{_labels(self.label_names, labels)} {_number(value)}" for labels, value in values)
+        return lines
+
+
+class Gauge(Counter):
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def expose(self) -> List[str]:
+        lines = super().expose()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class GaugeFunc:
+    """Gauge read from ``collect`` (``{labels: value}``) at scrape time."""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str], collect: Callable[[], Dict[Labels, float]]):
+        self.name, self.help, self.label_names, self.collect = name, help, tuple(labels), collect
+
+    def expose(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        lines.extend(f"{self.name}{_labels(self.label_names, labels)} {_number(value)}" for labels, value in self.collect().items())
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Sequence[str], buckets: Sequence[float]):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        # Por serie: un contador por bucket (+Inf al final), suma y total.
+        self._series: Dict[Labels, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def expose(self) -> List[str]:
+        with self._lock:
+            snapshot = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._series.items()]
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, counts, total, count in snapshot:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                bucket = _labels(self.label_names, labels, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{bucket} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def expose(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+requests_total = registry.register(Counter("mcp_tool_requests_total", "Tool calls received.", ("tool",)))
+errors_total = registry.register(Counter(
+    "mcp_tool_errors_total",
+    "Tool calls that failed, by kind (input, query, timeout, disconnected, saturated, internal).",
+    ("tool", "kind"),
+))
+in_flight = registry.register(Gauge("mcp_tool_in_flight", "Tool calls being served.", ("tool",)))
+request_seconds = registry.register(Histogram(
+    "mcp_tool_request_seconds", "End-to-end latency of a tool call.", ("tool",), LATENCY_BUCKETS,
+))
+phase_seconds = registry.register(Histogram(
+    "mcp_tool_phase_seconds",
+    "Time spent per phase of a tool call: checkout, execute, fetch, format, serialize.",
+    ("tool", "phase"),
+    LATENCY_BUCKETS,
+))
+rows_returned = registry.register(Histogram(
+    "mcp_tool_rows", "Rows produced per tool execution.", ("tool",), ROW_BUCKETS,
+))
+response_bytes = registry.register(Histogram(
+    "mcp_tool_response_bytes", "Size of the serialized response body.", ("tool",), BYTE_BUCKETS,
+))
+
+
+def current_tool() -> str:
+    return _tool.get()
+
+
+@contextmanager
+def track(tool_name: str) -> Iterator[None]:
+    """Attribute everything recorded inside the block to ``tool_name``."""
+    token = _tool.set(tool_name)
+    requests_total.inc(tool_name)
+    in_flight.inc(tool_name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        request_seconds.observe(time.perf_counter() - start, tool_name)
+        in_flight.dec(tool_name)
+        _tool.reset(token)
+
+
+def observe_phase(phase: str, seconds: float) -> None:
+    phase_seconds.observe(seconds, _tool.get(), phase)
+
+
+def run_as(tool_name: str, fn: Callable[..., Any], *args: Any) -> Any:
+    """Call ``fn`` with its recordings attributed to ``tool_name``.
+
+    For work that outlives the :func:`track` block, such as the batches of a
+    stream read after the endpoint has returned.
+    """
+    token = _tool.set(tool_name)
+    try:
+        return fn(*args)
+    finally:
+        _tool.reset(token)
+
+
+@contextmanager
+def timed(phase: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phase_seconds.observe(time.perf_counter() - start, _tool.get(), phase)
+
+
+def observe_rows(count: int) -> None:
+    rows_returned.observe(count, _tool.get())
+
+
+def observe_bytes(size: int) -> None:
+    response_bytes.observe(size, _tool.get())
+
+
+def count_error(kind: str) -> None:
+    errors_total.inc(_tool.get(), kind)
+
+
+def gauge(name: str, help: str, labels: Sequence[str], collect: Callable[[], Dict[Labels, float]]) -> None:
+    """Register a gauge computed from ``collect`` when ``/metrics`` is scraped."""
+    registry.register(GaugeFunc(name, help, labels, collect))
+
+
+def expose() -> str:
+    return registry.expose()
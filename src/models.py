@@ -1,12 +1,45 @@
-from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from pydantic import BaseModel, model_serializer
+from typing import Optional, Dict, Any, List, Literal
 
 class ToolExecutionRequest(BaseModel):
     """Request body for executing a tool."""
     tool_name: str
     args: Dict[str, Any]
+    bypass_cache: bool = False  # Fuerza una ejecución nueva ignorando la caché de resultados.
+    # "text" devuelve el texto para el agente en result; "rows"/"columns" devuelven filas tipadas en data.
+    output: Literal["text", "rows", "columns"] = "text"
+
+class StructuredData(BaseModel):
+    """``data`` of a structured response: the rows of ``ToolData`` in the requested layout, plus its meta."""
+    # "rows": filas completas; "columns": {columna: valores} y count.
+    rows: Optional[List[Dict[str, Any]]] = None
+    columns: Optional[Dict[str, List[Any]]] = None
+    count: Optional[int] = None
+    meta: Optional[Dict[str, Any]] = None
+
+    @model_serializer(mode="wrap")
+    def _omit_absent(self, handler) -> Dict[str, Any]:
+        # Solo viajan las claves del layout pedido.
+        return {key: value for key, value in handler(self).items() if value is not None}
 
 class ToolExecutionResponse(BaseModel):
     """Response body for a tool execution."""
     result: str
     error: Optional[str] = None
+    # "timeout" cuando la ejecución superó su límite: reintentar igual no conviene.
+    error_type: Optional[str] = None
+    data: Optional[StructuredData] = None
+
+class BatchExecutionRequest(BaseModel):
+    """Request body for executing several tools in one round trip."""
+    calls: List[ToolExecutionRequest]
+
+class BatchExecutionResponse(BaseModel):
+    """Response body for a batch: one entry per call, in request order."""
+    results: List[ToolExecutionResponse]
+
+class ToolStreamRequest(BaseModel):
+    """Request body for streaming the rows of a list tool."""
+    tool_name: str
+    args: Dict[str, Any]
+    format: Literal["ndjson", "sse"] = "ndjson"
@@ -0,0 +1,179 @@
+"""Approximate matching of procedure and role names.
+
+Agents rarely send the exact ``procedures.name`` / ``roles.name``. Names are
+indexed by the trigrams of their :func:`collation_key`, so a misspelled or
+partial name is resolved to its canonical form before any query runs, and
+an ambiguous one is answered with ranked suggestions instead of an empty
+result.
+
+Trigram similarity only ranks the candidates. A candidate is accepted only
+when every significant word of the input matches one of its words, exactly,
+as a prefix or within a small typo distance, so a name that does not exist
+("licencia por enfermedad") is never mapped to a different real one
+("Licencia por Maternidad").
+"""
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from . import config
+
+# Distancia mínima entre el primer y el segundo candidato para elegir uno solo.
+AMBIGUITY_MARGIN = 0.15
+
+# Palabras que no distinguen un nombre de otro: no hace falta que coincidan.
+STOPWORDS = frozenset({"a", "al", "de", "del", "el", "en", "la", "las", "lo", "los", "para", "por", "y"})
+
+# Largo mínimo de una palabra parcial ("matern") para aceptarla como prefijo.
+MIN_PREFIX = 4
+
+
+def collation_key(value: str) -> str:
+    """Case- and accent-insensitive key, close to MySQL's ``*_ai_ci`` collations."""
+    decomposed = unicodedata.normalize("NFKD", value)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold().strip()
+
+
+def trigrams(key: str) -> Set[str]:
+    """Trigrams of every word in ``key``, padded so short words still match."""
+    grams: Set[str] = set()
+    for word in key.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def typo_budget(word: str) -> int:
+    """Edits tolerated in ``word``: none in short words, two in long ones."""
+    if len(word) <= 3:
+        return 0
+    return 1 if len(word) <= 7 else 2
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance of ``a`` and ``b``, or ``limit + 1`` once it exceeds ``limit``."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, start=1):
+        current = [i]
+        for j, cb in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def word_edits(word: str, candidate: str) -> Optional[int]:
+    """Edits that turn the query ``word`` into the ``candidate`` word, or
+    ``None`` when it does not name it. A prefix of the candidate counts as
+    exact; otherwise up to :func:`typo_budget` edits are tolerated."""
+    if word == candidate or (len(word) >= MIN_PREFIX and candidate.startswith(word)):
+        return 0
+    budget = typo_budget(word)
+    if budget == 0:
+        return None
+    edits = edit_distance(word, candidate, budget)
+    return edits if edits <= budget else None
+
+
+def coverage(query_key: str, name_key: str) -> Optional[int]:
+    """Total edits for every significant word of ``query_key`` to match a word
+    of ``name_key``; ``None`` when some word matches none."""
+    words = name_key.split()
+    total = 0
+    for query_word in query_key.split():
+        if query_word in STOPWORDS:
+            continue
+        edits = [e for e in (word_edits(query_word, word) for word in words) if e is not None]
+        if not edits:
+            return None
+        total += min(edits)
+    return total
+
+
+class NameMatch(NamedTuple):
+    """Outcome of :meth:`NameIndex.resolve`.
+
+    ``name`` is the canonical name when the input resolved to a single
+    entry, otherwise ``None`` and ``suggestions`` holds the best candidates.
+    """
+    name: Optional[str]
+    suggestions: Tuple[str, ...]
+
+
+class NameIndex:
+    """Trigram index over a set of names, compared by collation key."""
+
+    def __init__(self, names: Iterable[str]):
+        self._names: Dict[str, str] = {}
+        for name in names:
+            # Varias filas con el mismo nombre (salvo acentos/mayúsculas) son una sola entrada.
+            self._names.setdefault(collation_key(name), name)
+        self._keys: List[str] = list(self._names)
+        self._grams: List[int] = []
+        self._postings: Dict[str, List[int]] = {}
+        for position, key in enumerate(self._keys):
+            grams = trigrams(key)
+            self._grams.append(len(grams))
+            for gram in grams:
+                self._postings.setdefault(gram, []).append(position)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def rank(self, query: str, limit: int) -> List[Tuple[float, str]]:
+        """Best ``limit`` names for ``query`` as ``(score, name)``, best first.
+
+        The score averages the Dice coefficient of both trigram sets and the
+        share of the query's trigrams found in the name, so a correct but
+        partial name ("maternidad") ranks as high as a slightly misspelled
+        full one.
+        """
+        grams = trigrams(collation_key(query))
+        if not grams:
+            return []
+        shared: Counter = Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+        scored = []
+        for position, common in shared.items():
+            dice = 2 * common / (len(grams) + self._grams[position])
+            containment = common / len(grams)
+            scored.append(((dice + containment) / 2, self._names[self._keys[position]]))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return scored[:limit]
+
+    def resolve(self, query: str) -> NameMatch:
+        """Canonical name for ``query``, or suggestions when it is unknown or ambiguous."""
+        key = collation_key(query)
+        exact = self._names.get(key)
+        if exact is not None:
+            return NameMatch(exact, ())
+        ranked = self.rank(query, len(self._keys))
+        # La similitud solo ordena: cada palabra pedida tiene que estar en el nombre.
+        candidates = []
+        for score, name in ranked:
+            edits = coverage(key, collation_key(name))
+            if edits is not None and score >= config.NAME_MATCH_MIN_SCORE:
+                candidates.append((edits, score, name))
+        # Menos errores de tipeo primero; a igualdad, la mayor similitud.
+        candidates.sort(key=lambda item: (item[0], -item[1]))
+        if candidates and (
+            len(candidates) == 1
+            or candidates[0][0] < candidates[1][0]
+            or candidates[0][1] - candidates[1][1] >= AMBIGUITY_MARGIN
+        ):
+            return NameMatch(candidates[0][2], ())
+        # Como sugerencia basta con un parecido parcial.
+        floor = config.NAME_MATCH_MIN_SCORE / 2
+        return NameMatch(None, tuple(name for score, name in ranked[:config.NAME_MATCH_SUGGESTIONS] if score >= floor))
+
+
+def not_found_message(message: str, match: NameMatch) -> str:
+    """Append the suggestions of an unresolved ``match`` to ``message``."""
+    if not match.suggestions:
+        return message
+    options = ", ".join(f"'{name}'" for name in match.suggestions)
+    return f"{message} ¿Quiso decir alguno de estos? {options}"
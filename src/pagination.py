@@ -0,0 +1,81 @@
+"""Keyset pagination for the list tools.
+
+A page is read with ``ORDER BY <key> LIMIT n + 1`` plus a seek predicate on
+the key of the last row of the previous page, so every page is an index
+range scan whatever its depth. The key travels to the client as an opaque
+cursor tagged with the list it belongs to.
+
+Nullable date keys are paged on :func:`dated_key`: rows without a date
+sort as :data:`NULL_DATE`, and a ``null`` in the cursor stands for it, so
+those rows are neither skipped nor end the listing early.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from . import config
+
+# Fecha con la que se ordenan y paginan las filas sin fecha.
+NULL_DATE = datetime(1970, 1, 1)
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a cursor is malformed or belongs to another list."""
+
+
+def _to_json(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    return value
+
+
+def _from_json(value: Any) -> Any:
+    if isinstance(value, dict) and "dt" in value:
+        return datetime.fromisoformat(value["dt"])
+    return value
+
+
+def encode_cursor(kind: str, key: Sequence[Any]) -> str:
+    payload = json.dumps({"k": kind, "v": [_to_json(v) for v in key]}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(kind: str, cursor: str, size: int) -> Tuple[Any, ...]:
+    """Key stored in ``cursor``; it must come from the same ``kind`` of list."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values = tuple(_from_json(v) for v in payload["v"])
+        valid = payload["k"] == kind and len(values) == size
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        valid = False
+    if not valid:
+        raise InvalidCursorError(f"Cursor inválido para {kind}: use el valor next_cursor de la página anterior.")
+    return values
+
+
+def dated_key(column: str) -> str:
+    """SQL key for the nullable date ``column``: ``NULL`` sorts as :data:`NULL_DATE`."""
+    return f"COALESCE({column}, TIMESTAMP '{NULL_DATE:%Y-%m-%d %H:%M:%S}')"
+
+
+def dated_value(value: Any) -> Any:
+    """Value of a :func:`dated_key` for a date decoded from a cursor."""
+    return NULL_DATE if value is None else value
+
+
+def page_limit(limit: Optional[int]) -> int:
+    """``limit`` clamped to ``PAGE_MAX_LIMIT``; ``None`` means ``PAGE_DEFAULT_LIMIT``."""
+    if limit is None:
+        limit = config.PAGE_DEFAULT_LIMIT
+    return max(1, min(limit, config.PAGE_MAX_LIMIT))
+
+
+def split_page(kind: str, rows: List[Dict[str, Any]], limit: int, key_columns: Sequence[str]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Trim the extra row fetched with ``LIMIT limit + 1`` and build the next cursor."""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(kind, [rows[-1][column] for column in key_columns])
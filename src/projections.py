@@ -0,0 +1,320 @@
+"""Incrementally maintained "current state per request" projection.
+
+``request_current_state`` holds one row per request with its latest state
+record (by ``date``) and its latest action (by ``created_at``). It replaces
+the ``SELECT request_id, MAX(date) ... GROUP BY request_id`` derived tables
+that used to aggregate the whole history on every call.
+
+Rows are folded in by id ranges above a high-water mark stored in
+``projection_watermarks``. Auto-increment ids are assigned at insert time
+but become visible at commit, so a row can appear below a mark already
+passed; every pass folds the last ``PROJECTION_RESCAN_IDS`` ids again to
+pick those up, which the upserts tolerate because they keep the newest
+record by ``(date, id)`` whatever the order they see them in. History rows
+are assumed append-only otherwise: an UPDATE or DELETE of an old record is
+not picked up until :func:`rebuild_current_state`.
+
+Until a refresh pass has caught up after a rebuild, readers get
+:func:`current_state_join` computed live from the history tables instead of
+a partial projection. Readiness is a row of ``projection_watermarks``, not
+a module global, so every worker process sees a rebuild started by any of
+them; workers re-read it every ``PROJECTION_READY_CHECK_INTERVAL`` seconds.
+Refreshes and rebuilds of all workers are serialized with a MySQL named
+lock.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+from . import config
+from .background import PeriodicTask, register
+from .db import db_connection
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS projection_watermarks (
+        name VARCHAR(64) NOT NULL PRIMARY KEY,
+        last_id BIGINT UNSIGNED NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS request_current_state (
+        request_id BIGINT UNSIGNED NOT NULL PRIMARY KEY,
+        state_record_id BIGINT UNSIGNED NULL,
+        request_status_id BIGINT UNSIGNED NULL,
+        state_date DATETIME NULL,
+        action_record_id BIGINT UNSIGNED NULL,
+        action_id BIGINT UNSIGNED NULL,
+        action_date DATETIME NULL,
+        KEY idx_request_current_state_status (request_status_id)
+    )
+    """,
+]
+
+STATES_WATERMARK = "request_current_state.states"
+ACTIONS_WATERMARK = "request_current_state.actions"
+# 1 cuando una pasada completa alcanzó el historial desde la última reconstrucción.
+READY_MARK = "request_current_state.ready"
+# Lock con nombre de MySQL: una sola pasada o reconstrucción a la vez entre todos los procesos.
+REFRESH_LOCK = "request_current_state.refresh"
+# Segundos que una reconstrucción espera el lock mientras otro proceso termina su pasada.
+REBUILD_LOCK_TIMEOUT = 60
+
+# El último registro del lote por solicitud gana si es posterior al guardado
+# por (fecha, id), así releer un registro ya aplicado no cambia nada.
+# state_date se asigna al final: las asignaciones previas comparan contra el
+# valor anterior.
+NEWER = """(
+            {record} IS NULL OR {date} IS NULL
+            OR VALUES({date}) > {date}
+            OR (VALUES({date}) = {date} AND VALUES({record}) >= {record})
+        )"""
+
+UPSERT_STATES = """
+    INSERT INTO request_current_state (request_id, state_record_id, request_status_id, state_date)
+    SELECT batch.request_id, batch.new_record_id, batch.new_status_id, batch.new_date
+    FROM (
+        SELECT rsr.request_id,
+               rsr.id AS new_record_id,
+               rsr.request_status_id AS new_status_id,
+               rsr.date AS new_date,
+               ROW_NUMBER() OVER (PARTITION BY rsr.request_id ORDER BY rsr.date DESC, rsr.id DESC) AS rn
+        FROM request_state_records rsr
+        WHERE rsr.id > %(lo)s AND rsr.id <= %(hi)s
+    ) batch
+    WHERE batch.rn = 1
+    ON DUPLICATE KEY UPDATE
+        state_record_id = IF({newer}, VALUES(state_record_id), state_record_id),
+        request_status_id = IF({newer}, VALUES(request_status_id), request_status_id),
+        state_date = IF({newer}, VALUES(state_date), state_date);
+""".format(newer=NEWER.format(date="state_date", record="state_record_id"))
+
+UPSERT_ACTIONS = """
+    INSERT INTO request_current_state (request_id, action_record_id, action_id, action_date)
+    SELECT batch.request_id, batch.new_record_id, batch.new_action_id, batch.new_date
+    FROM (
+        SELECT ra.request_id,
+               ra.id AS new_record_id,
+               ra.action_id AS new_action_id,
+               ra.created_at AS new_date,
+               ROW_NUMBER() OVER (PARTITION BY ra.request_id ORDER BY ra.created_at DESC, ra.id DESC) AS rn
+        FROM request_actions ra
+        WHERE ra.id > %(lo)s AND ra.id <= %(hi)s
+    ) batch
+    WHERE batch.rn = 1
+    ON DUPLICATE KEY UPDATE
+        action_record_id = IF({newer}, VALUES(action_record_id), action_record_id),
+        action_id = IF({newer}, VALUES(action_id), action_id),
+        action_date = IF({newer}, VALUES(action_date), action_date);
+""".format(newer=NEWER.format(date="action_date", record="action_record_id"))
+
+# Misma forma que request_current_state, calculada en vivo para cada solicitud de {request}.
+LIVE_CURRENT_STATE = """
+    CROSS JOIN LATERAL (
+        SELECT
+            (SELECT rsr.request_status_id FROM request_state_records rsr
+             WHERE rsr.request_id = {request}.id
+             ORDER BY rsr.date DESC, rsr.id DESC LIMIT 1) AS request_status_id,
+            (SELECT ra.action_id FROM request_actions ra
+             WHERE ra.request_id = {request}.id
+             ORDER BY ra.created_at DESC, ra.id DESC LIMIT 1) AS action_id,
+            (SELECT MAX(ra.created_at) FROM request_actions ra
+             WHERE ra.request_id = {request}.id) AS action_date
+    ) {alias}
+"""
+
+_schema_ready = False
+_refresh_lock = threading.Lock()
+
+
+def ensure_schema(conn) -> None:
+    global _schema_ready
+    if _schema_ready:
+        return
+    cursor = conn.cursor()
+    try:
+        for statement in SCHEMA:
+            cursor.execute(statement)
+    finally:
+        cursor.close()
+    _schema_ready = True
+
+
+class SharedMark:
+    """A ``projection_watermarks`` row read by every worker process.
+
+    The value is cached for ``PROJECTION_READY_CHECK_INTERVAL`` seconds; a
+    single thread re-reads it while the others keep the cached value.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._value = 0
+        self._checked_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def get(self) -> int:
+        expired = time.monotonic() - self._checked_at >= config.PROJECTION_READY_CHECK_INTERVAL
+        if expired and self._lock.acquire(blocking=False):
+            try:
+                self._value = self._read()
+                self._checked_at = time.monotonic()
+            finally:
+                self._lock.release()
+        return self._value
+
+    def set(self, cursor, value: int) -> None:
+        set_watermark(cursor, self.name, value)
+        self._value = value
+        self._checked_at = time.monotonic()
+
+    def _read(self) -> int:
+        try:
+            with db_connection() as conn:
+                cursor = conn.cursor(buffered=True)
+                try:
+                    return get_watermark(cursor, self.name)
+                finally:
+                    cursor.close()
+        except Exception as e:
+            # Sin poder confirmarlo se calcula en vivo: más lento, nunca incompleto.
+            logger.warning("Could not read %s: %s", self.name, e)
+            return 0
+
+
+_ready_mark = SharedMark(READY_MARK)
+
+
+@contextmanager
+def named_lock(cursor, name: str, timeout: float) -> Iterator[bool]:
+    """Hold the MySQL lock ``name`` during the block; yields whether it was obtained."""
+    cursor.execute("SELECT GET_LOCK(%(name)s, %(timeout)s)", {"name": name, "timeout": timeout})
+    acquired = cursor.fetchone()[0] == 1
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            # La conexión vuelve al pool abierta: el lock no se libera solo.
+            cursor.execute("SELECT RELEASE_LOCK(%(name)s)", {"name": name})
+            cursor.fetchone()
+
+
+def ready() -> bool:
+    """Whether a refresh pass has caught up since the last rebuild, in any worker."""
+    return _ready_mark.get() == 1
+
+
+def current_state_join(request: str = "r", alias: str = "rcs", live: bool = False) -> str:
+    """Join clause giving every row of ``request`` its current state as ``alias``.
+
+    Reads the projection once it is :func:`ready`; before that, or with
+    ``live``, computes the same columns from the history tables.
+    """
+    if not live and ready():
+        return f"JOIN request_current_state {alias} ON {alias}.request_id = {request}.id"
+    return LIVE_CURRENT_STATE.format(request=request, alias=alias)
+
+
+def get_watermark(cursor, name: str) -> int:
+    cursor.execute("SELECT last_id FROM projection_watermarks WHERE name = %(name)s", {"name": name})
+    row = cursor.fetchone()
+    return int(row[0]) if row else 0
+
+
+def set_watermark(cursor, name: str, last_id: int) -> None:
+    cursor.execute(
+        """
+        INSERT INTO projection_watermarks (name, last_id) VALUES (%(name)s, %(last_id)s)
+        ON DUPLICATE KEY UPDATE last_id = VALUES(last_id)
+        """,
+        {"name": name, "last_id": last_id},
+    )
+
+
+def fold(conn, source_table: str, watermark: str, upsert: str, rescan: int = 0) -> int:
+    """Apply every ``source_table`` row above ``watermark``; returns new ids folded.
+
+    With ``rescan`` the last ``rescan`` ids below the mark are applied again,
+    for rows committed after a higher id was folded; ``upsert`` must then be
+    idempotent.
+    """
+    cursor = conn.cursor(buffered=True)
+    try:
+        mark = get_watermark(cursor, watermark)
+        cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {source_table}")
+        top = int(cursor.fetchone()[0])
+        lo = max(mark - rescan, 0)
+        while lo < top:
+            hi = min(lo + config.PROJECTION_BATCH_SIZE, top)
+            conn.start_transaction()
+            try:
+                cursor.execute(upsert, {"lo": lo, "hi": hi})
+                # La marca nunca retrocede mientras se relee la ventana.
+                set_watermark(cursor, watermark, max(hi, mark))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            lo = hi
+        return max(top - mark, 0)
+    finally:
+        cursor.close()
+
+
+def refresh_current_state() -> Dict[str, int]:
+    """Fold new state records and actions into ``request_current_state``."""
+    with _refresh_lock, db_connection() as conn:
+        ensure_schema(conn)
+        cursor = conn.cursor(buffered=True)
+        try:
+            with named_lock(cursor, REFRESH_LOCK, 0) as acquired:
+                if not acquired:
+                    # Otro proceso está en su pasada o reconstruyendo: le toca a él.
+                    return {"skipped": True}
+                return _fold_all(conn, cursor)
+        finally:
+            cursor.close()
+
+
+def _fold_all(conn, cursor) -> Dict[str, int]:
+    folded = {
+        "state_ids": fold(conn, "request_state_records", STATES_WATERMARK, UPSERT_STATES, config.PROJECTION_RESCAN_IDS),
+        "action_ids": fold(conn, "request_actions", ACTIONS_WATERMARK, UPSERT_ACTIONS, config.PROJECTION_RESCAN_IDS),
+    }
+    # Una pasada completa llega hasta el MAX(id) que vio al empezar: ya está al día.
+    if get_watermark(cursor, READY_MARK) != 1:
+        _ready_mark.set(cursor, 1)
+    return folded
+
+
+def rebuild_current_state() -> Dict[str, int]:
+    """Drop the projection and rebuild it from the full history."""
+    with _refresh_lock, db_connection() as conn:
+        ensure_schema(conn)
+        cursor = conn.cursor(buffered=True)
+        try:
+            with named_lock(cursor, REFRESH_LOCK, REBUILD_LOCK_TIMEOUT) as acquired:
+                if not acquired:
+                    raise RuntimeError("Another process kept the projection refresh lock; try the rebuild again")
+                _ready_mark.set(cursor, 0)
+                # Los demás procesos releen la marca periódicamente: se espera a que la vean antes de vaciar.
+                time.sleep(config.PROJECTION_READY_CHECK_INTERVAL)
+                cursor.execute("TRUNCATE TABLE request_current_state")
+                cursor.execute(
+                    "DELETE FROM projection_watermarks WHERE name IN (%(states)s, %(actions)s)",
+                    {"states": STATES_WATERMARK, "actions": ACTIONS_WATERMARK},
+                )
+                logger.info("request_current_state truncated; rebuilding from history")
+                return _fold_all(conn, cursor)
+        finally:
+            cursor.close()
+
+
+current_state_task = register(
+    PeriodicTask("request_current_state", config.PROJECTION_REFRESH_INTERVAL, refresh_current_state)
+)
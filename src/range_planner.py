@@ -0,0 +1,123 @@
+"""Calendar-aligned fan-out of the range reports.
+
+A long ``[lo, hi)`` range is split into month chunks that are queried in
+parallel, each on its own pooled connection. Callers merge the partial
+aggregates with their usual post-processing, which already sums rows
+sharing a procedure and state. Chunks that end before today are cached
+under a per-month version: the rollup refreshes bump the version of every
+month they recompute, so a repeated question only queries the open chunk
+and the months whose data actually changed.
+"""
+import contextvars
+import threading
+import time as clock
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time
+from typing import Any, Callable, Dict, List, Tuple
+
+from . import config, replicas
+from .cache import ResultCache
+from .db import db_clock
+
+Chunk = Tuple[datetime, datetime]
+
+# Las filas por trozo son pocas (trámite x estado); el límite de memoria es holgado.
+CHUNK_CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+
+def month_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1)
+
+
+def next_month(value: datetime) -> datetime:
+    return datetime(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+
+def month_chunks(lo: datetime, hi: datetime) -> List[Chunk]:
+    """Split ``[lo, hi)`` at calendar month boundaries."""
+    chunks: List[Chunk] = []
+    start = lo
+    while start < hi:
+        end = min(next_month(month_start(start)), hi)
+        chunks.append((start, end))
+        start = end
+    return chunks
+
+
+class ChunkVersions:
+    """Version counter per (report, month), bumped when the month's data changes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (reporte, mes) -> (versión, momento del último cambio)
+        self._versions: Dict[Tuple[str, date], Tuple[int, float]] = {}
+
+    def get(self, report: str, day: Any) -> int:
+        key = (report, _month_key(day))
+        with self._lock:
+            return self._versions.get(key, (0, 0.0))[0]
+
+    def settled(self, report: str, day: Any, lag: float) -> bool:
+        """Whether the month's last change is older than ``lag`` seconds.
+
+        A read from a replica lagging up to ``lag`` may not see a newer
+        change yet, and must not be cached under the new version.
+        """
+        key = (report, _month_key(day))
+        with self._lock:
+            bumped_at = self._versions.get(key, (0, float("-inf")))[1]
+        return clock.monotonic() - bumped_at > lag
+
+    def bump(self, report: str, day: Any) -> None:
+        key = (report, _month_key(day))
+        with self._lock:
+            self._versions[key] = (self._versions.get(key, (0, 0.0))[0] + 1, clock.monotonic())
+
+
+def _month_key(day: Any) -> date:
+    return date(day.year, day.month, 1)
+
+
+chunk_versions = ChunkVersions()
+chunk_cache = ResultCache(max_entries=config.RANGE_CHUNK_CACHE_ENTRIES, max_bytes=CHUNK_CACHE_MAX_BYTES)
+_fanout = ThreadPoolExecutor(max_workers=max(config.RANGE_CHUNK_WORKERS, 1), thread_name_prefix="range-chunk")
+
+
+def run_chunks(report: str, key: str, lo: datetime, hi: datetime, query: Callable[[datetime, datetime], List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Rows of ``query(chunk_lo, chunk_hi)`` for every month chunk of ``[lo, hi)``.
+
+    ``report`` names the versioned data (see :data:`chunk_versions`) and
+    ``key`` the remaining arguments of the query. ``query`` must open its
+    own connection; the caller must not hold one while this runs, or a
+    chunk could wait for a connection the caller is keeping.
+    """
+    today = datetime.combine(db_clock.today(), time.min)
+    lag = replicas.tolerance()
+    rows: List[Dict[str, Any]] = []
+    pending: List[Tuple[Chunk, str]] = []
+    for chunk_lo, chunk_hi in month_chunks(lo, hi):
+        cache_key = ""
+        if chunk_hi <= today:
+            cache_key = f"{report}|{key}|{chunk_lo.isoformat()}|{chunk_hi.isoformat()}|{chunk_versions.get(report, chunk_lo)}"
+            cached = chunk_cache.get(cache_key)
+            if cached is not None:
+                rows.extend(cached)
+                continue
+            if not chunk_versions.settled(report, chunk_lo, lag):
+                # Se consulta igual, pero sin guardarlo: la réplica podría no tener aún el último cambio.
+                cache_key = ""
+        pending.append(((chunk_lo, chunk_hi), cache_key))
+
+    if len(pending) == 1:
+        results = [query(*pending[0][0])]
+    else:
+        # Cada trozo hereda el contexto: métricas, deadline y cancelación de la llamada.
+        futures = [_fanout.submit(contextvars.copy_context().run, query, *chunk) for chunk, _ in pending]
+        results = [future.result() for future in futures]
+
+    for (chunk, cache_key), chunk_rows in zip(pending, results):
+        if cache_key:
+            chunk_cache.set(cache_key, chunk_rows, config.RANGE_CHUNK_CACHE_TTL)
+        rows.extend(chunk_rows)
+    return rows
+
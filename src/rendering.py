@@ -0,0 +1,91 @@
+"""Text rendering of tool results for the agent.
+
+Rows are formatted with :class:`RowTemplate` and collected by
+:class:`TextRenderer` in a list that is joined once, instead of growing a
+string with ``+=``. The renderer stops adding rows once the output budget
+(``RENDER_MAX_BYTES`` / ``RENDER_MAX_TOKENS``) is reached and closes with a
+"... y N filas más" line: an agent gains nothing from a megabyte answer.
+"""
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from . import config
+
+# Aproximación habitual para texto en español: ~4 bytes por token.
+BYTES_PER_TOKEN = 4
+
+Line = Union[str, Tuple[str, str]]
+
+
+def output_budget() -> Optional[int]:
+    """Byte budget of a rendered answer, or ``None`` when unlimited."""
+    budgets = [b for b in (config.RENDER_MAX_BYTES, config.RENDER_MAX_TOKENS * BYTES_PER_TOKEN) if b > 0]
+    return min(budgets) if budgets else None
+
+
+class RowTemplate:
+    """Multi-line ``str.format`` template for one row.
+
+    A line given as ``(field, template)`` is only emitted when ``row[field]``
+    is truthy, e.g. ``("fecha_fin", "   Fecha fin: {fecha_fin}")``.
+    """
+
+    def __init__(self, *lines: Line):
+        self._lines = [(None, line) if isinstance(line, str) else line for line in lines]
+
+    def format(self, row: Dict[str, Any], **extra: Any) -> str:
+        values = {**row, **extra} if extra else row
+        return "\n".join(
+            template.format_map(values)
+            for field, template in self._lines
+            if field is None or values.get(field)
+        )
+
+
+class TextRenderer:
+    """Collects the parts of an answer and enforces the output budget.
+
+    ``write`` adds fixed text (headers, totals) unconditionally; ``row``
+    adds a row only while it fits in the budget and counts the rest, and
+    ``end_rows`` reports them.
+    """
+
+    def __init__(self, budget: Optional[int] = None):
+        self.budget = output_budget() if budget is None else budget
+        self.rows = 0
+        self.omitted = 0
+        self._parts: List[str] = []
+        self._size = 0
+
+    def write(self, text: str) -> None:
+        self._parts.append(text)
+        self._size += len(text.encode())
+
+    def row(self, text: str) -> bool:
+        """Add ``text`` as a row; ``False`` once the budget is exhausted."""
+        size = len(text.encode())
+        # La primera fila siempre entra, aunque por sí sola exceda el presupuesto.
+        if self.omitted or (self.budget and self.rows and self._size + size > self.budget):
+            self.omitted += 1
+            return False
+        self._parts.append(text)
+        self._size += size
+        self.rows += 1
+        return True
+
+    @property
+    def truncated(self) -> bool:
+        return self.omitted > 0
+
+    def end_rows(self, total: Optional[int] = None) -> None:
+        """Close the row section, noting how many rows did not fit.
+
+        ``total`` is the number of rows offered, so callers can stop at the
+        first refused row instead of formatting the rest just to count them.
+        """
+        if total is not None and self.omitted:
+            self.omitted = total - self.rows
+        if self.omitted:
+            self.write(f"... y {self.omitted} filas más (respuesta recortada a {self.budget} bytes)\n\n")
+
+    def render(self) -> str:
+        return "".join(self._parts)
@@ -0,0 +1,193 @@
+"""Routing of tool reads to MySQL read replicas, with lag awareness.
+
+Each tool execution declares how much replication lag it tolerates
+(:meth:`src.tool_base.Tool.replica_lag_tolerance`), carried by a context
+variable like the execution deadline. Connections checked out under a
+tolerance come from the least busy replica whose measured lag is within
+it; otherwise, and for work outside tool executions (projections, rollup
+refreshes), they come from the primary.
+
+Lag is measured with a heartbeat: the primary stamps
+``replica_heartbeat`` every ``REPLICA_HEARTBEAT_INTERVAL`` seconds and each
+replica reports how old its copy of the stamp is. A replica that cannot be
+reached, or whose measurement is stale, is not used until the next
+successful measurement.
+"""
+import itertools
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, Optional, Sequence
+from urllib.parse import unquote, urlsplit
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS replica_heartbeat (
+        id TINYINT UNSIGNED NOT NULL PRIMARY KEY,
+        beat_at DATETIME(6) NOT NULL
+    )
+"""
+HEARTBEAT_WRITE = """
+    INSERT INTO replica_heartbeat (id, beat_at) VALUES (1, UTC_TIMESTAMP(6))
+    ON DUPLICATE KEY UPDATE beat_at = VALUES(beat_at)
+"""
+HEARTBEAT_READ = "SELECT TIMESTAMPDIFF(MICROSECOND, beat_at, UTC_TIMESTAMP(6)) / 1000000 FROM replica_heartbeat WHERE id = 1"
+
+
+def parse_dsn(dsn: str) -> Dict[str, Any]:
+    """Connection settings of ``[mysql://][user[:password]@]host[:port][/database]``.
+
+    Parts left out are taken from the primary's ``DB_*`` settings.
+    """
+    parts = urlsplit(dsn if "//" in dsn else "//" + dsn)
+    return {
+        "host": parts.hostname,
+        "port": parts.port or config.DB_PORT or 3306,
+        "user": unquote(parts.username) if parts.username else config.DB_USER,
+        "password": unquote(parts.password) if parts.password is not None else config.DB_PASSWORD,
+        "database": parts.path.lstrip("/") or config.DB_DATABASE,
+    }
+
+
+class Replica:
+    """A read replica: its pool and last lag measurement."""
+
+    def __init__(self, name: str, pool: Any):
+        self.name = name
+        self.pool = pool
+        self.lag: Optional[float] = None
+        self.measured_at = 0.0
+        self.error: Optional[str] = None
+        self.reads = 0
+
+    def current_lag(self) -> Optional[float]:
+        """Measured lag plus the age of the measurement; ``None`` when unknown."""
+        if self.lag is None:
+            return None
+        # Una medición vieja no prueba nada: la lag estimada crece con su antigüedad.
+        return self.lag + (time.monotonic() - self.measured_at)
+
+    def stats(self) -> Dict[str, Any]:
+        lag = self.current_lag()
+        return {
+            "name": self.name,
+            "lag_s": round(lag, 3) if lag is not None else None,
+            "reads": self.reads,
+            "error": self.error,
+            "pool": self.pool.stats(),
+        }
+
+
+class ReplicaRouter:
+    """Chooses the pool of each checkout: a replica within tolerance, or the primary."""
+
+    def __init__(self, primary: Any, replicas: Sequence[Replica]):
+        self.primary = primary
+        self.replicas = list(replicas)
+        self._lock = threading.Lock()
+        self._turn = itertools.count()
+        self._primary_reads = 0
+        self._fallbacks = 0
+
+    def choose(self) -> Optional[Replica]:
+        """Replica for a checkout in the current context; ``None`` means the primary."""
+        tolerance = _tolerance.get()
+        if tolerance is None or not self.replicas:
+            with self._lock:
+                self._primary_reads += 1
+            return None
+        eligible = [replica for replica in self.replicas if _within(replica.current_lag(), tolerance)]
+        with self._lock:
+            if not eligible:
+                self._primary_reads += 1
+                self._fallbacks += 1
+                return None
+            # La réplica con menos conexiones ocupadas; a igualdad, por turnos.
+            turn = next(self._turn) % len(eligible)
+            replica = min(eligible[turn:] + eligible[:turn], key=lambda candidate: candidate.pool.load())
+            replica.reads += 1
+        return replica
+
+    def mark_down(self, replica: Replica, error: Exception) -> None:
+        """Stop using ``replica`` until its lag is measured again."""
+        logger.warning("Replica %s unavailable, reading from the primary: %s", replica.name, error)
+        with self._lock:
+            replica.lag = None
+            replica.error = str(error)
+            self._fallbacks += 1
+
+    def monitor(self) -> Dict[str, Any]:
+        """Stamp the heartbeat on the primary and measure every replica's lag."""
+        if not self.replicas:
+            return {"replicas": 0}
+        with self.primary.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(HEARTBEAT_SCHEMA)
+                cursor.execute(HEARTBEAT_WRITE)
+            finally:
+                cursor.close()
+        lags: Dict[str, Optional[float]] = {}
+        for replica in self.replicas:
+            try:
+                lag = _measure(replica.pool)
+            except Exception as e:
+                logger.warning("Could not measure the lag of replica %s: %s", replica.name, e)
+                with self._lock:
+                    replica.lag = None
+                    replica.error = str(e)
+            else:
+                with self._lock:
+                    replica.lag = lag
+                    replica.measured_at = time.monotonic()
+                    replica.error = None if lag is not None else "heartbeat not replicated yet"
+            lags[replica.name] = replica.lag
+        return {"lag_s": lags}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            primary_reads, fallbacks = self._primary_reads, self._fallbacks
+        return {
+            "max_lag_s": config.REPLICA_MAX_LAG,
+            "primary_reads": primary_reads,
+            "fallbacks": fallbacks,
+            "replicas": [replica.stats() for replica in self.replicas],
+        }
+
+
+def _within(lag: Optional[float], tolerance: float) -> bool:
+    return lag is not None and lag <= tolerance
+
+
+def _measure(pool: Any) -> Optional[float]:
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(HEARTBEAT_READ)
+            row = cursor.fetchone()
+        finally:
+            cursor.close()
+    # Sin fila: la réplica todavía no recibió el primer latido.
+    return max(float(row[0]), 0.0) if row and row[0] is not None else None
+
+
+_tolerance: ContextVar[Optional[float]] = ContextVar("replica_lag_tolerance", default=None)
+
+
+def tolerance() -> float:
+    """Lag accepted by the current reads; ``0`` when they go to the primary."""
+    return _tolerance.get() or 0.0
+
+
+def enter(lag_tolerance: Optional[float]):
+    """Let reads in the current context use replicas lagging up to
+    ``lag_tolerance`` seconds (``None``: primary only); returns the token for :func:`leave`."""
+    return _tolerance.set(lag_tolerance)
+
+
+def leave(token) -> None:
+    _tolerance.reset(token)
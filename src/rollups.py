@@ -0,0 +1,624 @@
+"""Pre-aggregated daily rollups answering the range report tools.
+
+``request_state_daily_rollup`` stores, per day, procedure and current
+state, how many requests started (``basis = 'start_date'``) or were created
+(``basis = 'created_at'``) that day. It is derived from
+``request_current_state``: whenever a request gets a new state record, or
+its row changes (``requests.updated_at``: a soft delete, a new procedure or
+date), the days it belongs to are recomputed. ``request_rollup_days``
+remembers the days each request was last counted under, so moving a
+request to another day also recomputes the day it left.
+
+``agent_state_change_daily_rollup`` counts state changes per agent
+(``request_state_records.user_id``), day, procedure and state, leaving out
+statuses 0/1/2 like the agent activity tools do. It is first built by
+adding up the history in id batches; afterwards each refresh recomputes the
+days of the records above the previous high-water mark, re-reading the
+projection's trailing id window so records that committed late are counted.
+Until a refresh has completed, and for the days after the start of the last
+one, ranges are counted live.
+
+A range query sums the rollup rows of the whole days it covers and counts
+the partial days at both edges live, so any ``fecha_inicio``/``fecha_fin``
+gives exactly what the queries over raw history used to return. When the
+optional analytics snapshot is enabled and fresh (:mod:`src.analytics`),
+the same reports are computed there and MySQL is not queried.
+"""
+import logging
+import threading
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import mysql.connector
+
+from . import analytics, config
+from .background import PeriodicTask, register
+from .dates import parse_datetime_arg
+from .db import db_clock, db_connection, in_clause, run_query
+from .dimensions import collation_key, dimensions
+from .projections import (
+    STATES_WATERMARK, current_state_join, ensure_schema as ensure_projection_schema, fold, get_watermark,
+    READY_MARK as PROJECTION_READY_MARK, set_watermark,
+)
+from .range_planner import chunk_cache, chunk_versions, run_chunks
+
+logger = logging.getLogger(__name__)
+
+# Filas del reporte y metadatos; estos últimos indican el snapshot analítico si respondió desde ahí.
+RangeResult = Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]
+
+BASES = ("start_date", "created_at")
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS request_state_daily_rollup (
+        basis VARCHAR(16) NOT NULL,
+        day DATE NOT NULL,
+        procedure_id BIGINT UNSIGNED NOT NULL,
+        request_status_id BIGINT UNSIGNED NOT NULL,
+        total INT UNSIGNED NOT NULL,
+        PRIMARY KEY (basis, day, procedure_id, request_status_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS request_rollup_days (
+        request_id BIGINT UNSIGNED NOT NULL PRIMARY KEY,
+        start_date DATE NULL,
+        created_at DATE NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS agent_state_change_daily_rollup (
+        user_id BIGINT UNSIGNED NOT NULL,
+        day DATE NOT NULL,
+        procedure_id BIGINT UNSIGNED NOT NULL,
+        request_status_id BIGINT UNSIGNED NOT NULL,
+        total INT UNSIGNED NOT NULL,
+        PRIMARY KEY (user_id, day, procedure_id, request_status_id)
+    )
+    """,
+]
+
+STATE_ROLLUP_WATERMARK = "request_state_daily_rollup"
+# Marca de tiempo (UNIX_TIMESTAMP) de la última lectura de requests.updated_at.
+STATE_ROLLUP_UPDATES = "request_state_daily_rollup.updates"
+# Las filas se releen este margen hacia atrás: updated_at lo fija la aplicación, no el commit.
+UPDATES_RESCAN_SECONDS = 60
+AGENT_ROLLUP_WATERMARK = "agent_state_change_daily_rollup"
+
+# {basis} solo se sustituye con valores de BASES.
+BUILD_ALL = """
+    INSERT INTO request_state_daily_rollup (basis, day, procedure_id, request_status_id, total)
+    SELECT '{basis}', DATE(r.{basis}), r.procedure_id, rcs.request_status_id, COUNT(*)
+    FROM requests r
+    JOIN request_current_state rcs ON rcs.request_id = r.id
+    WHERE r.deleted_at IS NULL
+      AND rcs.request_status_id IS NOT NULL
+    GROUP BY DATE(r.{basis}), r.procedure_id, rcs.request_status_id
+"""
+
+BUILD_DAY = """
+    INSERT INTO request_state_daily_rollup (basis, day, procedure_id, request_status_id, total)
+    SELECT '{basis}', %(day)s, r.procedure_id, rcs.request_status_id, COUNT(*)
+    FROM requests r
+    JOIN request_current_state rcs ON rcs.request_id = r.id
+    WHERE r.{basis} >= %(day)s AND r.{basis} < %(next_day)s
+      AND r.deleted_at IS NULL
+      AND rcs.request_status_id IS NOT NULL
+    GROUP BY r.procedure_id, rcs.request_status_id
+"""
+
+BUILD_REQUEST_DAYS = """
+    INSERT INTO request_rollup_days (request_id, start_date, created_at)
+    SELECT r.id, DATE(r.start_date), DATE(r.created_at)
+    FROM requests r
+"""
+
+# Días actuales y días en que se contó cada solicitud con registros nuevos...
+DIRTY_BY_RECORDS = """
+    SELECT DISTINCT r.id, DATE(r.start_date), DATE(r.created_at), d.start_date, d.created_at
+    FROM request_state_records rsr
+    JOIN requests r ON r.id = rsr.request_id
+    LEFT JOIN request_rollup_days d ON d.request_id = r.id
+    WHERE rsr.id > %(lo)s AND rsr.id <= %(hi)s
+"""
+
+# ...o con la fila modificada (usa UPDATED_AT_INDEX).
+DIRTY_BY_UPDATES = """
+    SELECT r.id, DATE(r.start_date), DATE(r.created_at), d.start_date, d.created_at
+    FROM requests r
+    LEFT JOIN request_rollup_days d ON d.request_id = r.id
+    WHERE r.updated_at >= FROM_UNIXTIME(%(since)s)
+"""
+
+# Error de MySQL al crear un índice que ya existe.
+ER_DUP_KEYNAME = 1061
+
+# Sin este índice DIRTY_BY_UPDATES recorre la tabla entera en cada pasada.
+HAS_UPDATED_AT_INDEX = """
+    SELECT 1 FROM information_schema.statistics
+    WHERE table_schema = DATABASE() AND table_name = 'requests'
+      AND column_name = 'updated_at' AND seq_in_index = 1
+    LIMIT 1
+"""
+UPDATED_AT_INDEX = "ALTER TABLE requests ADD INDEX idx_requests_updated_at (updated_at), ALGORITHM=INPLACE, LOCK=NONE"
+
+UPSERT_REQUEST_DAYS = """
+    INSERT INTO request_rollup_days (request_id, start_date, created_at) VALUES (%s, %s, %s)
+    ON DUPLICATE KEY UPDATE start_date = VALUES(start_date), created_at = VALUES(created_at)
+"""
+
+# Días completos desde la rollup + bordes parciales en vivo desde la proyección
+# (o desde el historial mientras la proyección no está al día).
+# Los nombres de trámite y estado se resuelven en Python (src/dimensions.py).
+STATE_COUNTS = """
+    SELECT x.procedure_id, x.request_status_id, SUM(x.total) AS total
+    FROM (
+        SELECT rl.procedure_id, rl.request_status_id, rl.total
+        FROM request_state_daily_rollup rl
+        WHERE rl.basis = '{basis}'
+          AND rl.day >= %(first_day)s AND rl.day < %(end_day)s
+          {rollup_filter}
+        UNION ALL
+        SELECT r.procedure_id, rcs.request_status_id, 1
+        FROM requests r
+        {current_state}
+        WHERE r.{basis} >= %(lo)s AND r.{basis} < %(head_end)s
+          AND r.deleted_at IS NULL
+          {live_filter}
+        UNION ALL
+        SELECT r.procedure_id, rcs.request_status_id, 1
+        FROM requests r
+        {current_state}
+        WHERE r.{basis} >= %(tail_start)s AND r.{basis} < %(hi)s
+          AND r.deleted_at IS NULL
+          {live_filter}
+    ) x
+    GROUP BY x.procedure_id, x.request_status_id;
+"""
+
+# Columnas del reporte por descripción de estado, en el orden en que se muestran.
+STATE_COLUMNS = (
+    ("Borrador", "borrador"),
+    ("Publicado", "publicado"),
+    ("En proceso", "en_proceso"),
+    ("Finalizado", "finalizado"),
+    ("Rechazado", "rechazado"),
+    ("Revocado", "revocado"),
+)
+
+UPSERT_AGENT_CHANGES = """
+    INSERT INTO agent_state_change_daily_rollup (user_id, day, procedure_id, request_status_id, total)
+    SELECT rsr.user_id, DATE(rsr.created_at), r.procedure_id, rsr.request_status_id, COUNT(*)
+    FROM request_state_records rsr
+    JOIN requests r ON rsr.request_id = r.id
+    WHERE rsr.id > %(lo)s AND rsr.id <= %(hi)s
+      AND rsr.request_status_id NOT IN (0, 1, 2)
+      AND rsr.user_id IS NOT NULL
+      AND rsr.created_at IS NOT NULL
+    GROUP BY rsr.user_id, DATE(rsr.created_at), r.procedure_id, rsr.request_status_id
+    ON DUPLICATE KEY UPDATE total = total + VALUES(total);
+"""
+
+BUILD_AGENT_DAY = """
+    INSERT INTO agent_state_change_daily_rollup (user_id, day, procedure_id, request_status_id, total)
+    SELECT rsr.user_id, %(day)s, r.procedure_id, rsr.request_status_id, COUNT(*)
+    FROM request_state_records rsr
+    JOIN requests r ON rsr.request_id = r.id
+    WHERE rsr.created_at >= %(day)s AND rsr.created_at < %(next_day)s
+      AND rsr.request_status_id NOT IN (0, 1, 2)
+      AND rsr.user_id IS NOT NULL
+    GROUP BY rsr.user_id, r.procedure_id, rsr.request_status_id
+"""
+
+TOUCHED_DAYS = """
+    SELECT DISTINCT DATE(rsr.created_at)
+    FROM request_state_records rsr
+    WHERE rsr.id > %(lo)s AND rsr.id <= %(hi)s
+      AND rsr.created_at IS NOT NULL
+"""
+
+AGENT_LIVE_CHANGES = """
+        SELECT r.procedure_id, rsr.request_status_id, 1
+        FROM request_state_records rsr
+        JOIN users u ON rsr.user_id = u.id
+        JOIN requests r ON rsr.request_id = r.id
+        WHERE u.dni = %(dni_agente)s
+          AND rsr.created_at >= %({lo})s AND rsr.created_at < %({hi})s
+          AND rsr.request_status_id NOT IN (0, 1, 2)
+          {{live_filter}}
+"""
+
+AGENT_STATE_CHANGES = """
+    SELECT x.procedure_id, x.request_status_id, SUM(x.total) AS total_cambios
+    FROM (
+        SELECT rl.procedure_id, rl.request_status_id, rl.total
+        FROM agent_state_change_daily_rollup rl
+        WHERE rl.user_id IN (SELECT u.id FROM users u WHERE u.dni = %(dni_agente)s)
+          AND rl.day >= %(first_day)s AND rl.day < %(end_day)s
+          {{rollup_filter}}
+        UNION ALL
+        {head}
+        UNION ALL
+        {tail}
+    ) x
+    GROUP BY x.procedure_id, x.request_status_id;
+""".format(
+    head=AGENT_LIVE_CHANGES.format(lo="lo", hi="head_end"),
+    tail=AGENT_LIVE_CHANGES.format(lo="tail_start", hi="hi"),
+)
+
+_schema_ready = False
+_state_ready = False
+_agent_covered_until: Optional[datetime] = None
+_refresh_lock = threading.Lock()
+_agent_refresh_lock = threading.Lock()
+
+
+def ensure_schema(conn) -> None:
+    global _schema_ready
+    if _schema_ready:
+        return
+    ensure_projection_schema(conn)
+    cursor = conn.cursor()
+    try:
+        for statement in SCHEMA:
+            cursor.execute(statement)
+        cursor.execute(HAS_UPDATED_AT_INDEX)
+        if not cursor.fetchall():
+            logger.info("Creating index idx_requests_updated_at on requests (online DDL)")
+            try:
+                cursor.execute(UPDATED_AT_INDEX)
+            except mysql.connector.Error as e:
+                # Otro proceso lo creó a la vez. Sin permiso de ALTER la
+                # reconciliación funciona igual, pero recorre la tabla.
+                if e.errno != ER_DUP_KEYNAME:
+                    logger.warning("Could not create idx_requests_updated_at, create it by hand: %s", e)
+    finally:
+        cursor.close()
+    _schema_ready = True
+
+
+# --- Maintenance ---
+
+def _rebuild_day(conn, cursor, basis: str, day: date) -> None:
+    conn.start_transaction()
+    try:
+        cursor.execute(
+            "DELETE FROM request_state_daily_rollup WHERE basis = %(basis)s AND day = %(day)s",
+            {"basis": basis, "day": day},
+        )
+        cursor.execute(BUILD_DAY.format(basis=basis), {"day": day, "next_day": day + timedelta(days=1)})
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def _build_all(conn, cursor, hwm: int, now: int) -> None:
+    conn.start_transaction()
+    try:
+        cursor.execute("DELETE FROM request_state_daily_rollup")
+        for basis in BASES:
+            cursor.execute(BUILD_ALL.format(basis=basis))
+        cursor.execute("DELETE FROM request_rollup_days")
+        cursor.execute(BUILD_REQUEST_DAYS)
+        set_watermark(cursor, STATE_ROLLUP_WATERMARK, hwm)
+        set_watermark(cursor, STATE_ROLLUP_UPDATES, now)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    chunk_cache.clear()
+
+
+def _collect_days(rows, dirty: Set[Tuple[str, date]], moved: Dict[int, Tuple[Any, Any]]) -> None:
+    """Add the current and previously counted days of every request in ``rows`` to ``dirty``."""
+    for request_id, start_day, created_day, old_start_day, old_created_day in rows:
+        for basis, day in (
+            ("start_date", start_day), ("created_at", created_day),
+            ("start_date", old_start_day), ("created_at", old_created_day),
+        ):
+            if day is not None:
+                dirty.add((basis, day))
+        if (start_day, created_day) != (old_start_day, old_created_day):
+            moved[request_id] = (start_day, created_day)
+
+
+def refresh_state_rollup() -> Dict[str, Any]:
+    """Reconcile the days touched by state records the projection already folded
+    in and by requests modified since the last run."""
+    global _state_ready
+    with _refresh_lock, db_connection() as conn:
+        ensure_schema(conn)
+        cursor = conn.cursor(buffered=True)
+        try:
+            # Con la proyección al día, esta pasada deja la rollup al día.
+            caught_up = get_watermark(cursor, PROJECTION_READY_MARK) == 1
+            # La rollup nunca se adelanta a la proyección de la que deriva.
+            projection_hwm = get_watermark(cursor, STATES_WATERMARK)
+            lo = get_watermark(cursor, STATE_ROLLUP_WATERMARK)
+            since = get_watermark(cursor, STATE_ROLLUP_UPDATES)
+            cursor.execute("SELECT UNIX_TIMESTAMP()")
+            now = int(cursor.fetchone()[0])
+            if lo == 0 or since == 0:
+                if projection_hwm:
+                    _build_all(conn, cursor, projection_hwm, now)
+                    _state_ready = caught_up
+                return {"full_build": bool(projection_hwm), "days": 0, "ready": _state_ready}
+
+            # Hoy y ayer se reconcilian siempre: cubren solicitudes nuevas o borradas sin historial.
+            today = db_clock.today()
+            dirty: Set[Tuple[str, date]] = {(basis, d) for basis in BASES for d in (today, today - timedelta(days=1))}
+            moved: Dict[int, Tuple[Any, Any]] = {}
+            # Se relee la misma ventana que la proyección: registros que confirmaron tarde.
+            start = max(lo - config.PROJECTION_RESCAN_IDS, 0)
+            while start < projection_hwm:
+                hi = min(start + config.PROJECTION_BATCH_SIZE, projection_hwm)
+                cursor.execute(DIRTY_BY_RECORDS, {"lo": start, "hi": hi})
+                _collect_days(cursor.fetchall(), dirty, moved)
+                start = hi
+            cursor.execute(DIRTY_BY_UPDATES, {"since": since - UPDATES_RESCAN_SECONDS})
+            _collect_days(cursor.fetchall(), dirty, moved)
+
+            for basis, day in sorted(dirty):
+                _rebuild_day(conn, cursor, basis, day)
+                chunk_versions.bump(f"{STATE_ROLLUP_WATERMARK}:{basis}", day)
+            conn.start_transaction()
+            try:
+                if moved:
+                    cursor.executemany(UPSERT_REQUEST_DAYS, [(request_id, *days) for request_id, days in moved.items()])
+                set_watermark(cursor, STATE_ROLLUP_WATERMARK, max(lo, projection_hwm))
+                set_watermark(cursor, STATE_ROLLUP_UPDATES, now)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            if caught_up:
+                _state_ready = True
+            return {"full_build": False, "days": len(dirty), "ready": _state_ready}
+        finally:
+            cursor.close()
+
+
+def rebuild_state_rollup() -> Dict[str, Any]:
+    """Recompute the whole rollup from ``request_current_state``."""
+    with _refresh_lock, db_connection() as conn:
+        ensure_schema(conn)
+        cursor = conn.cursor(buffered=True)
+        try:
+            cursor.execute("SELECT UNIX_TIMESTAMP()")
+            now = int(cursor.fetchone()[0])
+            _build_all(conn, cursor, get_watermark(cursor, STATES_WATERMARK), now)
+        finally:
+            cursor.close()
+    return {"full_build": True, "days": 0}
+
+
+def state_rollup_ready() -> bool:
+    """Whether the state rollup has caught up with the projection since startup."""
+    return _state_ready
+
+
+def _rebuild_agent_day(conn, cursor, day: date) -> None:
+    conn.start_transaction()
+    try:
+        cursor.execute("DELETE FROM agent_state_change_daily_rollup WHERE day = %(day)s", {"day": day})
+        cursor.execute(BUILD_AGENT_DAY, {"day": day, "next_day": day + timedelta(days=1)})
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def refresh_agent_rollup() -> Dict[str, Any]:
+    """Recompute the agent rollup days touched by state records since the last run."""
+    global _agent_covered_until
+    # Lo confirmado antes de empezar queda incluido al terminar la pasada.
+    started = db_clock.now()
+    with _agent_refresh_lock, db_connection() as conn:
+        ensure_schema(conn)
+        cursor = conn.cursor(buffered=True)
+        try:
+            mark = get_watermark(cursor, AGENT_ROLLUP_WATERMARK)
+            if mark == 0:
+                # Construcción inicial: sumar por lotes de ids es mucho más rápido que día por día.
+                folded = fold(conn, "request_state_records", AGENT_ROLLUP_WATERMARK, UPSERT_AGENT_CHANGES)
+                _agent_covered_until = started
+                return {"state_ids": folded, "days": 0}
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM request_state_records")
+            top = int(cursor.fetchone()[0])
+            # Se relee la ventana final: registros que confirmaron después de un id mayor.
+            cursor.execute(TOUCHED_DAYS, {"lo": max(mark - config.PROJECTION_RESCAN_IDS, 0), "hi": top})
+            days = sorted(row[0] for row in cursor.fetchall())
+            for day in days:
+                _rebuild_agent_day(conn, cursor, day)
+                chunk_versions.bump(AGENT_ROLLUP_WATERMARK, day)
+            set_watermark(cursor, AGENT_ROLLUP_WATERMARK, max(top, mark))
+        finally:
+            cursor.close()
+    _agent_covered_until = started
+    return {"state_ids": max(top - mark, 0), "days": len(days)}
+
+
+def rebuild_agent_rollup() -> Dict[str, Any]:
+    """Recompute the agent rollup from the full history."""
+    global _agent_covered_until
+    with _agent_refresh_lock, db_connection() as conn:
+        # Mientras se reconstruye, los rangos se cuentan en vivo.
+        _agent_covered_until = None
+        ensure_schema(conn)
+        cursor = conn.cursor()
+        try:
+            conn.start_transaction()
+            cursor.execute("DELETE FROM agent_state_change_daily_rollup")
+            set_watermark(cursor, AGENT_ROLLUP_WATERMARK, 0)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+    result = refresh_agent_rollup()
+    # Se vacía al terminar: un trozo leído justo antes del borrado pudo ver totales parciales.
+    chunk_cache.clear()
+    return result
+
+
+def agent_rollup_until() -> datetime:
+    """Time up to which the agent rollup holds every state change; ``datetime.min`` before its first refresh."""
+    return _agent_covered_until or datetime.min
+
+
+# --- Queries ---
+
+def resolve_datetime(conn, value) -> Optional[datetime]:
+    parsed = parse_datetime_arg(value)
+    if parsed is None:
+        # Formatos que Python no reconoce se delegan a MySQL, como hacía el BETWEEN original.
+        cursor = conn.cursor(buffered=True)
+        try:
+            cursor.execute("SELECT CAST(%(value)s AS DATETIME(6))", {"value": value})
+            parsed = cursor.fetchone()[0]
+        finally:
+            cursor.close()
+    return parsed
+
+
+def split_range(lo: datetime, hi: datetime, rollup_until: datetime = datetime.max) -> Dict[str, datetime]:
+    """Split the half-open range ``[lo, hi)`` into live edges and whole rollup days.
+
+    Only days that end by ``rollup_until`` are read from the rollup; later
+    ones are counted live with the tail edge.
+    """
+    first_day = datetime.combine(lo.date(), time.min)
+    if first_day < lo:
+        first_day += timedelta(days=1)
+    end_day = min(datetime.combine(hi.date(), time.min), datetime.combine(rollup_until.date(), time.min))
+    if first_day >= end_day:
+        # Sin días completos: todo el rango se cuenta en vivo.
+        return {"lo": lo, "head_end": hi, "first_day": first_day, "end_day": first_day, "tail_start": hi, "hi": hi}
+    return {"lo": lo, "head_end": first_day, "first_day": first_day, "end_day": end_day, "tail_start": end_day, "hi": hi}
+
+
+def _resolve_range(fecha_inicio: Any, fecha_fin: Any) -> Optional[Tuple[datetime, datetime]]:
+    bounds = [parse_datetime_arg(value) for value in (fecha_inicio, fecha_fin)]
+    if None in bounds:
+        # La conexión se devuelve antes de repartir el rango en trozos.
+        with db_connection() as conn:
+            bounds = [resolve_datetime(conn, value) for value in (fecha_inicio, fecha_fin)]
+    lo, hi = bounds
+    if lo is None or hi is None:
+        return None
+    # BETWEEN es inclusivo: el fin pasa a exclusivo sumando un microsegundo.
+    return lo, hi + timedelta(microseconds=1)
+
+
+def _query_chunk(query: str, params: Dict[str, Any], rollup_until: datetime, lo: datetime, hi: datetime) -> List[Dict[str, Any]]:
+    with db_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            return run_query(cursor, query, {**params, **split_range(lo, hi, rollup_until)})
+        finally:
+            cursor.close()
+
+
+def _chunk_key(*parts: Any) -> str:
+    return "|".join(str(part) for part in parts)
+
+
+def _procedure_filters(procedure_ids: Optional[Sequence[int]], params: Dict[str, Any]) -> Dict[str, str]:
+    if procedure_ids is None:
+        return {"rollup_filter": "", "live_filter": ""}
+    clause, in_params = in_clause("procedure_id", procedure_ids)
+    params.update(in_params)
+    return {"rollup_filter": f"AND rl.procedure_id {clause}", "live_filter": f"AND r.procedure_id {clause}"}
+
+
+def state_counts(basis: str, fecha_inicio: Any, fecha_fin: Any, procedure_ids: Optional[Sequence[int]] = None) -> RangeResult:
+    """Per-procedure counts of current states for requests whose ``basis`` date
+    is between ``fecha_inicio`` and ``fecha_fin`` (both inclusive)."""
+    if basis not in BASES:
+        raise ValueError(f"Unknown rollup basis: {basis}")
+    if procedure_ids is not None and not procedure_ids:
+        return [], None
+    bounds = _resolve_range(fecha_inicio, fecha_fin)
+    if bounds is None:
+        return [], None
+    if analytics.snapshot.ready():
+        rows, snapshot_at = analytics.snapshot.state_counts(basis, *bounds, procedure_ids)
+        return pivot_state_counts(rows), analytics.snapshot_meta(snapshot_at)
+    params: Dict[str, Any] = {}
+    query = STATE_COUNTS.format(basis=basis, current_state=current_state_join(), **_procedure_filters(procedure_ids, params))
+    report = f"{STATE_ROLLUP_WATERMARK}:{basis}"
+    key = _chunk_key(sorted(procedure_ids) if procedure_ids is not None else "*")
+    # Hasta que la rollup está al día, todo el rango se cuenta en vivo.
+    rollup_until = datetime.max if state_rollup_ready() else datetime.min
+    rows = run_chunks(report, key, *bounds, lambda lo, hi: _query_chunk(query, params, rollup_until, lo, hi))
+    return pivot_state_counts(rows), None
+
+
+def pivot_state_counts(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """One row per procedure name with a column per state, ordered by name."""
+    columns = {collation_key(state): column for state, column in STATE_COLUMNS}
+    by_tramite: Dict[str, Dict[str, Any]] = {}
+    for row in rows:
+        tramite = dimensions.procedures.name(row["procedure_id"])
+        estado = dimensions.request_states.name(row["request_status_id"])
+        if tramite is None or estado is None:
+            continue
+        # Como el GROUP BY por nombre de antes: nombres que solo difieren en mayúsculas son una fila.
+        key = collation_key(tramite)
+        counts = by_tramite.get(key)
+        if counts is None:
+            counts = by_tramite[key] = {"tramite": tramite}
+            counts.update((column, Decimal(0)) for _, column in STATE_COLUMNS)
+            counts["total"] = Decimal(0)
+        column = columns.get(collation_key(estado))
+        if column is not None:
+            counts[column] += row["total"]
+        counts["total"] += row["total"]
+    return [by_tramite[key] for key in sorted(by_tramite)]
+
+
+def agent_state_changes(dni_agente: str, fecha_inicio: Any, fecha_fin: Any, procedure_ids: Optional[Sequence[int]] = None) -> RangeResult:
+    """State changes made by the agent with ``dni_agente`` between both dates
+    (inclusive), per procedure and state, most frequent first."""
+    if procedure_ids is not None and not procedure_ids:
+        return [], None
+    bounds = _resolve_range(fecha_inicio, fecha_fin)
+    if bounds is None:
+        return [], None
+    meta = None
+    if analytics.snapshot.ready():
+        rows, snapshot_at = analytics.snapshot.agent_state_changes(dni_agente, *bounds, procedure_ids)
+        meta = analytics.snapshot_meta(snapshot_at)
+    else:
+        params: Dict[str, Any] = {"dni_agente": dni_agente}
+        query = AGENT_STATE_CHANGES.format(**_procedure_filters(procedure_ids, params))
+        key = _chunk_key(dni_agente, sorted(procedure_ids) if procedure_ids is not None else "*")
+        # Solo los días que la rollup ya cubre por completo; el resto, en vivo.
+        rollup_until = agent_rollup_until()
+        rows = run_chunks(AGENT_ROLLUP_WATERMARK, key, *bounds, lambda lo, hi: _query_chunk(query, params, rollup_until, lo, hi))
+
+    totals: Dict[Tuple[str, str], Any] = {}
+    for row in rows:
+        tramite = dimensions.procedures.name(row["procedure_id"])
+        estado = dimensions.request_states.name(row["request_status_id"])
+        if tramite is None or estado is None:
+            continue
+        totals[(tramite, estado)] = totals.get((tramite, estado), 0) + row["total_cambios"]
+    ordered = sorted(totals.items(), key=lambda item: (collation_key(item[0][0]), -item[1]))
+    return [
+        {"nombre_tramite": tramite, "estado": estado, "total_cambios": total}
+        for (tramite, estado), total in ordered
+    ], meta
+
+
+state_rollup_task = register(
+    PeriodicTask("request_state_daily_rollup", config.ROLLUP_REFRESH_INTERVAL, refresh_state_rollup)
+)
+agent_rollup_task = register(
+    PeriodicTask("agent_state_change_daily_rollup", config.ROLLUP_REFRESH_INTERVAL, refresh_agent_rollup)
+)
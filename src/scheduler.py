@@ -0,0 +1,185 @@
+"""Cost-aware admission of tool calls to the executor.
+
+Every call gets a cost class from its tool (:meth:`src.tool_base.Tool.cost`).
+Classes are admitted in priority order, cheapest first, each within its
+own concurrency quota. Interactive lookups therefore never wait behind a
+burst of aggregations: the expensive classes cannot take every worker, and
+a freed worker goes to the cheapest waiting call. When the queue is full,
+the most expensive waiting call is shed first.
+
+A slot is given back when the worker running the call finishes, not when
+the caller stops waiting: a call that timed out or was cancelled keeps its
+slot until its thread is free again, so the scheduler never admits more
+work than there are workers.
+
+The scheduler lives on the event loop and needs no locks.
+"""
+import asyncio
+from collections import deque
+from concurrent.futures import Future
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Deque, Dict
+
+from . import config
+from .executor import ExecutorSaturatedError, executor
+
+# Clases de costo en orden de prioridad: la primera es la más barata.
+COST_CLASSES = ("lookup", "list", "report", "heavy")
+
+
+def default_limits(capacity: int) -> Dict[str, int]:
+    """Quotas that keep room for cheaper classes: all, 3/4, 1/2 and 1/4 of the workers."""
+    return {
+        "lookup": capacity,
+        "list": max(capacity * 3 // 4, 1),
+        "report": max(capacity // 2, 1),
+        "heavy": max(capacity // 4, 1),
+    }
+
+
+class CallShedError(ExecutorSaturatedError):
+    """A queued call was dropped to make room for a cheaper one."""
+
+
+class Scheduler:
+    """Admits at most ``capacity`` calls at once, per-class quotas and priority."""
+
+    def __init__(self, capacity: int, limits: Dict[str, int], queue_limit: int):
+        self.capacity = max(capacity, 1)
+        self.limits = {cost: max(limits.get(cost, self.capacity), 1) for cost in COST_CLASSES}
+        self.queue_limit = max(queue_limit, 0)
+        self._running = {cost: 0 for cost in COST_CLASSES}
+        self._waiting: Dict[str, Deque[asyncio.Future]] = {cost: deque() for cost in COST_CLASSES}
+        self._admitted = {cost: 0 for cost in COST_CLASSES}
+        self._shed = {cost: 0 for cost in COST_CLASSES}
+
+    @asynccontextmanager
+    async def slot(self, cost: str) -> AsyncIterator[None]:
+        """Hold a slot of class ``cost`` for the duration of the block."""
+        cost = await self.acquire(cost)
+        try:
+            yield
+        finally:
+            self._release(cost)
+
+    async def run(self, cost: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run ``fn`` on the executor in a slot of class ``cost``, held until the worker finishes."""
+        cost = await self.acquire(cost)
+        try:
+            future = executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._release(cost)
+            raise
+        self.release_when_done(cost, future)
+        return await asyncio.wrap_future(future)
+
+    async def acquire(self, cost: str) -> str:
+        """Wait for a slot of class ``cost``; returns the class actually taken."""
+        if cost not in self._running:
+            cost = COST_CLASSES[-1]
+        await self._acquire(cost)
+        return cost
+
+    def release_when_done(self, cost: str, future: Future) -> None:
+        """Give back a slot taken with :meth:`acquire` once ``future`` completes."""
+        loop = asyncio.get_running_loop()
+        # El worker termina en otro hilo: la liberación vuelve al event loop.
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._release, cost))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "capacity": self.capacity,
+            "queue_limit": self.queue_limit,
+            "classes": {
+                cost: {
+                    "limit": self.limits[cost],
+                    "running": self._running[cost],
+                    "queued": len(self._waiting[cost]),
+                    "admitted": self._admitted[cost],
+                    "shed": self._shed[cost],
+                }
+                for cost in COST_CLASSES
+            },
+        }
+
+    # --- Internals ---
+
+    def _can_start(self, cost: str) -> bool:
+        return sum(self._running.values()) < self.capacity and self._running[cost] < self.limits[cost]
+
+    def _start(self, cost: str) -> None:
+        self._running[cost] += 1
+        self._admitted[cost] += 1
+
+    async def _acquire(self, cost: str) -> None:
+        # Una espera cancelada sigue en la cola hasta que su tarea retoma: no cuenta.
+        queued = sum(1 for queue in self._waiting.values() for future in queue if not future.done())
+        if not queued and self._can_start(cost):
+            self._start(cost)
+            return
+        if queued >= self.queue_limit:
+            self._shed_for(cost)
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[cost].append(future)
+        # Se admite por orden de prioridad: puede entrar ya si las que esperan están topadas por su cuota.
+        self._wake()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                # Ya tenía el lugar asignado cuando se canceló: se devuelve.
+                self._release(cost)
+            else:
+                self._discard(cost, future)
+            raise
+
+    def _shed_for(self, cost: str) -> None:
+        """Make room in a full queue by dropping a more expensive call, or reject this one."""
+        rank = COST_CLASSES.index(cost)
+        for victim_cost in reversed(COST_CLASSES[rank + 1:]):
+            queue = self._waiting[victim_cost]
+            while queue:
+                # La más reciente de la clase más cara: la que menos esperó.
+                victim = queue.pop()
+                if victim.done():
+                    # Cancelada y todavía sin quitar de la cola: no ocupa lugar.
+                    continue
+                self._shed[victim_cost] += 1
+                victim.set_exception(CallShedError(
+                    f"Server overloaded: '{victim_cost}' call dropped in favour of cheaper work"
+                ))
+                return
+        self._shed[cost] += 1
+        raise CallShedError(
+            f"Server busy: {self.queue_limit} tool calls queued "
+            f"(capacity={self.capacity}, class '{cost}' limit={self.limits[cost]})"
+        )
+
+    def _discard(self, cost: str, future: asyncio.Future) -> None:
+        try:
+            self._waiting[cost].remove(future)
+        except ValueError:
+            pass
+
+    def _release(self, cost: str) -> None:
+        self._running[cost] -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        for cost in COST_CLASSES:
+            queue = self._waiting[cost]
+            while queue and self._can_start(cost):
+                future = queue.popleft()
+                if future.done():
+                    continue
+                self._start(cost)
+                future.set_result(None)
+
+
+def _limits() -> Dict[str, int]:
+    limits = default_limits(config.TOOL_WORKERS)
+    limits.update((cost, int(limit)) for cost, limit in config.TOOL_CLASS_LIMITS.items())
+    return limits
+
+
+scheduler = Scheduler(config.TOOL_WORKERS, _limits(), config.TOOL_QUEUE_LIMIT)
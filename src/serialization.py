@@ -0,0 +1,56 @@
+"""JSON encoding of structured tool results.
+
+Uses ``orjson`` (a declared dependency), which is several times faster
+than the standard library and encodes datetimes natively; where it cannot
+be installed, falls back to :mod:`json` with the same output shape.
+"""
+import json
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+from .models import StructuredData
+
+try:
+    import orjson
+except ImportError:  # dependencia opcional
+    orjson = None
+
+LAYOUTS = ("rows", "columns")
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        # Los SUM/COUNT de MySQL llegan como Decimal aunque sean enteros.
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("utf-8", "replace")
+    if isinstance(value, set):
+        return sorted(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value: Any) -> bytes:
+    """Compact UTF-8 JSON for ``value``."""
+    if orjson is not None:
+        return orjson.dumps(value, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def to_columns(rows: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    """Column-major layout: ``{"col": [v1, v2, ...]}``; column names are sent once."""
+    if not rows:
+        return {}
+    return {column: [row.get(column) for row in rows] for column in rows[0]}
+
+
+def structured(rows: List[Dict[str, Any]], meta: Optional[Dict[str, Any]], layout: str) -> StructuredData:
+    """``data`` payload of a structured response in the requested ``layout``."""
+    # Las filas ya vienen tipadas de fetch: validarlas otra vez costaría una pasada entera.
+    if layout == "rows":
+        return StructuredData.model_construct(rows=rows, meta=meta or None)
+    return StructuredData.model_construct(columns=to_columns(rows), count=len(rows), meta=meta or None)
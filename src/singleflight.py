@@ -0,0 +1,69 @@
+"""Coalesces identical concurrent tool calls into a single execution."""
+import asyncio
+import json
+from typing import Any, Awaitable, Callable, Dict
+
+
+def call_key(tool_name: str, args: Dict[str, Any]) -> str:
+    """Canonical key for a tool call: same tool and same args, same key."""
+    return json.dumps([tool_name, args], sort_keys=True, separators=(",", ":"), default=str)
+
+
+class SingleFlight:
+    """Shares one in-flight execution among callers with the same key.
+
+    Only calls that overlap in time are merged; once the execution finishes
+    the key is forgotten, so results are never older than a regular call.
+    The execution is cancelled only when every caller waiting for it has
+    been cancelled (e.g. all clients disconnected).
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._waiters: Dict[str, int] = {}
+        self._hits = 0
+        self._misses = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is not None:
+            self._hits += 1
+        else:
+            self._misses += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, key=key: self._forget(key, t))
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            # shield: si un cliente se desconecta no cancela la ejecución compartida.
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiters[key] == 1 and not task.done():
+                # Era el último interesado: se cancela la ejecución y su consulta.
+                task.cancel()
+            raise
+        finally:
+            remaining = self._waiters[key] - 1
+            if remaining:
+                self._waiters[key] = remaining
+            else:
+                del self._waiters[key]
+
+    def stats(self) -> Dict[str, Any]:
+        total = self._hits + self._misses
+        return {
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_ratio": self._hits / total if total else 0.0,
+            "in_flight": len(self._inflight),
+        }
+
+    def _forget(self, key: str, task: asyncio.Future) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Evita el aviso "exception was never retrieved" si nadie esperaba ya.
+            task.exception()
+
+
+singleflight = SingleFlight()
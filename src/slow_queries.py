@@ -0,0 +1,165 @@
+"""Capture of slow tool queries with their execution plans.
+
+Queries run through :func:`src.db.run_query` / :func:`src.db.iter_rows`
+that take longer than ``SLOW_QUERY_THRESHOLD_MS`` are recorded in a bounded
+ring with the tool that issued them, a fingerprint of their parameters and
+their timings. The plan is not fetched on the request path: a background
+task runs ``EXPLAIN`` (or ``EXPLAIN ANALYZE``) for pending entries on its
+own pooled connection and attaches the result.
+"""
+import logging
+import re
+import threading
+from collections import deque
+from datetime import datetime
+from itertools import count
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import config, metrics
+from .background import PeriodicTask, register
+from .logs import keyed_hash
+
+logger = logging.getLogger(__name__)
+
+# Entradas a las que el worker de EXPLAIN atiende por pasada.
+EXPLAIN_BATCH = 10
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def fingerprint(params: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Parameter names and types plus a keyed hash of the values.
+
+    Values (DNIs, ids) are not kept in the ring: equal hashes still show
+    that two slow executions used the same arguments. The hash is keyed
+    like the masked DNIs of the logs, so it cannot be reversed by trying
+    every DNI.
+    """
+    params = params or {}
+    digest = keyed_hash(repr(sorted(params.items(), key=lambda item: item[0])))
+    return {"params": {name: type(value).__name__ for name, value in params.items()}, "hash": digest}
+
+
+class SlowQueryLog:
+    """Bounded ring of slow query records, newest last."""
+
+    def __init__(self, capacity: int):
+        self._entries: deque = deque(maxlen=max(capacity, 1))
+        # Consulta y parámetros de las entradas sin plan; se descartan después del EXPLAIN.
+        self._pending: Dict[int, Tuple[str, Optional[Dict[str, Any]]]] = {}
+        self._ids = count(1)
+        self._lock = threading.Lock()
+        self._captured = 0
+
+    def capture(self, query: str, params: Optional[Dict[str, Any]], execute_s: float, fetch_s: float, rows: int) -> None:
+        statement = _WHITESPACE.sub(" ", query).strip()
+        entry = {
+            "id": next(self._ids),
+            "captured_at": datetime.now().isoformat(),
+            "tool": metrics.current_tool(),
+            "statement": statement,
+            **fingerprint(params),
+            "execute_ms": round(execute_s * 1000, 3),
+            "fetch_ms": round(fetch_s * 1000, 3),
+            "total_ms": round((execute_s + fetch_s) * 1000, 3),
+            "rows": rows,
+            "plan_status": "pending" if _explainable(statement) else "skipped",
+            "plan": None,
+        }
+        with self._lock:
+            if len(self._entries) == self._entries.maxlen:
+                self._pending.pop(self._entries[0]["id"], None)
+            self._entries.append(entry)
+            self._captured += 1
+            if entry["plan_status"] == "pending":
+                self._pending[entry["id"]] = (query, params)
+        if entry["plan_status"] == "pending":
+            explain_task.trigger()
+
+    def pending(self, limit: int) -> List[Tuple[Dict[str, Any], str, Optional[Dict[str, Any]]]]:
+        """Take up to ``limit`` entries awaiting a plan, with their query and params."""
+        with self._lock:
+            by_id = {entry["id"]: entry for entry in self._entries if entry["id"] in self._pending}
+            keys = list(self._pending)[:limit]
+            return [(by_id[key], *self._pending.pop(key)) for key in keys]
+
+    def entries(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(entry) for entry in reversed(self._entries)]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._pending.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "threshold_ms": config.SLOW_QUERY_THRESHOLD_MS,
+                "capacity": self._entries.maxlen,
+                "captured": self._captured,
+                "pending_plans": len(self._pending),
+                "explain_analyze": config.SLOW_QUERY_EXPLAIN_ANALYZE,
+            }
+
+
+def _explainable(statement: str) -> bool:
+    return statement.split(" ", 1)[0].upper() in ("SELECT", "WITH")
+
+
+slow_query_log = SlowQueryLog(config.SLOW_QUERY_CAPACITY)
+
+
+def observe(query: str, params: Optional[Dict[str, Any]], execute_s: float, fetch_s: float, rows: int) -> None:
+    """Record the query when it exceeded the threshold; called for every tool query."""
+    threshold = config.SLOW_QUERY_THRESHOLD_MS
+    if threshold > 0 and (execute_s + fetch_s) * 1000 >= threshold:
+        slow_query_log.capture(query, params, execute_s, fetch_s, rows)
+
+
+def _plan(cursor, query: str, params: Optional[Dict[str, Any]]) -> Any:
+    if config.SLOW_QUERY_EXPLAIN_ANALYZE:
+        # EXPLAIN ANALYZE ejecuta la consulta de nuevo (MySQL 8.0.18+).
+        cursor.execute("EXPLAIN ANALYZE " + query, params)
+        return cursor.fetchall()[0][0]
+    try:
+        cursor.execute("EXPLAIN FORMAT=TREE " + query, params)
+        return cursor.fetchall()[0][0]
+    except Exception:
+        # Servidores anteriores a MySQL 8.0.16: plan tabular.
+        logger.debug("EXPLAIN FORMAT=TREE not supported, using tabular EXPLAIN", exc_info=True)
+    cursor.execute("EXPLAIN " + query, params)
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def explain_pending() -> int:
+    """Attach plans to pending entries; returns how many were processed."""
+    batch = slow_query_log.pending(EXPLAIN_BATCH)
+    if not batch:
+        return 0
+    from .db import db_connection  # db importa este módulo
+
+    try:
+        with db_connection() as conn:
+            for entry, query, params in batch:
+                cursor = conn.cursor(buffered=True)
+                try:
+                    entry["plan"] = _plan(cursor, query, params)
+                    entry["plan_status"] = "done"
+                except Exception as e:
+                    entry["plan"] = str(e)
+                    entry["plan_status"] = "failed"
+                finally:
+                    cursor.close()
+    except Exception as e:
+        # Sin conexión: las entradas restantes quedan marcadas en lugar de pendientes para siempre.
+        for entry, _, _ in batch:
+            if entry["plan_status"] == "pending":
+                entry["plan"] = str(e)
+                entry["plan_status"] = "failed"
+        raise
+    return len(batch)
+
+
+explain_task = register(PeriodicTask("slow_query_explain", config.SLOW_QUERY_EXPLAIN_INTERVAL, explain_pending))
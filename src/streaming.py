@@ -0,0 +1,164 @@
+"""Streaming execution of the list tools as NDJSON or server-sent events.
+
+A streamable tool exposes ``stream(**args)``, a generator of row batches
+read from an unbuffered cursor. Each batch is pulled on the tool executor
+and encoded as soon as it arrives, so memory stays bounded by one batch
+whatever the size of the result. The stream ends with an ``end`` record
+carrying the row count, or an ``error`` record if the tool failed.
+
+A stream holds a ``heavy`` scheduler slot from its first batch to its last
+and runs inside its own :class:`~src.deadlines.QueryScope` with the
+``STREAM_TIMEOUT`` deadline. :meth:`Stream.close` runs when the body ends
+and again as the response's background task, so it also runs when the
+client disconnects before the body starts. It kills the query of an
+unfinished stream, closes the cursor on a worker (never on the event loop)
+and gives the slot back once that worker is done.
+"""
+import logging
+import threading
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from . import config, deadlines, metrics, replicas
+from .db import kill_queries
+from .deadlines import QueryScope, ToolTimeoutError
+from .executor import ExecutorSaturatedError, executor
+from .pagination import InvalidCursorError
+from .scheduler import scheduler
+from .serialization import dumps
+from .tools import ToolInputError
+
+logger = logging.getLogger(__name__)
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+
+def is_streamable(tool) -> bool:
+    return callable(getattr(tool, "stream", None))
+
+
+def encode(record: Dict[str, Any], fmt: str, event: str = "row") -> bytes:
+    data = dumps(record)
+    if fmt == "sse":
+        return b"event: " + event.encode() + b"\ndata: " + data + b"\n\n"
+    return data + b"\n"
+
+
+def _error_kind(error: Exception) -> str:
+    """Label of ``error`` in ``mcp_tool_errors_total``, as for ``/tools/execute``."""
+    if isinstance(error, (ToolInputError, InvalidCursorError)):
+        return "input"
+    if isinstance(error, ToolTimeoutError):
+        return "timeout"
+    return "query"
+
+
+def _error_record(error: Exception) -> Dict[str, Any]:
+    if _error_kind(error) != "query":
+        return {"error": str(error)}
+    return {"error": f"Error al ejecutar la consulta: {error}"}
+
+
+class Stream:
+    """An open stream: its batches, query scope and scheduler slot."""
+
+    def __init__(self, tool, batches: Iterator[List[Dict[str, Any]]], fmt: str):
+        self.batches = batches
+        self.fmt = fmt
+        self.scope = QueryScope(tool.name, config.STREAM_TIMEOUT, kill_queries)
+        self.tolerance = tool.replica_lag_tolerance()
+        self.tool_name = metrics.current_tool()
+        self.cost: Optional[str] = None
+        self.body: Optional[AsyncIterator[bytes]] = None
+        self.finished = False
+        self._closed = False
+        # next() y close() nunca corren a la vez sobre el generador.
+        self._lock = threading.Lock()
+
+    def next_batch(self) -> Optional[List[Dict[str, Any]]]:
+        """Next batch, read on the worker with the stream's scope and replica route current."""
+        with self._lock:
+            token = deadlines.enter(self.scope)
+            # El cursor se abre con el primer lote: ahí se elige réplica o primario.
+            route = replicas.enter(self.tolerance)
+            try:
+                self.scope.check()
+                return next(self.batches, None)
+            finally:
+                replicas.leave(route)
+                deadlines.leave(token)
+
+    async def close(self) -> None:
+        """Release the stream's query, cursor and slot; safe to call more than once."""
+        if self._closed:
+            return
+        self._closed = True
+        if not self.finished:
+            # El cliente se fue antes del final: se mata la consulta en curso.
+            self.scope.cancel()
+        # Sin await: puede correr dentro de una cancelación, y el lugar se libera al terminar el worker.
+        future = executor.cleanup(self._close_batches)
+        if self.cost is not None:
+            scheduler.release_when_done(self.cost, future)
+
+    def _close_batches(self) -> None:
+        # Espera a que termine el next() en curso, que tras el KILL vuelve enseguida.
+        with self._lock:
+            try:
+                self.batches.close()
+            except Exception as e:
+                logger.warning("Could not close the stream cursor of %s: %s", self.tool_name, e)
+
+    async def _chunks(self, batch: Optional[List[Dict[str, Any]]], failure: Optional[Exception]) -> AsyncIterator[bytes]:
+        rows = 0
+        size = 0
+        try:
+            if failure is None:
+                while batch is not None:
+                    rows += len(batch)
+                    chunk = b"".join(encode(row, self.fmt) for row in batch)
+                    size += len(chunk)
+                    yield chunk
+                    # El cuerpo se envía después de que el endpoint retornó: se atribuye a mano.
+                    batch = await executor.run(metrics.run_as, self.tool_name, self.next_batch)
+        except Exception as e:
+            failure = e
+        else:
+            self.finished = True
+        finally:
+            if failure is not None:
+                self.finished = True
+            await self.close()
+            metrics.rows_returned.observe(rows, self.tool_name)
+            metrics.response_bytes.observe(size, self.tool_name)
+        if failure is not None:
+            metrics.run_as(self.tool_name, metrics.count_error, _error_kind(failure))
+            yield encode(_error_record(failure), self.fmt, "error")
+        else:
+            yield encode({"end": True, "rows": rows}, self.fmt, "end")
+
+
+async def open_stream(tool, args: Dict[str, Any], fmt: str) -> Stream:
+    """Start ``tool.stream(**args)`` and return the stream; its ``body`` yields the encoded chunks.
+
+    The slot is taken and the first batch read before returning, so an
+    :class:`~src.executor.ExecutorSaturatedError` can still be turned into
+    an HTTP error instead of a half-sent response. The caller must make
+    sure :meth:`Stream.close` runs, e.g. as the response's background task.
+    """
+    stream = Stream(tool, tool.stream(**args), fmt)
+    stream.cost = await scheduler.acquire("heavy")
+    first: Optional[List[Dict[str, Any]]] = None
+    failure: Optional[Exception] = None
+    try:
+        first = await executor.run(stream.next_batch)
+    except ExecutorSaturatedError:
+        stream.finished = True
+        await stream.close()
+        raise
+    except Exception as e:
+        failure = e
+    except BaseException:
+        await stream.close()
+        raise
+    stream.body = stream._chunks(first, failure)
+    return stream
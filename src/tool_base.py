@@ -0,0 +1,83 @@
+"""Native tool protocol served by the HTTP API.
+
+A :class:`Tool` is a pydantic model with a ``name``, a ``description``, an
+``args_schema`` and a :meth:`Tool.run` method, the same surface as
+``crewai.tools.BaseTool`` without importing crewai and its dependency tree.
+Agents that need CrewAI tools wrap them with :func:`crewai_tool`, which
+loads crewai on first use.
+"""
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Any, ClassVar, Dict, List, Optional, Type
+
+from pydantic import BaseModel, ConfigDict
+
+from . import config
+
+
+class Tool(BaseModel, ABC):
+    """Base class of every tool in the registry; subclasses implement ``_run``."""
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    name: str
+    description: str
+    args_schema: Type[BaseModel]
+    # Clase de costo para el scheduler: lookup, list, report o heavy.
+    cost_class: ClassVar[str] = "report"
+    # Herramientas que deben ver lo escrito hace segundos (p. ej. un mensaje recién enviado).
+    primary_reads: ClassVar[bool] = False
+
+    def cost(self, args: Dict[str, Any]) -> str:
+        """Cost class of a call with ``args``; the declared class by default."""
+        return self.cost_class
+
+    def replica_lag_tolerance(self) -> Optional[float]:
+        """Seconds of replica lag this tool accepts; ``None`` reads from the primary.
+
+        Point lookups (cost class ``lookup``) and tools with ``primary_reads``
+        answer about the current state and stay on the primary; other tools
+        accept ``REPLICA_MAX_LAG``. ``REPLICA_MAX_LAG_OVERRIDES`` takes
+        precedence for either.
+        """
+        tolerance = config.REPLICA_MAX_LAG_OVERRIDES.get(self.name)
+        if tolerance is None:
+            if self.cost_class == "lookup" or self.primary_reads:
+                return None
+            tolerance = config.REPLICA_MAX_LAG
+        return tolerance if tolerance > 0 else None
+
+    def run(self, *args, **kwargs) -> Any:
+        return self._run(*args, **kwargs)
+
+    @abstractmethod
+    def _run(self, *args, **kwargs) -> Any:
+        """Execute the tool with its validated arguments."""
+
+
+@lru_cache(maxsize=None)
+def _crewai_adapter() -> type:
+    from crewai.tools import BaseTool
+
+    class CrewAITool(BaseTool):
+        """``BaseTool`` delegating to a native :class:`Tool`."""
+        tool: Any
+
+        def _run(self, **kwargs) -> Any:
+            return self.tool.run(**kwargs)
+
+    return CrewAITool
+
+
+def crewai_tool(tool: Tool) -> Any:
+    """Wrap ``tool`` as a ``crewai.tools.BaseTool`` for a CrewAI agent."""
+    return _crewai_adapter()(
+        name=tool.name,
+        description=tool.description,
+        args_schema=tool.args_schema,
+        tool=tool,
+    )
+
+
+def crewai_tools(registry: Dict[str, Tool]) -> List[Any]:
+    """CrewAI wrappers for every tool of ``registry``."""
+    return [crewai_tool(tool) for tool in registry.values()]
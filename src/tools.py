@@ -1,138 +1,257 @@
-import os
-import mysql.connector
-from typing import Type
-from pydantic import BaseModel, Field
-from crewai.tools import BaseTool
-from dotenv import load_dotenv
-
-load_dotenv()
-
-def get_db_connection():
-    return mysql.connector.connect(
-        host=os.getenv("DB_HOST"),
-        port=os.getenv("DB_PORT"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD"),
-        database=os.getenv("DB_DATABASE")
-    )
+import logging
+from abc import abstractmethod
+from datetime import date, timedelta
+from typing import Any, ClassVar, Dict, Iterator, List, NamedTuple, Optional, Tuple, Type
+from pydantic import BaseModel, Field, model_validator
+from .tool_base import Tool
+from . import config, hot_reports, metrics
+from .bulk import MISSING, fetch_grouped, unique_keys
+from .dates import parse_datetime_arg
+from .db import db_clock, fetch_all, in_clause, iter_rows
+from .deadlines import ToolTimeoutError
+from .dimensions import decorate, dimensions
+from .name_index import collation_key, not_found_message
+from .pagination import InvalidCursorError, dated_key, dated_value, decode_cursor, encode_cursor, page_limit, split_page
+from .projections import current_state_join, ready as projection_ready
+from .rendering import RowTemplate, TextRenderer
+from .rollups import agent_state_changes, state_counts
+
+logger = logging.getLogger(__name__)
+
+class ToolInputError(Exception):
+    """Input a tool cannot answer; the message is returned to the agent as is."""
+
+
+class InputErrorText(str):
+    """Text answer for a :class:`ToolInputError`; never cached, since the
+    same arguments may be valid once the dimension tables change."""
+
+
+class ToolData(NamedTuple):
+    """Typed result of :meth:`ReportTool.fetch`: rows plus page or lookup metadata."""
+    rows: List[Dict[str, Any]]
+    meta: Optional[Dict[str, Any]] = None
+
+
+class ReportTool(Tool):
+    """Tool split into :meth:`fetch`, which returns typed rows, and :meth:`render`,
+    which turns them into the text the agent reads.
+
+    ``_run`` keeps the text contract and turns failures into messages; the
+    structured output mode of ``/tools/execute`` calls :meth:`fetch` directly.
+    """
+    error_message: ClassVar[str] = "Error al ejecutar la consulta"
+
+    @abstractmethod
+    def fetch(self, **kwargs) -> ToolData:
+        """Rows and metadata of the report for the validated arguments."""
+
+    def render(self, data: ToolData, **kwargs) -> str:
+        return str(data.rows)
+
+    def cost(self, args: Dict[str, Any]) -> str:
+        """Declared class, raised to ``heavy`` for wide date ranges and to
+        ``list`` for lookups of many keys."""
+        start = parse_datetime_arg(args.get("fecha_inicio"))
+        end = parse_datetime_arg(args.get("fecha_fin"))
+        if start is not None and end is not None and (end - start).days >= config.COST_HEAVY_RANGE_DAYS:
+            return "heavy"
+        keys = args.get("request_ids") or args.get("dnis")
+        if self.cost_class == "lookup" and isinstance(keys, list) and len(keys) > config.COST_BULK_KEYS:
+            return "list"
+        return self.cost_class
+
+    def _run(self, **kwargs) -> str:
+        try:
+            data = self.fetch(**kwargs)
+            metrics.observe_rows(len(data.rows))
+            with metrics.timed("format"):
+                return resolved_header(data.meta) + self.render(data, **kwargs) + snapshot_footer(data.meta)
+        except (ToolInputError, InvalidCursorError) as e:
+            metrics.count_error("input")
+            return InputErrorText(e)
+        except ToolTimeoutError:
+            # No se convierte en texto: el servidor lo informa como timeout (504).
+            raise
+        except Exception as e:
+            metrics.count_error("query")
+            return f"{self.error_message}: {e}"
+
+
+def check_key_count(count: int) -> None:
+    """Reject a bulk call above ``BULK_MAX_KEYS``."""
+    if count > config.BULK_MAX_KEYS:
+        raise ToolInputError(f"Error: se pidieron {count} claves; el máximo por llamada es {config.BULK_MAX_KEYS}.")
+
+def resolve_procedure(nombre_tramite: str) -> Tuple[str, Tuple[int, ...]]:
+    """Canonical procedure name and ids for an approximate ``nombre_tramite``."""
+    match = dimensions.procedures.resolve(nombre_tramite)
+    if match.name is None:
+        raise ToolInputError(not_found_message(f"No existe ningún trámite llamado '{nombre_tramite}'.", match))
+    return match.name, dimensions.procedures.ids(match.name)
+
+class PageInput(BaseModel):
+    """Keyset pagination arguments shared by the list tools."""
+    limit: Optional[int] = Field(None, ge=1, description="cantidad máxima de filas a devolver (por defecto una página)")
+    cursor: Optional[str] = Field(None, description="el next_cursor devuelto por la página anterior, para continuar el listado")
+
+
+def resolved_meta(requested: str, name: str) -> Dict[str, Any]:
+    """``{'resuelto': name}`` when ``requested`` was matched approximately to ``name``."""
+    if collation_key(requested) == collation_key(name):
+        return {}
+    return {'resuelto': name}
+
+def resolved_header(meta: Optional[Dict[str, Any]]) -> str:
+    if not meta or 'resuelto' not in meta:
+        return ""
+    return f"Mostrando resultados para «{meta['resuelto']}».\n\n"
+
+def snapshot_footer(meta: Optional[Dict[str, Any]]) -> str:
+    if not meta or 'snapshot_at' not in meta:
+        return ""
+    return f"\n\n(Datos del snapshot analítico del {meta['snapshot_at']}.)"
+
+def page_footer(next_cursor: Optional[str]) -> str:
+    if next_cursor is None:
+        return ""
+    return f"\n\nHay más resultados. Para la página siguiente use cursor='{next_cursor}'."
+
+def limit_clause(limit: Optional[int]) -> str:
+    return "" if limit is None else f"LIMIT {int(limit)}"
+
+def rendered_cursor(kind: str, rows: List[Dict[str, Any]], renderer: TextRenderer, key_columns: Tuple[str, ...], next_cursor: Optional[str]) -> Optional[str]:
+    """Next cursor of a page whose text was cut by the output budget.
+
+    The page continues after the last row actually shown, so rows left out
+    of the text are not skipped by the next call.
+    """
+    if not renderer.truncated:
+        return next_cursor
+    last = rows[renderer.rows - 1]
+    return encode_cursor(kind, [last[column] for column in key_columns])
 
 class EstadoSolicitudPorIdInput(BaseModel):
     """Input for estado_solicitud_por_id tool."""
-    request_id: int = Field(..., description="el ID de la solicitud a consultar")
+    request_id: Optional[int] = Field(None, description="el ID de la solicitud a consultar")
+    request_ids: Optional[List[int]] = Field(None, description="varios IDs de solicitud a consultar en una sola llamada, en lugar de request_id")
 
-class EstadoSolicitudPorIdTool(BaseTool):
+    @model_validator(mode="after")
+    def _require_key(self):
+        if self.request_id is None and not self.request_ids:
+            raise ValueError("se requiere request_id o request_ids")
+        return self
+
+class EstadoSolicitudPorIdTool(ReportTool):
     name: str = "estado_solicitud_por_id"
-    description: str = "Consulta el estado y detalles de una solicitud específica usando su ID."
+    description: str = "Consulta el estado y detalles de una solicitud específica usando su ID. Acepta también una lista de IDs (request_ids) para consultar varias solicitudes en una sola llamada."
     args_schema: Type[BaseModel] = EstadoSolicitudPorIdInput
+    cost_class: ClassVar[str] = "lookup"
+    error_message: ClassVar[str] = "Error executing query"
 
-    def _run(self, request_id: int) -> str:
+    @staticmethod
+    def _lookup(keys: List[int], live: bool = False) -> Dict[int, List[Dict[str, Any]]]:
         query = """
             SELECT
                 r.id AS id_solicitud,
                 u.name AS usuario,
                 u.dni AS dni_usuario,
-                p.name AS tramite,
+                r.procedure_id AS tramite,
                 r.start_date AS fecha_inicio,
                 r.finish_date AS fecha_fin,
-                rs.description AS estado_actual,
-                a.description AS ultima_accion,
-                ra.created_at AS fecha_accion
+                rcs.request_status_id AS estado_actual,
+                rcs.action_id AS ultima_accion,
+                rcs.action_date AS fecha_accion
             FROM requests r
             JOIN users u ON r.user_id = u.id
-            JOIN procedures p ON r.procedure_id = p.id
-            JOIN (
-                SELECT rsr1.* FROM request_state_records rsr1
-                JOIN (
-                    SELECT request_id, MAX(date) AS max_date
-                    FROM request_state_records GROUP BY request_id
-                ) latest ON rsr1.request_id = latest.request_id AND rsr1.date = latest.max_date
-            ) rsr ON rsr.request_id = r.id
-            JOIN request_states rs ON rs.id = rsr.request_status_id
-            LEFT JOIN (
-                SELECT ra1.* FROM request_actions ra1
-                JOIN (
-                    SELECT request_id, MAX(created_at) AS max_date
-                    FROM request_actions GROUP BY request_id
-                ) latest_ra ON ra1.request_id = latest_ra.request_id AND ra1.created_at = latest_ra.max_date
-            ) ra ON ra.request_id = r.id
-            LEFT JOIN actions a ON a.id = ra.action_id
-            WHERE r.id = %(request_id)s
+            {current_state}
+            WHERE r.id {{keys}}
+              AND rcs.request_status_id IS NOT NULL
               AND r.deleted_at IS NULL;
-        """
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute(query, {'request_id': request_id})
-            result = cursor.fetchall()
-            conn.close()
-
-            if not result:
+        """.format(current_state=current_state_join(live=live))
+        return fetch_grouped(query, keys, 'id_solicitud')
+
+    def fetch(self, request_id: Optional[int] = None, request_ids: Optional[List[int]] = None) -> ToolData:
+        keys = unique_keys(request_ids or [request_id], int)
+        check_key_count(len(keys))
+        grouped = self._lookup(keys)
+        missing = [key for key, key_rows in grouped.items() if not key_rows]
+        if missing and projection_ready():
+            # Puede que sus registros aún no estén en la proyección: se confirman en vivo.
+            grouped.update(self._lookup(missing, live=True))
+        # Los ids de trámite, estado y acción se traducen con las cachés de dimensiones.
+        rows = decorate(
+            [row for key_rows in grouped.values() for row in key_rows],
+            optional=('ultima_accion',),
+            tramite=dimensions.procedures,
+            estado_actual=dimensions.request_states,
+            ultima_accion=dimensions.actions,
+        )
+        found = {row['id_solicitud'] for row in rows}
+        return ToolData(rows, {'missing': [key for key in grouped if key not in found]})
+
+    def render(self, data: ToolData, request_id: Optional[int] = None, request_ids: Optional[List[int]] = None) -> str:
+        if request_ids is None:
+            if not data.rows:
                 return f"No se encontró ninguna solicitud con ID: {request_id}"
+            return str(data.rows)
 
-            return str(result)
-        except Exception as e:
-            return f"Error executing query: {e}"
+        # Una entrada por ID pedido; las inexistentes quedan marcadas.
+        by_id = {row['id_solicitud']: row for row in data.rows}
+        return str({key: by_id.get(key, MISSING) for key in unique_keys(request_ids, int)})
 
 class EstadoUltimaSolicitudUsuarioInput(BaseModel):
     """Input for estado_ultima_solicitud_usuario tool."""
     dni_usuario: str = Field(..., description="el número de DNI del usuario a consultar")
     nombre_tramite: str = Field(..., description="el nombre exacto del trámite a consultar")
 
-class EstadoUltimaSolicitudUsuarioTool(BaseTool):
+class EstadoUltimaSolicitudUsuarioTool(ReportTool):
     name: str = "estado_ultima_solicitud_usuario"
     description: str = "Consulta el estado de la última solicitud de un trámite para un usuario (DNI)."
     args_schema: Type[BaseModel] = EstadoUltimaSolicitudUsuarioInput
+    cost_class: ClassVar[str] = "lookup"
+    error_message: ClassVar[str] = "Error executing query"
 
-    def _run(self, dni_usuario: str, nombre_tramite: str) -> str:
+    def fetch(self, dni_usuario: str, nombre_tramite: str) -> ToolData:
+        tramite, procedure_ids = resolve_procedure(nombre_tramite)
+        procedure_in, params = in_clause('procedure_id', procedure_ids)
         query = """
             SELECT 
                 u.name AS usuario,
-                p.name AS tramite,
+                r.procedure_id AS tramite,
                 r.start_date AS fecha_inicio,
                 r.finish_date AS fecha_fin,
-                rs.description AS estado_actual,
-                a.description AS ultima_accion,
-                ra.created_at AS fecha_accion
+                rcs.request_status_id AS estado_actual,
+                rcs.action_id AS ultima_accion,
+                rcs.action_date AS fecha_accion
             FROM requests r
             JOIN users u ON r.user_id = u.id
-            JOIN procedures p ON r.procedure_id = p.id
-            JOIN (
-                SELECT rsr1.* FROM request_state_records rsr1
-                JOIN (
-                    SELECT request_id, MAX(date) AS max_date
-                    FROM request_state_records GROUP BY request_id
-                ) latest ON rsr1.request_id = latest.request_id AND rsr1.date = latest.max_date
-            ) rsr ON rsr.request_id = r.id
-            JOIN request_states rs ON rs.id = rsr.request_status_id
-            LEFT JOIN (
-                SELECT ra1.* FROM request_actions ra1
-                JOIN (
-                    SELECT request_id, MAX(created_at) AS max_date
-                    FROM request_actions GROUP BY request_id
-                ) latest_ra ON ra1.request_id = latest_ra.request_id AND ra1.created_at = latest_ra.max_date
-            ) ra ON ra.request_id = r.id
-            LEFT JOIN actions a ON a.id = ra.action_id
+            {current_state}
             WHERE u.dni = %(dni_usuario)s
-              AND p.name = %(nombre_tramite)s
+              AND r.procedure_id {procedure_in}
               AND r.id = (
                   SELECT r2.id FROM requests r2
-                  JOIN procedures p2 ON r2.procedure_id = p2.id
                   WHERE r2.user_id = u.id
-                    AND p2.name = %(nombre_tramite)s
+                    AND r2.procedure_id {procedure_in}
                   ORDER BY r2.created_at DESC
                   LIMIT 1
               )
+              AND rcs.request_status_id IS NOT NULL
               AND r.deleted_at IS NULL;
         """
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute(query, {'dni_usuario': dni_usuario, 'nombre_tramite': nombre_tramite})
-            result = cursor.fetchall()
-            conn.close()
-            return str(result)
-        except Exception as e:
-            return f"Error executing query: {e}"
+        params['dni_usuario'] = dni_usuario
+        rows = fetch_all(query.format(current_state=current_state_join(), procedure_in=procedure_in), params)
+        if not rows and projection_ready():
+            # Puede que sus registros aún no estén en la proyección: se confirma en vivo.
+            rows = fetch_all(query.format(current_state=current_state_join(live=True), procedure_in=procedure_in), params)
+        rows = decorate(
+            rows,
+            optional=('ultima_accion',),
+            tramite=dimensions.procedures,
+            estado_actual=dimensions.request_states,
+            ultima_accion=dimensions.actions,
+        )
+        return ToolData(rows, resolved_meta(nombre_tramite, tramite))
 
 class ConteoEstadosTramiteEspecificoInput(BaseModel):
     """Input for conteo_estados_tramite_especifico tool."""
@@ -140,94 +259,42 @@ class ConteoEstadosTramiteEspecificoInput(BaseModel):
     fecha_inicio: str = Field(..., description="la fecha y hora de inicio del período (formato AAAA-MM-DD HH:MM:SS)")
     fecha_fin: str = Field(..., description="la fecha y hora de fin del período (formato AAAA-MM-DD HH:MM:SS)")
 
-class ConteoEstadosTramiteEspecificoTool(BaseTool):
+class ConteoEstadosTramiteEspecificoTool(ReportTool):
     name: str = "conteo_estados_tramite_especifico"
     description: str = "Cuenta las solicitudes y sus estados para un trámite y rango de fechas."
     args_schema: Type[BaseModel] = ConteoEstadosTramiteEspecificoInput
+    error_message: ClassVar[str] = "Error executing query"
 
-    def _run(self, nombre_tramite: str, fecha_inicio: str, fecha_fin: str) -> str:
-        query = """
-            WITH ultimo_estado AS (
-                SELECT r.id AS request_id, p.name AS tramite, rs.description AS estado,
-                       ROW_NUMBER() OVER (PARTITION BY r.id ORDER BY rsr.date DESC) AS rn
-                FROM requests r
-                JOIN procedures p ON r.procedure_id = p.id
-                JOIN request_state_records rsr ON rsr.request_id = r.id
-                JOIN request_states rs ON rsr.request_status_id = rs.id
-                WHERE p.name = %(nombre_tramite)s
-                  AND r.start_date BETWEEN %(fecha_inicio)s AND %(fecha_fin)s
-                  AND r.deleted_at IS NULL
-            )
-            SELECT tramite,
-                   SUM(CASE WHEN estado = 'Borrador' THEN 1 ELSE 0 END) AS borrador,
-                   SUM(CASE WHEN estado = 'Publicado' THEN 1 ELSE 0 END) AS publicado,
-                   SUM(CASE WHEN estado = 'En proceso' THEN 1 ELSE 0 END) AS en_proceso,
-                   SUM(CASE WHEN estado = 'Finalizado' THEN 1 ELSE 0 END) AS finalizado,
-                   SUM(CASE WHEN estado = 'Rechazado' THEN 1 ELSE 0 END) AS rechazado,
-                   SUM(CASE WHEN estado = 'Revocado' THEN 1 ELSE 0 END) AS revocado,
-                   COUNT(*) AS total
-            FROM ultimo_estado WHERE rn = 1 GROUP BY tramite ORDER BY tramite;
-        """
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute(query, {'nombre_tramite': nombre_tramite, 'fecha_inicio': fecha_inicio, 'fecha_fin': fecha_fin})
-            result = cursor.fetchall()
-            conn.close()
-            return str(result)
-        except Exception as e:
-            return f"Error executing query: {e}"
+    def fetch(self, nombre_tramite: str, fecha_inicio: str, fecha_fin: str) -> ToolData:
+        # El nombre se resuelve de forma aproximada antes de consultar.
+        tramite, procedure_ids = resolve_procedure(nombre_tramite)
+        # Días completos desde la rollup diaria, bordes del rango en vivo.
+        rows, meta = state_counts('start_date', fecha_inicio, fecha_fin, procedure_ids=procedure_ids)
+        return ToolData(rows, {**(meta or {}), **resolved_meta(nombre_tramite, tramite)})
 
 class SolicitudesPorEstadoInput(BaseModel):
     """Input for solicitudes_por_estado tool."""
     fecha_inicio: str = Field(..., description="la fecha y hora de inicio del período (formato AAAA-MM-DD HH:MM:SS)")
     fecha_fin: str = Field(..., description="la fecha y hora de fin del período (formato AAAA-MM-DD HH:MM:SS)")
 
-class SolicitudesPorEstadoTool(BaseTool):
+class SolicitudesPorEstadoTool(ReportTool):
     name: str = "solicitudes_por_estado"
     description: str = "Cuenta las solicitudes y sus estados para todos los trámites en un rango de fechas."
     args_schema: Type[BaseModel] = SolicitudesPorEstadoInput
+    error_message: ClassVar[str] = "Error executing query"
 
-    def _run(self, fecha_inicio: str, fecha_fin: str) -> str:
-        query = """
-            WITH ultimo_estado AS (
-                SELECT r.id AS request_id, p.name AS tramite, rs.description AS estado,
-                       ROW_NUMBER() OVER (PARTITION BY r.id ORDER BY rsr.date DESC) AS rn
-                FROM requests r
-                JOIN request_state_records rsr ON rsr.request_id = r.id
-                JOIN request_states rs ON rsr.request_status_id = rs.id
-                JOIN procedures p ON p.id = r.procedure_id
-                WHERE r.created_at BETWEEN %(fecha_inicio)s AND %(fecha_fin)s
-                  AND r.deleted_at IS NULL
-            )
-            SELECT tramite,
-                   SUM(CASE WHEN estado = 'Borrador' THEN 1 ELSE 0 END) AS borrador,
-                   SUM(CASE WHEN estado = 'Publicado' THEN 1 ELSE 0 END) AS publicado,
-                   SUM(CASE WHEN estado = 'En proceso' THEN 1 ELSE 0 END) AS en_proceso,
-                   SUM(CASE WHEN estado = 'Finalizado' THEN 1 ELSE 0 END) AS finalizado,
-                   SUM(CASE WHEN estado = 'Rechazado' THEN 1 ELSE 0 END) AS rechazado,
-                   SUM(CASE WHEN estado = 'Revocado' THEN 1 ELSE 0 END) AS revocado,
-                   COUNT(*) AS total
-            FROM ultimo_estado WHERE rn = 1 GROUP BY tramite ORDER BY tramite;
-        """
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute(query, {'fecha_inicio': fecha_inicio, 'fecha_fin': fecha_fin})
-            result = cursor.fetchall()
-            conn.close()
-            return str(result)
-        except Exception as e:
-            return f"Error executing query: {e}"
+    def fetch(self, fecha_inicio: str, fecha_fin: str) -> ToolData:
+        return ToolData(*state_counts('created_at', fecha_inicio, fecha_fin))
 
 class ListAvailableReportsInput(BaseModel):
     """Input for list_available_reports tool."""
     pass
 
-class ListAvailableReportsTool(BaseTool):
+class ListAvailableReportsTool(Tool):
     name: str = "list_available_reports"
     description: str = "Útil para cuando el usuario pregunta qué reportes, trámites o 'tramites' conoces o puedes hacer."
     args_schema: Type[BaseModel] = ListAvailableReportsInput
+    cost_class: ClassVar[str] = "lookup"
     tools_registry: dict = {}
 
     def __init__(self, tools_registry: dict = None):
@@ -250,102 +317,144 @@ class ListAvailableReportsTool(BaseTool):
 
 class ObtenerRolesUsuarioInput(BaseModel):
     """Input para la herramienta obtener_roles_usuario."""
-    dni_usuario: str = Field(..., description="DNI del usuario a consultar.")
+    dni_usuario: Optional[str] = Field(None, description="DNI del usuario a consultar.")
+    dnis: Optional[List[str]] = Field(None, description="varios DNIs a consultar en una sola llamada, en lugar de dni_usuario.")
+
+    @model_validator(mode="after")
+    def _require_key(self):
+        if self.dni_usuario is None and not self.dnis:
+            raise ValueError("se requiere dni_usuario o dnis")
+        return self
 
-class ObtenerRolesUsuarioTool(BaseTool):
+class ObtenerRolesUsuarioTool(ReportTool):
     name: str = "obtener_roles_usuario"
-    description: str = "Obtiene los roles asociados a un usuario a través de su DNI."
+    description: str = "Obtiene los roles asociados a un usuario a través de su DNI. Acepta también una lista de DNIs (dnis) para consultar varios usuarios en una sola llamada."
     args_schema: Type[BaseModel] = ObtenerRolesUsuarioInput
+    cost_class: ClassVar[str] = "lookup"
+    error_message: ClassVar[str] = "Error al ejecutar la consulta en la herramienta"
 
-    def _run(self, dni_usuario: str) -> str:
+    @staticmethod
+    def _keys(dni_usuario: Optional[str], dnis: Optional[List[str]]) -> List[str]:
         # Limpiamos el DNI para más seguridad
-        dni_limpio = str(dni_usuario).strip()
-        print(f"DEBUG: [Tool] Consultando roles para el DNI: '{dni_limpio}'")
+        return unique_keys(dnis or [dni_usuario], lambda dni: str(dni).strip())
+
+    def fetch(self, dni_usuario: Optional[str] = None, dnis: Optional[List[str]] = None) -> ToolData:
+        keys = self._keys(dni_usuario, dnis)
+        check_key_count(len(keys))
+        logger.debug("Consultando roles", extra={"fields": {"tool": self.name, "dnis": keys[:5], "count": len(keys)}})
 
         # La consulta probada, usando parámetros para todo
         query = r"""
             SELECT 
-                r.name AS rol
+                u.dni AS dni,
+                mhr.role_id AS rol
             FROM users u
             JOIN model_has_roles mhr 
                 ON mhr.model_id = u.id 
                AND mhr.model_type = %(m_type)s
-            JOIN roles r 
-                ON r.id = mhr.role_id
-            WHERE u.dni = %(dni)s;
+            WHERE u.dni {keys};
         """
         
         # Parámetros que se pasarán de forma segura a la consulta
         params = {
-            'dni': dni_limpio,
             'm_type': 'App\\Models\\User'
         }
 
-        try:
-            conn = get_db_connection()
-            if not conn:
-                return "Error: No se pudo establecer la conexión con la base de datos."
-
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute(query, params)
-            result = cursor.fetchall()
-            conn.close()
-            
-            if not result:
+        grouped = fetch_grouped(query, keys, 'dni', params)
+        # Un role_id sin fila en roles no aparecía con el JOIN; tampoco aquí.
+        rows = decorate([row for key_rows in grouped.values() for row in key_rows], rol=dimensions.roles)
+        found = {row['dni'] for row in rows}
+        return ToolData(rows, {'missing': [dni for dni in keys if dni not in found]})
+
+    def render(self, data: ToolData, dni_usuario: Optional[str] = None, dnis: Optional[List[str]] = None) -> str:
+        keys = self._keys(dni_usuario, dnis)
+        roles_por_dni = {dni: [] for dni in keys}
+        for row in data.rows:
+            roles_por_dni[row['dni']].append(row['rol'])
+
+        if dnis is None:
+            dni_limpio = keys[0]
+            roles = roles_por_dni[dni_limpio]
+            if not roles:
                 return f"No se encontraron roles para el DNI: {dni_limpio}"
-                
-            roles = [row['rol'] for row in result]
             return f"El usuario con DNI {dni_limpio} tiene los siguientes roles: {', '.join(roles)}"
-        except Exception as e:
-            return f"Error al ejecutar la consulta en la herramienta: {e}"
+
+        lineas = [
+            f"DNI {dni}: {', '.join(roles) if roles else MISSING}"
+            for dni, roles in roles_por_dni.items()
+        ]
+        return "Roles por DNI:\n" + "\n".join(lineas)
 
 
-class ListarUsuariosPorRolInput(BaseModel):
+class ListarUsuariosPorRolInput(PageInput):
     """Input para la herramienta ListarUsuariosPorRolTool."""
     nombre_rol: str = Field(..., description="el nombre exacto del rol a consultar")
 
-class ListarUsuariosPorRolTool(BaseTool):
+class ListarUsuariosPorRolTool(ReportTool):
     name: str = "listar_usuarios_por_rol"
     description: str = "Lista a todos los usuarios que tienen un rol específico. Necesita el nombre exacto del rol a consultar."
     args_schema: Type[BaseModel] = ListarUsuariosPorRolInput
-
-    def _run(self, nombre_rol: str) -> str:
+    cost_class: ClassVar[str] = "list"
+    page_key: ClassVar[Tuple[str, ...]] = ('id',)
+    row_template: ClassVar[RowTemplate] = RowTemplate("Nombre: {name}, DNI: {dni}\n")
+
+    def _query(self, nombre_rol: str, limit: Optional[int], cursor: Optional[str]) -> Tuple[str, Dict[str, Any], str]:
+        """Query, params and canonical role name for ``nombre_rol``, ordered by user id."""
+        match = dimensions.roles.resolve(nombre_rol)
+        if match.name is None:
+            raise ToolInputError(not_found_message(f"No se encontraron usuarios con el rol '{nombre_rol}' en la base de datos.", match))
+        role_in, params = in_clause('role_id', dimensions.roles.ids(match.name))
+        seek = ""
+        if cursor:
+            params['after_id'], = decode_cursor(self.name, cursor, 1)
+            seek = "AND u.id > %(after_id)s"
         # Consulta SQL con el modelo como parámetro para mayor seguridad y compatibilidad.
-        query = """
+        # EXISTS en lugar de JOIN: un usuario aparece una sola vez aunque tenga el rol repetido,
+        # y el orden por u.id recorre la clave primaria.
+        query = f"""
             SELECT
+                u.id,
                 u.name,
                 u.dni
             FROM users u
-            JOIN model_has_roles mhr
-                ON u.id = mhr.model_id
-               AND mhr.model_type = %(model_type)s
-            JOIN roles r
-                ON r.id = mhr.role_id
-            WHERE r.name = %(nombre_rol)s;
+            WHERE EXISTS (
+                SELECT 1 FROM model_has_roles mhr
+                WHERE mhr.model_id = u.id
+                  AND mhr.model_type = %(model_type)s
+                  AND mhr.role_id {role_in}
+            )
+            {seek}
+            ORDER BY u.id
+            {limit_clause(limit)};
         """
         # Parámetros para la consulta.
-        params = {
-            'nombre_rol': nombre_rol,
-            'model_type': 'App\\Models\\User'
-        }
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor(dictionary=True)
-            # Pasamos la consulta y los parámetros por separado.
-            cursor.execute(query, params)
-            result = cursor.fetchall()
-            conn.close()
-
-            if not result:
-                return f"No se encontraron usuarios con el rol '{nombre_rol}' en la base de datos."
-
-            usuarios_info = []
-            for row in result:
-                usuarios_info.append(f"Nombre: {row['name']}, DNI: {row['dni']}")
-
-            return f"Usuarios encontrados con el rol '{nombre_rol}':\n" + "\n".join(usuarios_info)
-        except Exception as e:
-            return f"Error al ejecutar la consulta: {e}"
+        params['model_type'] = 'App\\Models\\User'
+        return query, params, match.name
+
+    def fetch(self, nombre_rol: str, limit: Optional[int] = None, cursor: Optional[str] = None) -> ToolData:
+        limit = page_limit(limit)
+        query, params, rol = self._query(nombre_rol, limit + 1, cursor)
+        rows, next_cursor = split_page(self.name, fetch_all(query, params), limit, self.page_key)
+        return ToolData(rows, {'rol': rol, 'next_cursor': next_cursor, **resolved_meta(nombre_rol, rol)})
+
+    def render(self, data: ToolData, **kwargs) -> str:
+        nombre_rol = data.meta['rol']
+        if not data.rows:
+            return f"No se encontraron usuarios con el rol '{nombre_rol}' en la base de datos."
+
+        out = TextRenderer()
+        out.write(f"Usuarios encontrados con el rol '{nombre_rol}':\n")
+        for row in data.rows:
+            if not out.row(self.row_template.format(row)):
+                break
+        out.end_rows(len(data.rows))
+        next_cursor = rendered_cursor(self.name, data.rows, out, self.page_key, data.meta['next_cursor'])
+        return out.render().rstrip("\n") + page_footer(next_cursor)
+
+    def stream(self, nombre_rol: str, limit: Optional[int] = None, cursor: Optional[str] = None) -> Iterator[List[Dict[str, Any]]]:
+        """Users with the role, in batches read from an unbuffered cursor."""
+        query, params, _ = self._query(nombre_rol, limit, cursor)
+        yield from iter_rows(query, params)
             
 class ConsultarAtencionesAgenteInput(BaseModel):
     """Input para la herramienta ConsultarAtencionesAgenteTool."""
@@ -353,69 +462,36 @@ class ConsultarAtencionesAgenteInput(BaseModel):
     fecha_inicio: str = Field(..., description="La fecha y hora de inicio del periodo a consultar, en formato 'YYYY-MM-DD HH:MM:SS'")
     fecha_fin: str = Field(..., description="La fecha y hora de fin del periodo a consultar, en formato 'YYYY-MM-DD HH:MM:SS'")
 
-class ConsultarAtencionesAgenteTool(BaseTool):
+class ConsultarAtencionesAgenteTool(ReportTool):
     name: str = "consultar_atenciones_agente"
     description: str = "Consulta la cantidad de atenciones (cambios de estado) realizadas por un agente, por tipo de trámite y estado, en un periodo de tiempo específico. Utiliza el DNI del agente y un rango de fechas para el filtro."
     args_schema: Type[BaseModel] = ConsultarAtencionesAgenteInput
 
-    def _run(self, dni_agente: str, fecha_inicio: str, fecha_fin: str) -> str:
-        query = """
-            SELECT
-              p.name AS nombre_tramite,
-              rs.description AS estado,
-              COUNT(*) AS total_cambios
-            FROM
-              request_state_records rsr
-            JOIN
-              users u ON rsr.user_id = u.id
-            JOIN
-              request_states rs ON rsr.request_status_id = rs.id
-            JOIN
-              requests r ON rsr.request_id = r.id
-            JOIN
-              procedures p ON r.procedure_id = p.id
-            WHERE
-              u.dni = %(dni_agente)s
-              AND rsr.created_at BETWEEN %(fecha_inicio)s AND %(fecha_fin)s
-              AND rsr.request_status_id NOT IN (0, 1, 2)
-            GROUP BY
-              p.name,
-              rs.description
-            ORDER BY
-              p.name,
-              COUNT(*) DESC;
-        """
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute(query, {
-                'dni_agente': dni_agente,
-                'fecha_inicio': fecha_inicio,
-                'fecha_fin': fecha_fin
-            })
-            result = cursor.fetchall()
-            conn.close()
-
-            if not result:
-                return f"No se encontraron cambios de estado para el agente con DNI {dni_agente} entre {fecha_inicio} y {fecha_fin}."
-
-            output = f"Resumen de atenciones para el agente con DNI {dni_agente} entre {fecha_inicio} y {fecha_fin}:\n"
-            tramites_agrupados = {}
-            for row in result:
-                tramite = row['nombre_tramite']
-                estado = row['estado']
-                cantidad = row['total_cambios']
-
-                if tramite not in tramites_agrupados:
-                    tramites_agrupados[tramite] = []
-                tramites_agrupados[tramite].append(f"{estado}: {cantidad}")
-
-            for tramite, estados in tramites_agrupados.items():
-                output += f"- {tramite}: {', '.join(estados)}\n"
-
-            return output
-        except Exception as e:
-            return f"Error al ejecutar la consulta: {e}"
+    def fetch(self, dni_agente: str, fecha_inicio: str, fecha_fin: str) -> ToolData:
+        # Días completos desde la rollup de actividad por agente, bordes del rango en vivo.
+        return ToolData(*agent_state_changes(dni_agente, fecha_inicio, fecha_fin))
+
+    def render(self, data: ToolData, dni_agente: str, fecha_inicio: str, fecha_fin: str) -> str:
+        if not data.rows:
+            return f"No se encontraron cambios de estado para el agente con DNI {dni_agente} entre {fecha_inicio} y {fecha_fin}."
+
+        tramites_agrupados = {}
+        for row in data.rows:
+            tramite = row['nombre_tramite']
+            estado = row['estado']
+            cantidad = row['total_cambios']
+
+            if tramite not in tramites_agrupados:
+                tramites_agrupados[tramite] = []
+            tramites_agrupados[tramite].append(f"{estado}: {cantidad}")
+
+        out = TextRenderer()
+        out.write(f"Resumen de atenciones para el agente con DNI {dni_agente} entre {fecha_inicio} y {fecha_fin}:\n")
+        for tramite, estados in tramites_agrupados.items():
+            if not out.row(f"- {tramite}: {', '.join(estados)}\n"):
+                break
+        out.end_rows(len(tramites_agrupados))
+        return out.render()
 
 class ConsultarAtencionesAgentePorTramiteInput(BaseModel):
     """Input para la herramienta ConsultarAtencionesAgentePorTramiteTool."""
@@ -424,146 +500,156 @@ class ConsultarAtencionesAgentePorTramiteInput(BaseModel):
     fecha_inicio: str = Field(..., description="La fecha y hora de inicio del periodo a consultar, en formato 'YYYY-MM-DD HH:MM:SS'")
     fecha_fin: str = Field(..., description="La fecha y hora de fin del periodo a consultar, en formato 'YYYY-MM-DD HH:MM:SS'")
 
-class ConsultarAtencionesAgentePorTramiteTool(BaseTool):
+class ConsultarAtencionesAgentePorTramiteTool(ReportTool):
     name: str = "consultar_atenciones_agente_por_tramite"
     description: str = "Consulta la cantidad de atenciones (cambios de estado) realizadas por un agente, para un tipo de trámite específico y en un periodo de tiempo. Utiliza el DNI del agente, el nombre exacto del trámite y un rango de fechas para el filtro."
     args_schema: Type[BaseModel] = ConsultarAtencionesAgentePorTramiteInput
-
-    def _run(self, dni_agente: str, nombre_tramite: str, fecha_inicio: str, fecha_fin: str) -> str:
-        query = """
-            SELECT
-              p.name AS nombre_tramite,
-              rs.description AS estado,
-              COUNT(*) AS total_cambios
-            FROM
-              request_state_records rsr
-            JOIN
-              users u ON rsr.user_id = u.id
-            JOIN
-              request_states rs ON rsr.request_status_id = rs.id
-            JOIN
-              requests r ON rsr.request_id = r.id
-            JOIN
-              procedures p ON r.procedure_id = p.id
-            WHERE
-              u.dni = %(dni_agente)s
-              AND rsr.created_at BETWEEN %(fecha_inicio)s AND %(fecha_fin)s
-              AND rsr.request_status_id NOT IN (0, 1, 2)
-              AND p.name = %(nombre_tramite)s
-            GROUP BY
-              p.name,
-              rs.description
-            ORDER BY
-              p.name,
-              COUNT(*) DESC;
-        """
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute(query, {
-                'dni_agente': dni_agente,
-                'nombre_tramite': nombre_tramite,
-                'fecha_inicio': fecha_inicio,
-                'fecha_fin': fecha_fin
-            })
-            result = cursor.fetchall()
-            conn.close()
-
-            if not result:
-                return f"No se encontraron cambios de estado para el agente con DNI {dni_agente} para el trámite '{nombre_tramite}' entre {fecha_inicio} y {fecha_fin}."
-
-            output = f"Resumen de atenciones para el agente con DNI {dni_agente} en el trámite '{nombre_tramite}':\n"
-            for row in result:
-                estado = row['estado']
-                cantidad = row['total_cambios']
-                output += f"- {estado}: {cantidad} cambios de estado.\n"
-
-            return output
-        except Exception as e:
-            return f"Error al ejecutar la consulta: {e}"
-
-class ListarSolicitudesPorDniInput(BaseModel):
+    row_template: ClassVar[RowTemplate] = RowTemplate("- {estado}: {total_cambios} cambios de estado.\n")
+
+    def fetch(self, dni_agente: str, nombre_tramite: str, fecha_inicio: str, fecha_fin: str) -> ToolData:
+        # El nombre se resuelve de forma aproximada antes de consultar.
+        tramite, procedure_ids = resolve_procedure(nombre_tramite)
+        rows, meta = agent_state_changes(dni_agente, fecha_inicio, fecha_fin, procedure_ids=procedure_ids)
+        return ToolData(rows, {**(meta or {}), 'tramite': tramite, **resolved_meta(nombre_tramite, tramite)})
+
+    def render(self, data: ToolData, dni_agente: str, fecha_inicio: str, fecha_fin: str, **kwargs) -> str:
+        nombre_tramite = data.meta['tramite']
+        if not data.rows:
+            return f"No se encontraron cambios de estado para el agente con DNI {dni_agente} para el trámite '{nombre_tramite}' entre {fecha_inicio} y {fecha_fin}."
+
+        out = TextRenderer()
+        out.write(f"Resumen de atenciones para el agente con DNI {dni_agente} en el trámite '{nombre_tramite}':\n")
+        for row in data.rows:
+            if not out.row(self.row_template.format(row)):
+                break
+        out.end_rows(len(data.rows))
+        return out.render()
+
+class ListarSolicitudesPorDniInput(PageInput):
     """Input para la herramienta ListarSolicitudesPorDniTool."""
     dni_usuario: str = Field(..., description="el número de DNI del usuario a consultar")
 
-class ListarSolicitudesPorDniTool(BaseTool):
+class ListarSolicitudesPorDniTool(ReportTool):
     name: str = "listar_solicitudes_por_dni"
     description: str = "Lista todas las solicitudes realizadas por un usuario específico usando su DNI. Muestra información detallada de cada solicitud incluyendo ID, trámite, fechas, estado actual y última acción."
     args_schema: Type[BaseModel] = ListarSolicitudesPorDniInput
+    cost_class: ClassVar[str] = "list"
+    primary_reads: ClassVar[bool] = True
+    page_key: ClassVar[Tuple[str, ...]] = ('fecha_creacion', 'id_solicitud')
+    row_template: ClassVar[RowTemplate] = RowTemplate(
+        "{idx}. ID Solicitud: {id_solicitud}",
+        "   Trámite: {tramite}",
+        "   Estado actual: {estado_actual}",
+        "   Fecha inicio: {fecha_inicio}",
+        ("fecha_fin", "   Fecha fin: {fecha_fin}"),
+        ("ultima_accion", "   Última acción: {ultima_accion} ({fecha_accion})"),
+        "\n",
+    )
 
-    def _run(self, dni_usuario: str) -> str:
-        query = """
+    def _query(self, dni_usuario: str, limit: Optional[int], cursor: Optional[str]) -> Tuple[str, Dict[str, Any]]:
+        params = {'dni_usuario': dni_usuario}
+        seek = ""
+        if cursor:
+            after_created, params['after_id'] = decode_cursor(self.name, cursor, 2)
+            params['after_created'] = dated_value(after_created)
+            seek = f"""AND ({dated_key('r.created_at')} < %(after_created)s
+                   OR ({dated_key('r.created_at')} = %(after_created)s AND r.id < %(after_id)s))"""
+        query = f"""
             SELECT
                 r.id AS id_solicitud,
                 u.name AS usuario,
                 u.dni AS dni_usuario,
-                p.name AS tramite,
+                r.procedure_id AS tramite,
                 r.start_date AS fecha_inicio,
                 r.finish_date AS fecha_fin,
-                rs.description AS estado_actual,
-                a.description AS ultima_accion,
-                ra.created_at AS fecha_accion
+                rcs.request_status_id AS estado_actual,
+                rcs.action_id AS ultima_accion,
+                rcs.action_date AS fecha_accion,
+                r.created_at AS fecha_creacion
             FROM requests r
             JOIN users u ON r.user_id = u.id
-            JOIN procedures p ON r.procedure_id = p.id
-            JOIN (
-                SELECT rsr1.* FROM request_state_records rsr1
-                JOIN (
-                    SELECT request_id, MAX(date) AS max_date
-                    FROM request_state_records GROUP BY request_id
-                ) latest ON rsr1.request_id = latest.request_id AND rsr1.date = latest.max_date
-            ) rsr ON rsr.request_id = r.id
-            JOIN request_states rs ON rs.id = rsr.request_status_id
-            LEFT JOIN (
-                SELECT ra1.* FROM request_actions ra1
-                JOIN (
-                    SELECT request_id, MAX(created_at) AS max_date
-                    FROM request_actions GROUP BY request_id
-                ) latest_ra ON ra1.request_id = latest_ra.request_id AND ra1.created_at = latest_ra.max_date
-            ) ra ON ra.request_id = r.id
-            LEFT JOIN actions a ON a.id = ra.action_id
+            {current_state_join()}
             WHERE u.dni = %(dni_usuario)s
+              AND rcs.request_status_id IS NOT NULL
               AND r.deleted_at IS NULL
-            ORDER BY r.created_at DESC;
+              {seek}
+            ORDER BY {dated_key('r.created_at')} DESC, r.id DESC
+            {limit_clause(limit)};
         """
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute(query, {'dni_usuario': dni_usuario})
-            result = cursor.fetchall()
-            conn.close()
-
-            if not result:
-                return f"No se encontraron solicitudes para el usuario con DNI: {dni_usuario}"
-
-            output = f"Solicitudes encontradas para el DNI {dni_usuario} ({result[0]['usuario']}):\n\n"
-            for idx, solicitud in enumerate(result, start=1):
-                output += f"{idx}. ID Solicitud: {solicitud['id_solicitud']}\n"
-                output += f"   Trámite: {solicitud['tramite']}\n"
-                output += f"   Estado actual: {solicitud['estado_actual']}\n"
-                output += f"   Fecha inicio: {solicitud['fecha_inicio']}\n"
-                if solicitud['fecha_fin']:
-                    output += f"   Fecha fin: {solicitud['fecha_fin']}\n"
-                if solicitud['ultima_accion']:
-                    output += f"   Última acción: {solicitud['ultima_accion']} ({solicitud['fecha_accion']})\n"
-                output += "\n"
-
-            output += f"Total de solicitudes: {len(result)}"
-            return output
-        except Exception as e:
-            return f"Error al ejecutar la consulta: {e}"
-
-class ConsultarMensajesSolicitudInput(BaseModel):
+        return query, params
+
+    @staticmethod
+    def _decorate(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return decorate(
+            rows,
+            optional=('ultima_accion',),
+            tramite=dimensions.procedures,
+            estado_actual=dimensions.request_states,
+            ultima_accion=dimensions.actions,
+        )
+
+    def fetch(self, dni_usuario: str, limit: Optional[int] = None, cursor: Optional[str] = None) -> ToolData:
+        limit = page_limit(limit)
+        rows = fetch_all(*self._query(dni_usuario, limit + 1, cursor))
+        rows, next_cursor = split_page(self.name, rows, limit, self.page_key)
+        return ToolData(self._decorate(rows), {'next_cursor': next_cursor})
+
+    def render(self, data: ToolData, dni_usuario: str, cursor: Optional[str] = None, **kwargs) -> str:
+        result, next_cursor = data.rows, data.meta['next_cursor']
+        if not result:
+            return f"No se encontraron solicitudes para el usuario con DNI: {dni_usuario}"
+
+        out = TextRenderer()
+        out.write(f"Solicitudes encontradas para el DNI {dni_usuario} ({result[0]['usuario']}):\n\n")
+        for idx, solicitud in enumerate(result, start=1):
+            if not out.row(self.row_template.format(solicitud, idx=idx)):
+                break
+        out.end_rows(len(result))
+        next_cursor = rendered_cursor(self.name, result, out, self.page_key, next_cursor)
+
+        if next_cursor is None and not cursor:
+            out.write(f"Total de solicitudes: {len(result)}")
+        else:
+            out.write(f"Solicitudes en esta página: {out.rows}")
+        return out.render() + page_footer(next_cursor)
+
+    def stream(self, dni_usuario: str, limit: Optional[int] = None, cursor: Optional[str] = None) -> Iterator[List[Dict[str, Any]]]:
+        """The user's requests, newest first, in batches read from an unbuffered cursor."""
+        for rows in iter_rows(*self._query(dni_usuario, limit, cursor)):
+            yield self._decorate(rows)
+
+class ConsultarMensajesSolicitudInput(PageInput):
     """Input para la herramienta ConsultarMensajesSolicitudTool."""
     request_id: int = Field(..., description="el ID de la solicitud para consultar sus mensajes")
 
-class ConsultarMensajesSolicitudTool(BaseTool):
+class ConsultarMensajesSolicitudTool(ReportTool):
     name: str = "consultar_mensajes_solicitud"
     description: str = "Consulta todos los mensajes de la conversación asociada a una solicitud específica. Muestra el historial completo de mensajes ordenados cronológicamente."
     args_schema: Type[BaseModel] = ConsultarMensajesSolicitudInput
+    cost_class: ClassVar[str] = "list"
+    primary_reads: ClassVar[bool] = True
+    page_key: ClassVar[Tuple[str, ...]] = ('fecha_creacion', 'mensaje_id')
+    row_template: ClassVar[RowTemplate] = RowTemplate(
+        "Mensaje #{idx} (ID: {mensaje_id})",
+        "Fecha: {fecha_creacion}",
+        "De: {emisor}",
+        "Para: {receptor}",
+        ("titulo", "Título: {titulo}"),
+        "Contenido: {contenido}",
+        "Estado: {leido_texto} | {enviado_texto}",
+        ("rol_actual", "Rol: {rol_actual}"),
+        "-" * 70 + "\n\n",
+    )
 
-    def _run(self, request_id: int) -> str:
-        query = """
+    def _query(self, request_id: int, limit: Optional[int], cursor: Optional[str]) -> Tuple[str, Dict[str, Any]]:
+        params = {'request_id': request_id}
+        seek = ""
+        if cursor:
+            after_created, params['after_id'] = decode_cursor(self.name, cursor, 2)
+            params['after_created'] = dated_value(after_created)
+            seek = f"""AND ({dated_key('m.created_at')} > %(after_created)s
+                   OR ({dated_key('m.created_at')} = %(after_created)s AND m.id > %(after_id)s))"""
+        query = f"""
             SELECT 
                 m.id AS mensaje_id,
                 m.tittle AS titulo,
@@ -586,130 +672,168 @@ class ConsultarMensajesSolicitudTool(BaseTool):
                 WHERE request_id = %(request_id)s 
                 LIMIT 1
             )
-            ORDER BY m.created_at ASC;
+            {seek}
+            ORDER BY {dated_key('m.created_at')} ASC, m.id ASC
+            {limit_clause(limit)};
         """
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute(query, {'request_id': request_id})
-            result = cursor.fetchall()
-            conn.close()
-
-            if not result:
-                return f"No se encontraron mensajes para la solicitud con ID: {request_id}"
-
-            conversation_id = result[0]['conversation_id']
-            output = f"Mensajes de la conversación ID {conversation_id} (Solicitud #{request_id}):\n"
-            output += "=" * 70 + "\n\n"
-
-            for idx, mensaje in enumerate(result, start=1):
-                output += f"Mensaje #{idx} (ID: {mensaje['mensaje_id']})\n"
-                output += f"Fecha: {mensaje['fecha_creacion']}\n"
-                output += f"De: {mensaje['nombre_emisor'] or 'Usuario ' + str(mensaje['emisor_id'])}\n"
-                output += f"Para: {mensaje['nombre_receptor'] or 'Usuario ' + str(mensaje['receptor_id'])}\n"
-                
-                if mensaje['titulo']:
-                    output += f"Título: {mensaje['titulo']}\n"
-                
-                output += f"Contenido: {mensaje['contenido']}\n"
-                output += f"Estado: {'Leído' if mensaje['leido'] else 'No leído'} | {'Enviado' if mensaje['enviado'] else 'No enviado'}\n"
-                
-                if mensaje['rol_actual']:
-                    output += f"Rol: {mensaje['rol_actual']}\n"
-                
-                output += "-" * 70 + "\n\n"
-
-            output += f"Total de mensajes: {len(result)}"
-            return output
-        except Exception as e:
-            return f"Error al ejecutar la consulta: {e}"
+        return query, params
+
+    def fetch(self, request_id: int, limit: Optional[int] = None, cursor: Optional[str] = None) -> ToolData:
+        limit = page_limit(limit)
+        rows = fetch_all(*self._query(request_id, limit + 1, cursor))
+        rows, next_cursor = split_page(self.name, rows, limit, self.page_key)
+        return ToolData(rows, {'next_cursor': next_cursor})
+
+    def render(self, data: ToolData, request_id: int, cursor: Optional[str] = None, **kwargs) -> str:
+        result, next_cursor = data.rows, data.meta['next_cursor']
+        if not result:
+            return f"No se encontraron mensajes para la solicitud con ID: {request_id}"
+
+        conversation_id = result[0]['conversation_id']
+        out = TextRenderer()
+        out.write(f"Mensajes de la conversación ID {conversation_id} (Solicitud #{request_id}):\n")
+        out.write("=" * 70 + "\n\n")
+
+        for idx, mensaje in enumerate(result, start=1):
+            texto = self.row_template.format(
+                mensaje,
+                idx=idx,
+                emisor=mensaje['nombre_emisor'] or f"Usuario {mensaje['emisor_id']}",
+                receptor=mensaje['nombre_receptor'] or f"Usuario {mensaje['receptor_id']}",
+                leido_texto='Leído' if mensaje['leido'] else 'No leído',
+                enviado_texto='Enviado' if mensaje['enviado'] else 'No enviado',
+            )
+            if not out.row(texto):
+                break
+        out.end_rows(len(result))
+        next_cursor = rendered_cursor(self.name, result, out, self.page_key, next_cursor)
+
+        if next_cursor is None and not cursor:
+            out.write(f"Total de mensajes: {len(result)}")
+        else:
+            out.write(f"Mensajes en esta página: {out.rows}")
+        return out.render() + page_footer(next_cursor)
+
+    def stream(self, request_id: int, limit: Optional[int] = None, cursor: Optional[str] = None) -> Iterator[List[Dict[str, Any]]]:
+        """The conversation's messages in order, in batches read from an unbuffered cursor."""
+        yield from iter_rows(*self._query(request_id, limit, cursor))
 
 class SolicitudesTramiteHoyInput(BaseModel):
     """Input para la herramienta SolicitudesTramiteHoyTool."""
     class Config:
         extra = 'forbid'
 
-class SolicitudesTramiteHoyTool(BaseTool):
+class SolicitudesTramiteHoyTool(ReportTool):
     name: str = "solicitudes_tramite_hoy"
     description: str = "Consulta todas las solicitudes creadas el día de hoy de todos los trámites, agrupadas por trámite y estado. Muestra información completa de cada solicitud incluyendo usuario, fechas y última acción. No requiere parámetros."
     args_schema: Type[BaseModel] = SolicitudesTramiteHoyInput
 
-    def _run(self, **kwargs) -> str:
-        query = """
+    def fetch(self, **kwargs) -> ToolData:
+        # Se sirve desde memoria (src/hot_reports.py); en vivo solo si no está al día.
+        served = hot_reports.get(self.name)
+        if served is not None:
+            return ToolData(served['value'].rows, {'as_of': served['as_of'].isoformat(timespec='seconds')})
+        return self.compute()
+
+    def compute(self) -> ToolData:
+        day = db_clock.today()
+        # Rango sobre start_date en lugar de DATE(start_date): puede usar el índice.
+        query = f"""
             SELECT
-                p.name AS tramite,
-                rs.description AS estado,
+                r.procedure_id AS tramite,
+                rcs.request_status_id AS estado,
                 COUNT(*) AS cantidad
             FROM requests r
-            JOIN procedures p ON r.procedure_id = p.id
-            JOIN (
-                SELECT rsr1.* FROM request_state_records rsr1
-                JOIN (
-                    SELECT request_id, MAX(date) AS max_date
-                    FROM request_state_records GROUP BY request_id
-                ) latest ON rsr1.request_id = latest.request_id AND rsr1.date = latest.max_date
-            ) rsr ON rsr.request_id = r.id
-            JOIN request_states rs ON rs.id = rsr.request_status_id
-            WHERE DATE(r.start_date) = CURDATE()
+            {current_state_join()}
+            WHERE r.start_date >= %(day)s AND r.start_date < %(next_day)s
+              AND rcs.request_status_id IS NOT NULL
               AND r.deleted_at IS NULL
-            GROUP BY p.name, rs.description
-            ORDER BY p.name, rs.description;
+            GROUP BY r.procedure_id, rcs.request_status_id;
         """
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute(query)
-            result = cursor.fetchall()
-            conn.close()
-
-            if not result:
-                return "No se encontraron solicitudes creadas hoy."
-
-            # Agrupar por trámite
-            solicitudes_por_tramite = {}
-            total_general = 0
+        rows = decorate(
+            fetch_all(query, {'day': day, 'next_day': day + timedelta(days=1)}),
+            tramite=dimensions.procedures,
+            estado=dimensions.request_states,
+        )
+        # Dos ids con el mismo nombre se suman en una sola fila.
+        cantidades: Dict[Tuple[Any, Any], int] = {}
+        for row in rows:
+            key = (row['tramite'], row['estado'])
+            cantidades[key] = cantidades.get(key, 0) + row['cantidad']
+        return ToolData([
+            {'tramite': tramite, 'estado': estado, 'cantidad': cantidad}
+            for (tramite, estado), cantidad in sorted(cantidades.items(), key=lambda item: (str(item[0][0]), str(item[0][1])))
+        ])
+
+    def watermark(self, day: date) -> Tuple[Any, ...]:
+        """What the report depends on: the day's live requests (new ones and
+        soft deletes) with their procedure and current state, and the dimension names."""
+        # Una suma de control por solicitud: detecta cambios de trámite o de
+        # estado dentro del día aunque no se agreguen solicitudes nuevas.
+        query = f"""
+            SELECT
+                COUNT(*) AS requests,
+                BIT_XOR(CRC32(CONCAT_WS('|', r.id, r.procedure_id, rcs.request_status_id))) AS checksum
+            FROM requests r
+            {current_state_join()}
+            WHERE r.start_date >= %(day)s AND r.start_date < %(next_day)s
+              AND r.deleted_at IS NULL;
+        """
+        row = fetch_all(query, {'day': day, 'next_day': day + timedelta(days=1)})[0]
+        return (row['requests'], row['checksum'], dimensions.version)
+
+    def render(self, data: ToolData, **kwargs) -> str:
+        if not data.rows:
+            return "No se encontraron solicitudes creadas hoy."
+
+        # Agrupar por trámite
+        solicitudes_por_tramite = {}
+        total_general = 0
+        
+        for row in data.rows:
+            tramite = row['tramite']
+            estado = row['estado']
+            cantidad = row['cantidad']
+            total_general += cantidad
             
-            for row in result:
-                tramite = row['tramite']
-                estado = row['estado']
-                cantidad = row['cantidad']
-                total_general += cantidad
-                
-                if tramite not in solicitudes_por_tramite:
-                    solicitudes_por_tramite[tramite] = {}
-                
-                solicitudes_por_tramite[tramite][estado] = cantidad
-
-            # Construir el output
-            from datetime import date
-            fecha_hoy = date.today().strftime('%d/%m/%Y')
-            output = f"REPORTE DE SOLICITUDES DEL DIA - {fecha_hoy}\n\n"
-
-            # Mostrar por trámite
-            for tramite in sorted(solicitudes_por_tramite.keys()):
-                estados = solicitudes_por_tramite[tramite]
-                total_tramite = sum(estados.values())
-                
-                output += f"Tramite: {tramite}\n"
-                for estado in sorted(estados.keys()):
-                    cantidad = estados[estado]
-                    output += f"  {estado} : {cantidad}\n"
-                output += f"  Total: {total_tramite}\n\n"
-
-            # Resumen general
-            output += f"RESUMEN GENERAL: {total_general} solicitudes creadas hoy\n\n"
+            if tramite not in solicitudes_por_tramite:
+                solicitudes_por_tramite[tramite] = {}
             
-            # # Distribución por trámite
-            # output += "DISTRIBUCION POR TRAMITE:\n"
-            # for tramite in sorted(solicitudes_por_tramite.keys()):
-            #     total_tramite = sum(solicitudes_por_tramite[tramite].values())
-            #     porcentaje = (total_tramite / total_general) * 100
-            #     output += f"  {tramite}: {total_tramite} ({porcentaje:.1f}%)\n"
-                
-            #     # Desglose por estado
-            #     for estado, cantidad in sorted(solicitudes_por_tramite[tramite].items()):
-            #         output += f"    - {estado}: {cantidad}\n"
-
-            return output
-        except Exception as e:
-            return f"Error al ejecutar la consulta: {e}"
\ No newline at end of file
+            solicitudes_por_tramite[tramite][estado] = cantidad
+
+        # Construir el output
+        fecha_hoy = db_clock.today().strftime('%d/%m/%Y')
+        out = TextRenderer()
+        out.write(f"REPORTE DE SOLICITUDES DEL DIA - {fecha_hoy}\n")
+        if data.meta and data.meta.get('as_of'):
+            out.write(f"Actualizado: {data.meta['as_of'][11:19]}\n")
+        out.write("\n")
+
+        # Mostrar por trámite
+        for tramite in sorted(solicitudes_por_tramite.keys()):
+            estados = solicitudes_por_tramite[tramite]
+            total_tramite = sum(estados.values())
+
+            bloque = [f"Tramite: {tramite}\n"]
+            for estado in sorted(estados.keys()):
+                bloque.append(f"  {estado} : {estados[estado]}\n")
+            bloque.append(f"  Total: {total_tramite}\n\n")
+            if not out.row("".join(bloque)):
+                break
+        out.end_rows(len(solicitudes_por_tramite))
+
+        # Resumen general
+        out.write(f"RESUMEN GENERAL: {total_general} solicitudes creadas hoy\n\n")
+        
+        # # Distribución por trámite
+        # output += "DISTRIBUCION POR TRAMITE:\n"
+        # for tramite in sorted(solicitudes_por_tramite.keys()):
+        #     total_tramite = sum(solicitudes_por_tramite[tramite].values())
+        #     porcentaje = (total_tramite / total_general) * 100
+        #     output += f"  {tramite}: {total_tramite} ({porcentaje:.1f}%)\n"
+            
+        #     # Desglose por estado
+        #     for estado, cantidad in sorted(solicitudes_por_tramite[tramite].items()):
+        #         output += f"    - {estado}: {cantidad}\n"
+
+        return out.render()
@@ -0,0 +1,48 @@
+from src import cache
+from src.cache import ResultCache
+
+
+def test_least_recently_used_entry_is_evicted_first():
+    results = ResultCache(max_entries=2, max_bytes=1 << 20)
+    results.set("a", "1", ttl=60)
+    results.set("b", "2", ttl=60)
+    assert results.get("a") == "1"
+    results.set("c", "3", ttl=60)
+    assert results.get("b") is None
+    assert results.get("a") == "1" and results.get("c") == "3"
+    assert results.stats()["evictions"] == 1
+
+
+def test_byte_budget_evicts_until_it_fits():
+    value = "x" * 1000
+    results = ResultCache(max_entries=100, max_bytes=2500)
+    for key in ("a", "b", "c"):
+        results.set(key, value, ttl=60)
+    stats = results.stats()
+    assert stats["bytes"] <= 2500
+    assert results.get("a") is None and results.get("c") == value
+
+
+def test_value_larger_than_the_budget_is_not_cached():
+    results = ResultCache(max_entries=10, max_bytes=100)
+    results.set("big", "x" * 1000, ttl=60)
+    assert results.get("big") is None
+    assert results.stats()["entries"] == 0
+
+
+def test_expired_entry_is_a_miss(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    results = ResultCache(max_entries=10, max_bytes=1 << 20)
+    results.set("a", "1", ttl=5)
+    assert results.get("a") == "1"
+    now[0] += 5
+    assert results.get("a") is None
+    stats = results.stats()
+    assert stats["expirations"] == 1 and stats["entries"] == 0 and stats["bytes"] == 0
+
+
+def test_non_positive_ttl_is_not_cached():
+    results = ResultCache(max_entries=10, max_bytes=1 << 20)
+    results.set("a", "1", ttl=0)
+    assert results.get("a") is None
@@ -0,0 +1,77 @@
+import threading
+
+import pytest
+
+from src import deadlines
+from src.deadlines import ER_QUERY_INTERRUPTED, ER_QUERY_TIMEOUT, QueryCancelledError, QueryScope, ToolTimeoutError
+
+
+def scope(timeout=30.0):
+    return QueryScope("solicitudes_por_estado", timeout, kill=lambda targets: None)
+
+
+def test_first_select_gets_the_time_left_as_a_hint():
+    query = "SELECT a FROM t WHERE id IN (select id FROM u)"
+    bounded = scope(30).bound(query)
+    assert bounded.startswith("SELECT /*+ MAX_EXECUTION_TIME(")
+    hint = int(bounded.split("MAX_EXECUTION_TIME(")[1].split(")")[0])
+    assert 29000 < hint <= 30000
+    assert bounded.endswith("a FROM t WHERE id IN (select id FROM u)")
+
+
+def test_unlimited_scope_leaves_the_query_alone():
+    query = "SELECT 1"
+    assert scope(0).bound(query) is query
+
+
+def test_expired_scope_refuses_new_queries():
+    expired = scope(30)
+    expired.deadline -= 31
+    with pytest.raises(ToolTimeoutError):
+        expired.bound("SELECT 1")
+    assert expired.timed_out
+
+
+def test_cancelled_scope_refuses_new_queries():
+    cancelled = scope()
+    cancelled.cancel()
+    with pytest.raises(QueryCancelledError):
+        cancelled.bound("SELECT 1")
+    timed_out = scope()
+    timed_out.cancel(timed_out=True)
+    with pytest.raises(ToolTimeoutError):
+        timed_out.check()
+
+
+def test_mysql_errors_are_typed_as_timeouts_only_when_they_are():
+    assert isinstance(scope().error_for(ER_QUERY_TIMEOUT), ToolTimeoutError)
+    # Un KILL QUERY por desconexión del cliente no es un tiempo límite.
+    assert scope().error_for(ER_QUERY_INTERRUPTED) is None
+    timed_out = scope()
+    timed_out.timed_out = True
+    assert isinstance(timed_out.error_for(ER_QUERY_INTERRUPTED), ToolTimeoutError)
+    assert scope().error_for(1064) is None
+    assert scope().error_for(None) is None
+
+
+def test_cancel_kills_the_attached_connections():
+    killed = []
+
+    class Conn:
+        connection_id = 42
+
+    active = QueryScope("solicitudes_por_estado", 30, kill=killed.extend)
+    pool = object()
+    active.attach(Conn(), pool)
+    active.cancel()
+    for thread in threading.enumerate():
+        if thread.name == "kill-query":
+            thread.join(1)
+    assert killed == [(pool, 42)]
+
+
+def test_timeout_overrides_by_tool(monkeypatch):
+    monkeypatch.setattr(deadlines.config, "TOOL_TIMEOUT", 30)
+    monkeypatch.setattr(deadlines.config, "TOOL_TIMEOUT_OVERRIDES", {"solicitudes_por_estado": 60})
+    assert deadlines.timeout_for("solicitudes_por_estado") == 60
+    assert deadlines.timeout_for("estado_solicitud_por_id") == 30
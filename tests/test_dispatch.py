@@ -0,0 +1,68 @@
+import asyncio
+from typing import Type
+
+from pydantic import BaseModel
+
+from src.cache import result_cache
+from src.dispatch import dispatch
+from src.tools import ReportTool, ToolData, ToolInputError
+
+
+class ConteoInput(BaseModel):
+    nombre_tramite: str
+    limite: int = 10
+
+
+class ConteoTool(ReportTool):
+    name: str = "conteo_de_prueba"
+    description: str = "Herramienta de prueba."
+    args_schema: Type[BaseModel] = ConteoInput
+    known: set = set()
+    calls: int = 0
+
+    def fetch(self, nombre_tramite: str, limite: int) -> ToolData:
+        self.calls += 1
+        if nombre_tramite not in self.known:
+            raise ToolInputError(f"No existe ningún trámite llamado '{nombre_tramite}'.")
+        return ToolData([{"tramite": nombre_tramite, "limite": limite}])
+
+
+def setup_function():
+    result_cache.clear()
+
+
+def test_input_error_is_not_cached():
+    tool = ConteoTool()
+
+    async def scenario():
+        first = await dispatch(tool.name, tool, {"nombre_tramite": "Licencia"})
+        # El trámite se crea después: la misma llamada ya tiene respuesta.
+        tool.known.add("Licencia")
+        second = await dispatch(tool.name, tool, {"nombre_tramite": "Licencia"})
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first == "No existe ningún trámite llamado 'Licencia'."
+    assert "Licencia" in second and second != first
+    assert tool.calls == 2
+
+
+def test_equivalent_arguments_share_the_cached_result():
+    tool = ConteoTool(known={"Licencia"})
+
+    async def scenario():
+        first = await dispatch(tool.name, tool, {"nombre_tramite": "Licencia", "limite": "5"})
+        second = await dispatch(tool.name, tool, {"limite": 5, "nombre_tramite": "Licencia"})
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first == second
+    assert tool.calls == 1
+
+
+def test_invalid_arguments_are_reported_without_running():
+    tool = ConteoTool()
+    result = asyncio.run(dispatch(tool.name, tool, {"limite": "muchos"}))
+    assert result.startswith("Error: argumentos inválidos para 'conteo_de_prueba'")
+    assert "nombre_tramite" in result and "limite" in result
+    assert tool.calls == 0
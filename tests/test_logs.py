@@ -0,0 +1,39 @@
+import json
+import logging
+import queue
+
+from src.logs import JsonFormatter, _DroppingQueueHandler, keyed_hash, redact
+
+
+def test_personal_data_is_masked_at_any_depth():
+    fields = {
+        "tool": "listar_solicitudes_por_dni",
+        "arguments": {"dni": "30111222", "limit": 10},
+        "batch": [{"dni_agente": 30111222}],
+        "dnis": ["1", "2"],
+    }
+    redacted = redact(fields)
+    masked = "h:" + keyed_hash("30111222")
+    assert redacted["tool"] == "listar_solicitudes_por_dni"
+    assert redacted["arguments"] == {"dni": masked, "limit": 10}
+    # Un mismo valor da el mismo hash: los registros siguen siendo correlacionables.
+    assert redacted["batch"] == [{"dni_agente": masked}]
+    assert redacted["dnis"] == ["h:" + keyed_hash("1"), "h:" + keyed_hash("2")]
+    assert "30111222" not in json.dumps(redacted)
+    assert fields["arguments"]["dni"] == "30111222"
+
+
+def test_record_is_formatted_as_redacted_json():
+    record = logging.LogRecord("src.test", logging.INFO, __file__, 1, "llamada %s", ("ok",), None)
+    record.fields = {"dni_usuario": "30111222", "rows": 3}
+    entry = json.loads(JsonFormatter().format(record))
+    assert (entry["level"], entry["logger"], entry["msg"], entry["rows"]) == ("INFO", "src.test", "llamada ok", 3)
+    assert entry["dni_usuario"] == "h:" + keyed_hash("30111222")
+
+
+def test_full_queue_drops_records_instead_of_blocking():
+    handler = _DroppingQueueHandler(queue.Queue(maxsize=1))
+    for n in range(3):
+        handler.handle(logging.LogRecord("src.test", logging.INFO, __file__, 1, "mensaje %d", (n,), None))
+    assert handler.dropped == 2
+    assert handler.queue.get_nowait().msg == "mensaje 0"
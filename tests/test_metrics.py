@@ -0,0 +1,61 @@
+from src import metrics
+from src.metrics import Counter, Gauge, GaugeFunc, Histogram, Registry
+
+
+def test_counter_exposition_escapes_label_values():
+    registry = Registry()
+    calls = registry.register(Counter("calls_total", "Calls.", ("tool", "kind")))
+    calls.inc("a", "query")
+    calls.inc("a", "query", amount=2)
+    calls.inc('di"cho\\n', "input")
+    assert registry.expose().splitlines() == [
+        "# HELP calls_total Calls.",
+        "# TYPE calls_total counter",
+        'calls_total{tool="a",kind="query"} 3',
+        'calls_total{tool="di\\"cho\\\\n",kind="input"} 1',
+    ]
+
+
+def test_gauges_are_typed_as_gauges():
+    registry = Registry()
+    busy = registry.register(Gauge("busy", "Busy.", ("tool",)))
+    busy.inc("a", amount=2)
+    busy.dec("a")
+    registry.register(GaugeFunc("pool_size", "Size.", ("pool",), lambda: {("primary",): 2.5}))
+    assert registry.expose().splitlines() == [
+        "# HELP busy Busy.",
+        "# TYPE busy gauge",
+        'busy{tool="a"} 1',
+        "# HELP pool_size Size.",
+        "# TYPE pool_size gauge",
+        'pool_size{pool="primary"} 2.5',
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("latency_seconds", "Latency.", ("tool",), (0.1, 1))
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.observe(value, "a")
+    assert histogram.expose() == [
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{tool="a",le="0.1"} 2',
+        'latency_seconds_bucket{tool="a",le="1"} 3',
+        'latency_seconds_bucket{tool="a",le="+Inf"} 4',
+        'latency_seconds_sum{tool="a"} 3.65',
+        'latency_seconds_count{tool="a"} 4',
+    ]
+
+
+def test_recordings_are_attributed_to_the_tracked_tool():
+    before = metrics.requests_total._values.get(("metrics_test_tool",), 0)
+    with metrics.track("metrics_test_tool"):
+        assert metrics.current_tool() == "metrics_test_tool"
+        metrics.count_error("query")
+    assert metrics.current_tool() == metrics.NO_TOOL
+    assert metrics.requests_total._values[("metrics_test_tool",)] == before + 1
+    assert metrics.errors_total._values[("metrics_test_tool", "query")] >= 1
+    assert metrics.in_flight._values[("metrics_test_tool",)] == 0
+    exposition = metrics.expose()
+    assert 'mcp_tool_errors_total{tool="metrics_test_tool",kind="query"}' in exposition
+    assert exposition.endswith("\n")
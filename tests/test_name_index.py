@@ -0,0 +1,60 @@
+import pytest
+
+from src import config
+from src.name_index import NameIndex, collation_key, not_found_message
+
+PROCEDURES = [
+    "Licencia por Maternidad",
+    "Licencia por Paternidad",
+    "Certificado de Residencia",
+    "Habilitación Comercial",
+    "Permiso de Obra",
+]
+
+
+@pytest.fixture
+def index(monkeypatch):
+    monkeypatch.setattr(config, "NAME_MATCH_MIN_SCORE", 0.5)
+    monkeypatch.setattr(config, "NAME_MATCH_SUGGESTIONS", 5)
+    return NameIndex(PROCEDURES)
+
+
+def test_exact_match_ignores_case_and_accents(index):
+    assert index.resolve("habilitacion COMERCIAL").name == "Habilitación Comercial"
+    assert collation_key(" Habilitación ") == "habilitacion"
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("maternidad", "Licencia por Maternidad"),
+    ("licencia de maternidad", "Licencia por Maternidad"),
+    ("certificado de residensia", "Certificado de Residencia"),
+])
+def test_partial_or_misspelled_name_resolves(index, query, expected):
+    assert index.resolve(query).name == expected
+
+
+@pytest.mark.parametrize("query", [
+    "licencia por enfermedad",
+    "certificado de domicilio",
+    "habilitacion de obra",
+    "licencia",
+])
+def test_unknown_or_ambiguous_name_is_not_mapped_to_another(index, query):
+    match = index.resolve(query)
+    assert match.name is None
+
+
+def test_short_words_tolerate_no_typos(index):
+    assert index.resolve("permiso de obro").name == "Permiso de Obra"
+    assert index.resolve("permiso de ora").name is None
+
+
+def test_unresolved_name_lists_suggestions(index):
+    match = index.resolve("licencia por enfermedad")
+    assert "Licencia por Maternidad" in match.suggestions
+    message = not_found_message("No existe.", match)
+    assert message.startswith("No existe. ¿Quiso decir") and "'Licencia por Maternidad'" in message
+
+
+def test_empty_index_resolves_nothing():
+    assert NameIndex([]).resolve("maternidad").name is None
@@ -0,0 +1,57 @@
+from datetime import datetime
+
+import pytest
+
+from src.pagination import (
+    NULL_DATE,
+    InvalidCursorError,
+    dated_value,
+    decode_cursor,
+    encode_cursor,
+    split_page,
+)
+from src.rendering import TextRenderer
+from src.tools import rendered_cursor
+
+
+def test_cursor_round_trip_keeps_datetimes():
+    key = (datetime(2024, 3, 1, 12, 30, 5, 120), 42)
+    assert decode_cursor("listado", encode_cursor("listado", key), 2) == key
+
+
+@pytest.mark.parametrize("cursor", ["", "no-es-base64!", encode_cursor("otro", [1, 2]), encode_cursor("listado", [1])])
+def test_foreign_or_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(InvalidCursorError):
+        decode_cursor("listado", cursor, 2)
+
+
+def test_null_date_in_cursor_stands_for_the_null_sort_value():
+    created, id_ = decode_cursor("listado", encode_cursor("listado", [None, 7]), 2)
+    assert dated_value(created) == NULL_DATE
+    assert dated_value(datetime(2024, 1, 1)) == datetime(2024, 1, 1)
+
+
+def test_split_page_trims_the_extra_row_and_points_past_the_last_one():
+    rows = [{"id": i} for i in range(4)]
+    page, cursor = split_page("listado", rows, 3, ("id",))
+    assert page == rows[:3]
+    assert decode_cursor("listado", cursor, 1) == (2,)
+    assert split_page("listado", rows, 4, ("id",)) == (rows, None)
+
+
+def test_rendered_cursor_continues_after_the_last_row_shown():
+    rows = [{"id": i, "texto": "x" * 40} for i in range(5)]
+    out = TextRenderer(budget=100)
+    for row in rows:
+        if not out.row(row["texto"]):
+            break
+    out.end_rows(len(rows))
+    cursor = rendered_cursor("listado", rows, out, ("id",), "siguiente")
+    assert out.rows == 2 and out.omitted == 3
+    assert decode_cursor("listado", cursor, 1) == (1,)
+
+
+def test_rendered_cursor_keeps_the_page_cursor_when_nothing_was_cut():
+    out = TextRenderer(budget=10_000)
+    out.row("fila")
+    assert rendered_cursor("listado", [{"id": 1}], out, ("id",), "siguiente") == "siguiente"
@@ -0,0 +1,98 @@
+import pytest
+
+from src.db import ConnectionPool, PoolTimeoutError
+
+
+class FakeConnection:
+    def __init__(self, number, fail_rollback=False):
+        self.connection_id = number
+        self.fail_rollback = fail_rollback
+        self.alive = True
+        self.closed = False
+        self.rollbacks = 0
+
+    def ping(self, reconnect=False):
+        if not self.alive:
+            raise OSError("gone")
+
+    def rollback(self):
+        self.rollbacks += 1
+        if self.fail_rollback:
+            raise OSError("lost in the middle of a query")
+
+    def close(self):
+        self.closed = True
+
+
+def make_pool(max_size=2, max_lifetime=3600.0, validate_after=3600.0, fail_rollback=False):
+    opened = []
+
+    def connect():
+        conn = FakeConnection(len(opened) + 1, fail_rollback)
+        opened.append(conn)
+        return conn
+
+    pool = ConnectionPool(connect, min_size=0, max_size=max_size, max_lifetime=max_lifetime,
+                          validate_after=validate_after, checkout_timeout=0.05)
+    return pool, opened
+
+
+def test_returned_connection_is_reused():
+    pool, opened = make_pool()
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        assert pool.stats()["in_use"] == 1
+    assert second is first
+    assert len(opened) == 1
+    assert pool.stats()["checkouts"] == 2 and pool.stats()["idle"] == 1
+
+
+def test_checkout_times_out_when_every_connection_is_in_use():
+    pool, _ = make_pool(max_size=1)
+    with pool.connection():
+        with pytest.raises(PoolTimeoutError):
+            with pool.connection():
+                pass
+    assert pool.stats()["timeouts"] == 1
+    assert pool.stats()["waiting"] == 0
+
+
+def test_failed_query_rolls_back_and_keeps_the_connection():
+    pool, opened = make_pool()
+    with pytest.raises(ValueError):
+        with pool.connection():
+            raise ValueError("query failed")
+    assert opened[0].rollbacks == 1 and not opened[0].closed
+    assert pool.stats()["idle"] == 1 and pool.stats()["discarded"] == 0
+
+
+def test_connection_that_cannot_roll_back_is_discarded():
+    pool, opened = make_pool(fail_rollback=True)
+    with pytest.raises(ValueError):
+        with pool.connection():
+            raise ValueError("query failed")
+    assert opened[0].closed
+    stats = pool.stats()
+    assert stats["discarded"] == 1 and stats["size"] == 0 and stats["in_use"] == 0
+    with pool.connection() as conn:
+        assert conn is opened[1]
+
+
+def test_expired_connection_is_recycled_on_return():
+    pool, opened = make_pool(max_lifetime=0)
+    with pool.connection():
+        pass
+    assert opened[0].closed
+    assert pool.stats()["recycled"] == 1 and pool.stats()["size"] == 0
+
+
+def test_idle_connection_failing_its_ping_is_replaced():
+    pool, opened = make_pool(validate_after=0)
+    with pool.connection():
+        pass
+    opened[0].alive = False
+    with pool.connection() as conn:
+        assert conn is opened[1]
+    assert opened[0].closed
+    assert pool.stats()["discarded"] == 1 and pool.stats()["size"] == 1
@@ -0,0 +1,84 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from src import range_planner
+from src.cache import ResultCache
+from src.range_planner import ChunkVersions, month_chunks
+
+
+def test_month_chunks_split_at_calendar_boundaries():
+    assert month_chunks(datetime(2023, 12, 15), datetime(2024, 2, 10)) == [
+        (datetime(2023, 12, 15), datetime(2024, 1, 1)),
+        (datetime(2024, 1, 1), datetime(2024, 2, 1)),
+        (datetime(2024, 2, 1), datetime(2024, 2, 10)),
+    ]
+    assert month_chunks(datetime(2024, 1, 1), datetime(2024, 1, 1)) == []
+
+
+def test_versions_are_per_report_and_month():
+    versions = ChunkVersions()
+    versions.bump("estados", date(2024, 3, 5))
+    versions.bump("estados", datetime(2024, 3, 28, 10))
+    assert versions.get("estados", datetime(2024, 3, 1)) == 2
+    assert versions.get("estados", date(2024, 4, 1)) == 0
+    assert versions.get("agente", date(2024, 3, 1)) == 0
+
+
+def test_month_is_settled_once_the_lag_has_passed(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(range_planner.clock, "monotonic", lambda: now[0])
+    versions = ChunkVersions()
+    assert versions.settled("estados", date(2024, 3, 1), lag=30)
+    versions.bump("estados", date(2024, 3, 1))
+    assert not versions.settled("estados", date(2024, 3, 1), lag=30)
+    now[0] += 31
+    assert versions.settled("estados", date(2024, 3, 1), lag=30)
+
+
+@pytest.fixture
+def planner(monkeypatch):
+    versions = ChunkVersions()
+    monkeypatch.setattr(range_planner, "chunk_versions", versions)
+    monkeypatch.setattr(range_planner, "chunk_cache", ResultCache(max_entries=100, max_bytes=1 << 20))
+    return versions
+
+
+def _counting_query(calls):
+    def query(lo, hi):
+        calls.append((lo, hi))
+        return [{"desde": lo}]
+    return query
+
+
+def test_closed_months_are_cached_until_their_version_changes(planner):
+    calls = []
+    query = _counting_query(calls)
+    lo, hi = datetime(2024, 1, 1), datetime(2024, 3, 1)
+
+    first = range_planner.run_chunks("estados", "*", lo, hi, query)
+    second = range_planner.run_chunks("estados", "*", lo, hi, query)
+    assert first == second and len(calls) == 2
+
+    planner.bump("estados", date(2024, 2, 1))
+    range_planner.run_chunks("estados", "*", lo, hi, query)
+    assert calls[2:] == [(datetime(2024, 2, 1), datetime(2024, 3, 1))]
+
+
+def test_open_chunk_is_always_queried(planner):
+    calls = []
+    today = datetime.combine(date.today(), datetime.min.time())
+    bounds = (today - timedelta(days=1), today + timedelta(days=1))
+    for _ in range(2):
+        range_planner.run_chunks("estados", "*", *bounds, _counting_query(calls))
+    open_chunks = [chunk for chunk in calls if chunk[1] > today]
+    assert len(open_chunks) == 2
+
+
+def test_unsettled_month_is_not_cached(planner, monkeypatch):
+    monkeypatch.setattr(range_planner.replicas, "tolerance", lambda: 3600.0)
+    planner.bump("estados", date(2024, 1, 1))
+    calls = []
+    for _ in range(2):
+        range_planner.run_chunks("estados", "*", datetime(2024, 1, 1), datetime(2024, 2, 1), _counting_query(calls))
+    assert len(calls) == 2
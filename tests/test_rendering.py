@@ -0,0 +1,47 @@
+from src.rendering import RowTemplate, TextRenderer
+
+
+def test_optional_lines_are_left_out_when_empty():
+    template = RowTemplate("{id}. {tramite}", ("fecha_fin", "   Fecha fin: {fecha_fin}"))
+    assert template.format({"id": 1, "tramite": "Licencia", "fecha_fin": None}) == "1. Licencia"
+    assert template.format({"id": 1, "tramite": "Licencia", "fecha_fin": "2024-03-01"}) == (
+        "1. Licencia\n   Fecha fin: 2024-03-01"
+    )
+
+
+def test_unlimited_renderer_keeps_every_row():
+    out = TextRenderer(budget=0)
+    for n in range(100):
+        assert out.row(f"fila {n}\n")
+    out.end_rows()
+    assert not out.truncated
+    assert out.render().count("\n") == 100
+
+
+def test_rows_past_the_budget_are_counted_not_rendered():
+    out = TextRenderer(budget=30)
+    out.write("CABECERA\n")
+    accepted = [out.row(f"fila {n}\n") for n in range(10)]
+    out.end_rows()
+    text = out.render()
+    assert accepted[:3] == [True] * 3 and not any(accepted[3:])
+    assert out.rows == 3 and out.omitted == 7
+    assert text.startswith("CABECERA\nfila 0\nfila 1\nfila 2\n")
+    assert "... y 7 filas más (respuesta recortada a 30 bytes)" in text
+
+
+def test_first_row_always_fits():
+    out = TextRenderer(budget=5)
+    assert out.row("una fila más larga que el presupuesto\n")
+    assert not out.row("otra\n")
+
+
+def test_end_rows_counts_rows_never_offered():
+    out = TextRenderer(budget=12)
+    rows = [f"fila {n}\n" for n in range(50)]
+    for row in rows:
+        if not out.row(row):
+            break
+    out.end_rows(total=len(rows))
+    assert out.omitted == 50 - out.rows
+    assert f"... y {50 - out.rows} filas más" in out.render()
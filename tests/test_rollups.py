@@ -0,0 +1,61 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from src.dimensions import dimensions
+from src.rollups import pivot_state_counts, split_range
+
+
+def test_range_is_split_into_live_edges_and_whole_days():
+    parts = split_range(datetime(2024, 3, 1, 10), datetime(2024, 3, 5, 8))
+    assert parts == {
+        "lo": datetime(2024, 3, 1, 10),
+        "head_end": datetime(2024, 3, 2),
+        "first_day": datetime(2024, 3, 2),
+        "end_day": datetime(2024, 3, 5),
+        "tail_start": datetime(2024, 3, 5),
+        "hi": datetime(2024, 3, 5, 8),
+    }
+
+
+def test_days_after_the_rollup_are_counted_live():
+    parts = split_range(datetime(2024, 3, 1), datetime(2024, 3, 10), rollup_until=datetime(2024, 3, 4, 12))
+    assert (parts["first_day"], parts["end_day"]) == (datetime(2024, 3, 1), datetime(2024, 3, 4))
+    assert (parts["tail_start"], parts["hi"]) == (datetime(2024, 3, 4), datetime(2024, 3, 10))
+
+
+def test_range_without_a_whole_day_is_counted_live():
+    lo, hi = datetime(2024, 3, 1, 10), datetime(2024, 3, 2, 9)
+    parts = split_range(lo, hi)
+    assert (parts["lo"], parts["head_end"]) == (lo, hi)
+    assert parts["first_day"] == parts["end_day"]
+    assert parts["tail_start"] == hi
+
+
+@pytest.fixture
+def loaded_dimensions(monkeypatch):
+    monkeypatch.setattr(dimensions, "ensure_loaded", lambda: None)
+    monkeypatch.setattr(dimensions, "refresh_on_miss", lambda: None)
+    monkeypatch.setattr(dimensions.procedures, "_names", {})
+    monkeypatch.setattr(dimensions.request_states, "_names", {})
+    dimensions.procedures.load([(1, "Licencia"), (2, "Certificado"), (3, "certificado")])
+    dimensions.request_states.load([(10, "Publicado"), (11, "EN PROCESO"), (12, "Observado")])
+
+
+def test_counts_are_pivoted_by_state_and_merged_by_name(loaded_dimensions):
+    rows = [
+        {"procedure_id": 1, "request_status_id": 10, "total": Decimal(2)},
+        {"procedure_id": 2, "request_status_id": 11, "total": Decimal(3)},
+        {"procedure_id": 3, "request_status_id": 10, "total": Decimal(1)},
+        # Estado sin columna propia: solo suma al total.
+        {"procedure_id": 1, "request_status_id": 12, "total": Decimal(4)},
+        # Ids sin nombre se omiten.
+        {"procedure_id": 9, "request_status_id": 10, "total": Decimal(7)},
+        {"procedure_id": 1, "request_status_id": 99, "total": Decimal(7)},
+    ]
+    pivoted = pivot_state_counts(rows)
+    assert [row["tramite"] for row in pivoted] == ["Certificado", "Licencia"]
+    certificado, licencia = pivoted
+    assert (certificado["publicado"], certificado["en_proceso"], certificado["total"]) == (1, 3, 4)
+    assert (licencia["publicado"], licencia["borrador"], licencia["total"]) == (2, 0, 6)
@@ -0,0 +1,157 @@
+import asyncio
+
+import pytest
+
+from src.scheduler import CallShedError, Scheduler
+
+
+async def _hold(scheduler, cost, order, release):
+    async with scheduler.slot(cost):
+        order.append(cost)
+        await release.wait()
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_cheaper_class_is_admitted_first():
+    async def scenario():
+        scheduler = Scheduler(1, {}, queue_limit=10)
+        order, release = [], asyncio.Event()
+        running = asyncio.create_task(_hold(scheduler, "report", order, release))
+        await asyncio.sleep(0)
+        heavy = asyncio.create_task(_hold(scheduler, "heavy", order, release))
+        lookup = asyncio.create_task(_hold(scheduler, "lookup", order, release))
+        await asyncio.sleep(0)
+        assert order == ["report"]
+        release.set()
+        await asyncio.gather(running, heavy, lookup)
+        return order
+
+    assert _run(scenario()) == ["report", "lookup", "heavy"]
+
+
+def test_class_quota_leaves_room_for_cheaper_calls():
+    async def scenario():
+        scheduler = Scheduler(2, {"heavy": 1}, queue_limit=10)
+        order, release = [], asyncio.Event()
+        tasks = [asyncio.create_task(_hold(scheduler, cost, order, release)) for cost in ("heavy", "heavy", "lookup")]
+        await asyncio.sleep(0)
+        admitted = list(order)
+        release.set()
+        await asyncio.gather(*tasks)
+        return admitted, scheduler.stats()["classes"]["heavy"]
+
+    admitted, heavy = _run(scenario())
+    assert admitted == ["heavy", "lookup"]
+    assert heavy["admitted"] == 2
+
+
+def test_full_queue_sheds_the_most_expensive_waiting_call():
+    async def scenario():
+        scheduler = Scheduler(1, {}, queue_limit=1)
+        order, release = [], asyncio.Event()
+        running = asyncio.create_task(_hold(scheduler, "lookup", order, release))
+        await asyncio.sleep(0)
+        heavy = asyncio.create_task(_hold(scheduler, "heavy", order, release))
+        await asyncio.sleep(0)
+        lookup = asyncio.create_task(_hold(scheduler, "lookup", order, release))
+        await asyncio.sleep(0)
+        with pytest.raises(CallShedError):
+            await heavy
+        release.set()
+        await asyncio.gather(running, lookup)
+        return order, scheduler.stats()["classes"]["heavy"]["shed"]
+
+    order, shed = _run(scenario())
+    assert order == ["lookup", "lookup"]
+    assert shed == 1
+
+
+def test_full_queue_rejects_a_call_with_no_costlier_victim():
+    async def scenario():
+        scheduler = Scheduler(1, {}, queue_limit=1)
+        order, release = [], asyncio.Event()
+        running = asyncio.create_task(_hold(scheduler, "lookup", order, release))
+        await asyncio.sleep(0)
+        queued = asyncio.create_task(_hold(scheduler, "lookup", order, release))
+        await asyncio.sleep(0)
+        with pytest.raises(CallShedError):
+            async with scheduler.slot("heavy"):
+                pass
+        release.set()
+        await asyncio.gather(running, queued)
+        return scheduler.stats()["classes"]
+
+    classes = _run(scenario())
+    assert classes["heavy"]["shed"] == 1
+    assert classes["lookup"]["running"] == 0
+
+
+def test_cancelled_waiter_releases_its_place():
+    async def scenario():
+        scheduler = Scheduler(1, {}, queue_limit=10)
+        order, release = [], asyncio.Event()
+        running = asyncio.create_task(_hold(scheduler, "lookup", order, release))
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(_hold(scheduler, "report", order, release))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        release.set()
+        await running
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        return scheduler.stats()["classes"]
+
+    classes = _run(scenario())
+    assert all(stats["running"] == 0 and stats["queued"] == 0 for stats in classes.values())
+
+
+def test_slot_of_a_cancelled_call_is_held_until_its_worker_finishes():
+    import threading
+
+    async def scenario():
+        scheduler = Scheduler(1, {}, queue_limit=10)
+        started, finish = threading.Event(), threading.Event()
+
+        def blocking():
+            started.set()
+            finish.wait(5)
+
+        call = asyncio.create_task(scheduler.run("report", blocking))
+        while not started.is_set():
+            await asyncio.sleep(0.001)
+        call.cancel()
+        await asyncio.sleep(0.01)
+        held = scheduler.stats()["classes"]["report"]["running"]
+        finish.set()
+        for _ in range(100):
+            if not scheduler.stats()["classes"]["report"]["running"]:
+                break
+            await asyncio.sleep(0.01)
+        return held, scheduler.stats()["classes"]["report"]["running"]
+
+    assert asyncio.run(scenario()) == (1, 0)
+
+
+def test_cancelled_waiter_still_queued_is_not_shed():
+    async def scenario():
+        scheduler = Scheduler(1, {}, queue_limit=1)
+        order, release = [], asyncio.Event()
+        running = asyncio.create_task(_hold(scheduler, "lookup", order, release))
+        await asyncio.sleep(0)
+        heavy = asyncio.create_task(_hold(scheduler, "heavy", order, release))
+        await asyncio.sleep(0)
+        asyncio.get_running_loop().call_later(0.01, release.set)
+        # La espera queda cancelada, pero su tarea todavía no la quitó de la cola.
+        heavy.cancel()
+        async with scheduler.slot("lookup"):
+            order.append("lookup")
+        await running
+        await asyncio.gather(heavy, return_exceptions=True)
+        return order, scheduler.stats()["classes"]
+
+    order, classes = asyncio.run(scenario())
+    assert order == ["lookup", "lookup"]
+    assert classes["heavy"]["shed"] == 0 and classes["lookup"]["shed"] == 0
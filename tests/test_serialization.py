@@ -0,0 +1,44 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from src.models import ToolExecutionResponse
+from src.serialization import dumps, structured
+
+ROWS = [
+    {"tramite": "Licencia", "cantidad": Decimal(3), "fecha": datetime(2024, 3, 1, 9, 30)},
+    {"tramite": "Certificado", "cantidad": Decimal("1.5"), "fecha": None},
+]
+
+
+def encode(response):
+    return json.loads(dumps(response.model_dump()))
+
+
+def test_rows_layout_sends_only_rows_and_meta():
+    response = ToolExecutionResponse(result="", data=structured(ROWS, {"next_cursor": "abc"}, "rows"))
+    assert encode(response)["data"] == {
+        "rows": [
+            {"tramite": "Licencia", "cantidad": 3, "fecha": "2024-03-01T09:30:00"},
+            {"tramite": "Certificado", "cantidad": 1.5, "fecha": None},
+        ],
+        "meta": {"next_cursor": "abc"},
+    }
+
+
+def test_columns_layout_sends_each_column_once():
+    response = ToolExecutionResponse(result="", data=structured(ROWS, None, "columns"))
+    assert encode(response)["data"] == {
+        "columns": {
+            "tramite": ["Licencia", "Certificado"],
+            "cantidad": [3, 1.5],
+            "fecha": ["2024-03-01T09:30:00", None],
+        },
+        "count": 2,
+    }
+
+
+def test_text_response_has_no_data():
+    assert encode(ToolExecutionResponse(result="texto")) == {
+        "result": "texto", "error": None, "error_type": None, "data": None,
+    }
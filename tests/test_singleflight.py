@@ -0,0 +1,77 @@
+import asyncio
+
+from src.singleflight import SingleFlight, call_key
+
+
+def test_call_key_ignores_argument_order():
+    assert call_key("tool", {"a": 1, "b": 2}) == call_key("tool", {"b": 2, "a": 1})
+    assert call_key("tool", {"a": 1}) != call_key("other", {"a": 1})
+
+
+def test_overlapping_calls_share_one_execution():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "result"
+
+        results = await asyncio.gather(*(flight.do("key", work) for _ in range(3)))
+        return results, calls, flight.stats()
+
+    results, calls, stats = asyncio.run(scenario())
+    assert results == ["result"] * 3
+    assert len(calls) == 1
+    assert stats["hits"] == 2 and stats["in_flight"] == 0
+
+
+def test_cancelling_one_caller_keeps_the_shared_execution():
+    async def scenario():
+        flight = SingleFlight()
+        started, finish = asyncio.Event(), asyncio.Event()
+
+        async def work():
+            started.set()
+            await finish.wait()
+            return "result"
+
+        first = asyncio.create_task(flight.do("key", work))
+        second = asyncio.create_task(flight.do("key", work))
+        await started.wait()
+        first.cancel()
+        await asyncio.sleep(0)
+        finish.set()
+        return first, await second
+
+    first, result = asyncio.run(scenario())
+    assert first.cancelled()
+    assert result == "result"
+
+
+def test_cancelling_every_caller_cancels_the_execution():
+    async def scenario():
+        flight = SingleFlight()
+        started = asyncio.Event()
+        outcome = []
+
+        async def work():
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                outcome.append("cancelled")
+                raise
+
+        callers = [asyncio.create_task(flight.do("key", work)) for _ in range(2)]
+        await started.wait()
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+        return outcome, flight.stats()
+
+    outcome, stats = asyncio.run(scenario())
+    assert outcome == ["cancelled"]
+    assert stats["in_flight"] == 0